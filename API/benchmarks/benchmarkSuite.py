@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import datetime as dt
+import numpy as np
+import pandas as pd
+from .syntheticDatabase import SyntheticDatabase, DEFAULT_MARGINS, DEFAULT_PONDERS, HOLIDAY_COLUMNS
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Escenarios de la optimización: 3 de fotovoltaica y 3 de depósito, como en el barrido de la API
+OPTIMIZE_PARAMETERS = pd.DataFrame({'IdParameter': ['photovoltaic_power', 'upper_tank_volume'],
+                                    'IntervalParameter': ['photovoltaic', 'tank']})
+SCENARIOS_INTERVALS = [[{'photovoltaic': 0.0}, {'photovoltaic': -0.2}, {'photovoltaic': 0.2}],
+                       [{'tank': 0.0}, {'tank': -0.5}, {'tank': 0.5}]]
+# Días que se predicen en getRangeSimulationForecast, el tamaño del caso es el histórico de días similares
+FORECAST_DAYS = 3
+
+
+class BenchmarkSuite:
+    # Mide las partes caras de la API sobre SyntheticDatabase, sin el SQL Server. Cada caso se mide con varios tamaños
+    # (días simulados o días de histórico), se guarda en JSON y se compara con una línea base guardada.
+    # La base de datos sintética se escribe como copia local antes de importar la API, que hace consultas al importarse.
+    # La variable de entorno la heredan también los procesos de la optimización
+    def __init__(self, database, sizes=(30, 180, 365), repeat=3, workers=2):
+        self.database = database
+        self.sizes = sizes
+        self.repeat = repeat
+        self.workers = workers
+        self.snapshot = os.path.join(tempfile.mkdtemp(), "synthetic.sqlite")
+        database.writeSnapshot(self.snapshot)
+        os.environ["INASOLAR_SNAPSHOT"] = self.snapshot
+        from simulations.simulator import simulator
+        from simulations.filtro_dias import filtro_dias
+        from simulations.optimizationExecutor import OptimizationExecutor
+        from simulations import predictor
+        self.simulator, self.filtro_dias, self.OptimizationExecutor, self.predictor = simulator, filtro_dias, OptimizationExecutor, predictor
+        self.location = {'Location': SyntheticDatabase.CONSUMER, 'Area': SyntheticDatabase.AREA}
+        self.generator = {'Location': min(SyntheticDatabase.FARMS), 'Area': SyntheticDatabase.AREA}
+
+    def getCases(self):
+        # (nombre, función que prepara el caso y devuelve la que se mide)
+        cases = []
+        for size in self.sizes:
+            for kernel in (False, True):
+                for withFailures in (True, False):
+                    name = f"range_simulation{'_kernel' if kernel else ''}/{'failures' if withFailures else 'no_failures'}/{size}"
+                    cases.append((name, size, lambda size=size, kernel=kernel, withFailures=withFailures:
+                                  self.prepareSimulation(size, kernel, withFailures)))
+            cases.append((f"optimization/{size}", size, lambda size=size: self.prepareOptimization(size)))
+            cases.append((f"similar_days_ponders/{size}", size, lambda size=size: self.prepareSimilarDays(size, True)))
+            cases.append((f"similar_days_margins/{size}", size, lambda size=size: self.prepareSimilarDays(size, False)))
+            cases.append((f"forecast/{size}", size, lambda size=size: self.prepareForecast(size)))
+        return cases
+
+    def clearCaches(self):
+        # Cada repetición empieza sin los datos ni los perfiles de la anterior
+        self.simulator.DATA_CACHE.clear()
+        self.simulator.UNIT_PROFILES.clear()
+        self.simulator.CHECKPOINTS.clear()
+
+    def getSimulationRange(self, size):
+        # Los últimos size días completos de los datos
+        end = dt.datetime.strptime(self.database.getLastDay(), "%Y-%m-%d")
+        return (end - dt.timedelta(days=size)).strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+
+    def prepareSimulation(self, size, kernel, withFailures):
+        startDay, endDay = self.getSimulationRange(size)
+
+        def run():
+            self.clearCaches()
+            scenario = self.simulator()
+            scenario.seed = 0
+            return scenario.range_simulation(startDay, endDay, self.location, [], withFailures, kernel=kernel)
+        return run
+
+    def prepareOptimization(self, size):
+        startDay, endDay = self.getSimulationRange(size)
+
+        def run():
+            self.clearCaches()
+            base = self.simulator()
+            base.seed = 1
+            parameterSets = self.OptimizationExecutor.getParameterSets(base, SCENARIOS_INTERVALS, OPTIMIZE_PARAMETERS)
+            return self.OptimizationExecutor(self.workers).run(base, parameterSets, startDay, endDay, self.location, [], True,
+                                                               OPTIMIZE_PARAMETERS['IdParameter'])
+        return run
+
+    def prepareSimilarDays(self, size, ponders):
+        # El día objetivo es el último, y el histórico los size días anteriores. El preprocesado de la localización
+        # se hace una vez fuera de la medida, como en la API
+        targetDay, initialDay = self.getSimulationRange(size)[::-1]
+        similarDays = self.filtro_dias()
+        similarDays.preprocess_location(self.location['Location'])
+        target = f"{targetDay}T00:00:00"
+
+        def run():
+            if ponders:
+                return similarDays.get_days_by_similar_meteorological_variables_ponders(
+                    target, DEFAULT_PONDERS, self.location['Location'], initialDay, targetDay)
+            return similarDays.get_days_by_similar_meteorological_variables_margins(
+                target, DEFAULT_MARGINS, initialDay, targetDay, self.location, {column: True for column in HOLIDAY_COLUMNS})
+        return run
+
+    def prepareForecast(self, size):
+        # Se predicen los FORECAST_DAYS últimos días con los size días anteriores como histórico. Se buscan los días
+        # similares por pesos, con márgenes puede que no haya ninguno en los históricos cortos
+        lastDay = dt.datetime.strptime(self.database.getLastDay(), "%Y-%m-%d")
+        predictionStart = (lastDay - dt.timedelta(days=FORECAST_DAYS - 1)).strftime("%Y-%m-%d")
+        historyEnd = lastDay - dt.timedelta(days=FORECAST_DAYS)
+        historyStart = (historyEnd - dt.timedelta(days=size)).strftime("%Y-%m-%d")
+
+        def run():
+            self.clearCaches()
+            simulationParameters = {'seed': 0}
+            return self.predictor.getRangeSimulationForecast(
+                simulationParameters, predictionStart, lastDay.strftime("%Y-%m-%d"), DEFAULT_PONDERS, DEFAULT_PONDERS,
+                'tab-ponders', historyStart, historyEnd.strftime("%Y-%m-%d"), self.location, self.generator,
+                {column: True for column in HOLIDAY_COLUMNS}, [], True, 20)
+        return run
+
+    def measure(self, prepare):
+        run = prepare()
+        seconds = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+        return {"min": min(seconds), "median": statistics.median(seconds), "runs": seconds}
+
+    def run(self, selected=None, log=print):
+        results = {}
+        for name, size, prepare in self.getCases():
+            if selected and not any(pattern in name for pattern in selected):
+                continue
+            results[name] = {"size": size, **self.measure(prepare)}
+            log(f"{name:45} {results[name]['min']:10.4f} s")
+        return {"environment": self.getEnvironment(), "results": results}
+
+    def getEnvironment(self):
+        return {"date": dt.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                "numpy": np.__version__, "pandas": pd.__version__, "platform": platform.platform(),
+                "processor": platform.processor(), "cpus": os.cpu_count(), "repeat": self.repeat, "workers": self.workers,
+                "database": self.database.getFingerprint()}
+
+    def compare(report, baseline, tolerance=0.25, minSeconds=0.02):
+        # Regresión: el mínimo es más de un tolerance más lento que el de la línea base (y al menos minSeconds).
+        # Se compara el mínimo porque es el menos afectado por el resto de procesos de la máquina
+        comparison = {}
+        for name, result in report["results"].items():
+            if name not in baseline["results"]:
+                comparison[name] = {"status": "new", "current": result["min"]}
+                continue
+            previous = baseline["results"][name]["min"]
+            ratio = result["min"] / previous if previous else float("inf")
+            status = "ok"
+            if ratio > 1 + tolerance and result["min"] - previous > minSeconds:
+                status = "regression"
+            elif ratio < 1 / (1 + tolerance) and previous - result["min"] > minSeconds:
+                status = "improvement"
+            comparison[name] = {"status": status, "baseline": previous, "current": result["min"], "ratio": ratio}
+        return comparison
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the simulator, the similar days search and the predictor")
+    parser.add_argument("--sizes", default="30,180,365", help="Comma separated sizes, days simulated or days of history")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2, help="Processes of the optimization sweep")
+    parser.add_argument("--years", type=int, default=4, help="Years of synthetic data")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument("--cases", nargs="*", help="Only the cases whose name contains one of these")
+    parser.add_argument("--output", default=os.path.join(BENCHMARKS_DIRECTORY, "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS_DIRECTORY, "baseline.json"))
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline, 0.25 = 25%%")
+    parser.add_argument("--min-seconds", type=float, default=0.02, help="Smaller slowdowns are not regressions, they are noise")
+    parser.add_argument("--update-baseline", action="store_true", help="Save the results as the new baseline")
+    arguments = parser.parse_args(arguments)
+
+    database = SyntheticDatabase(years=arguments.years, seed=arguments.seed)
+    suite = BenchmarkSuite(database, [int(size) for size in arguments.sizes.split(",")], arguments.repeat, arguments.workers)
+    report = suite.run(arguments.cases)
+    with open(arguments.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if arguments.update_baseline:
+        with open(arguments.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved in {arguments.baseline}")
+        return 0
+    if not os.path.exists(arguments.baseline):
+        print(f"No baseline in {arguments.baseline}, run with --update-baseline to create it")
+        return 0
+
+    with open(arguments.baseline) as file:
+        baseline = json.load(file)
+    if baseline["environment"].get("database") != report["environment"]["database"]:
+        print("The synthetic data is not the same as in the baseline, the times are not comparable")
+    comparison = BenchmarkSuite.compare(report, baseline, arguments.tolerance, arguments.min_seconds)
+    for name, result in comparison.items():
+        if result["status"] == "new":
+            print(f"{name:45} {'':>10} {result['current']:10.4f} s  new")
+        else:
+            print(f"{name:45} {result['baseline']:10.4f} {result['current']:10.4f} s  x{result['ratio']:.2f} {result['status']}")
+    regressions = [name for name, result in comparison.items() if result["status"] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regressions over {arguments.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
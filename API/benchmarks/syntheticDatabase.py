@@ -0,0 +1,144 @@
+import sqlite3
+import hashlib
+from contextlib import closing
+import numpy as np
+import pandas as pd
+from simulations.dataSource import SqliteDataSource
+
+# Variables de HistoricalWeather y ForecastWeather en el orden de la tabla, filtro_dias las recorre por posición
+WEATHER_VARIABLES = ["temperature_2m", "relativehumidity_2m", "surface_pressure", "precipitation", "snowfall",
+                     "cloudcover", "direct_radiation", "windspeed_10m", "winddirection_10m"]
+HOLIDAY_COLUMNS = ["newYear", "localHoliday", "nationalHoliday", "festivities", "weekEnd", "weekDay"]
+NATIONAL_HOLIDAYS = ["01-06", "05-01", "08-15", "10-12", "11-01", "12-06", "12-08", "12-25"]
+LOCAL_HOLIDAYS = ["01-22", "10-09"]
+FESTIVITIES = ["03-15", "03-16", "03-17", "03-18", "03-19"]
+# Valores por defecto de los márgenes y pesos de la búsqueda de días similares
+DEFAULT_MARGINS = {"temperature_2m": 2, "relativehumidity_2m": 50, "surface_pressure": 1000, "precipitation": 100,
+                   "snowfall": 100, "cloudcover": 50, "direct_radiation": 100, "windspeed_10m": 50, "winddirection_10m": 360}
+DEFAULT_PONDERS = [0.2, 0.1, 0.2, 0, 0, 0.1, 0.2, 0, 0]
+
+
+class SyntheticDatabase:
+    # Base de datos sintética y determinista para medir sin el SQL Server: años de meteorología horaria (histórica y
+    # prevista), demanda de un consumidor, generación de las granjas del área, precios y festivos. Se escribe como una
+    # copia local en SQLite con las mismas tablas y columnas que el servidor
+    AREA = 1
+    CONSUMER = 1
+    # id: (nombre, recurso, potencia instalada)
+    FARMS = {3: ("FarmA", "photovoltaic", 120), 4: ("FarmB", "photovoltaic", 80), 5: ("WindC", "wind", 50)}
+
+    def __init__(self, startDate="2018-01-01", years=4, seed=0):
+        random = np.random.default_rng(seed)
+        start = pd.Timestamp(startDate)
+        hours = pd.date_range(start, start + pd.DateOffset(years=years), freq="h", inclusive="left")
+        numHours = len(hours)
+        hour = hours.hour.to_numpy()
+        season = np.sin((hours.dayofyear.to_numpy() - 80) / 365.25 * 2 * np.pi)
+        daily = np.sin((hour - 9) / 24 * 2 * np.pi)
+
+        self.dates = pd.DataFrame({"id": np.arange(1, numHours + 1), "Date": hours, "Year": hours.year,
+                                   "Month": hours.month, "Day": hours.day, "Hour": hour})
+
+        # Variables con algo de persistencia entre horas (paseo aleatorio suavizado) para que haya días parecidos
+        def persistent(scale, size=numHours):
+            noise = random.standard_normal(size)
+            return scale * pd.Series(noise).ewm(alpha=0.05).mean().to_numpy() * 4
+
+        cloudcover = np.clip(50 + persistent(60), 0, 100)
+        solar = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None) * (0.65 + 0.35 * season)
+        windspeed = np.clip(12 + persistent(10) + 3 * random.standard_normal(numHours), 0, None)
+        precipitation = np.where(cloudcover > 85, random.exponential(1.5, numHours), 0)
+        temperature = 16 + 9 * season + 5 * daily + persistent(4)
+        weather = {
+            "temperature_2m": temperature,
+            "relativehumidity_2m": np.clip(65 - 2 * daily * 10 + persistent(20), 10, 100),
+            "surface_pressure": 1013 + persistent(8),
+            "precipitation": precipitation,
+            "snowfall": np.where(temperature < 1, precipitation * 0.7, 0),
+            "cloudcover": cloudcover,
+            "direct_radiation": 850 * solar * (1 - cloudcover / 130),
+            "windspeed_10m": windspeed,
+            "winddirection_10m": (200 + np.cumsum(random.normal(0, 8, numHours))) % 360,
+        }
+        self.weather = pd.DataFrame({"id": np.arange(1, numHours + 1), "date": self.dates["id"], "Area": SyntheticDatabase.AREA,
+                                     **{variable: np.round(weather[variable], 2) for variable in WEATHER_VARIABLES}})
+        # La previsión es la meteorología con el error de un modelo
+        forecast = {variable: weather[variable] + random.normal(0, 0.05, numHours) * np.std(weather[variable])
+                    for variable in WEATHER_VARIABLES}
+        self.forecast = pd.DataFrame({"id": np.arange(1, numHours + 1), "date": self.dates["id"], "Area": SyntheticDatabase.AREA,
+                                      **{variable: np.round(forecast[variable], 2) for variable in WEATHER_VARIABLES}})
+
+        monthDay = hours.strftime("%m-%d")
+        holidays = {"newYear": monthDay == "01-01", "localHoliday": np.isin(monthDay, LOCAL_HOLIDAYS),
+                    "nationalHoliday": np.isin(monthDay, NATIONAL_HOLIDAYS), "festivities": np.isin(monthDay, FESTIVITIES),
+                    "weekEnd": hours.dayofweek.to_numpy() >= 5}
+        holidays["weekDay"] = ~np.any(list(holidays.values()), axis=0)
+        self.holidays = pd.DataFrame({"date": self.dates["id"], "Area": SyntheticDatabase.AREA, **holidays})
+
+        working = holidays["weekDay"]
+        demand = (220 + 120 * np.clip(daily, 0, None) * np.where(working, 1, 0.6) + 4 * np.abs(temperature - 20) +
+                  15 * random.standard_normal(numHours))
+        self.power = {SyntheticDatabase.CONSUMER: np.round(np.clip(demand, 20, None), 2)}
+        for farm, (name, resource, installedPower) in SyntheticDatabase.FARMS.items():
+            if resource == "photovoltaic":
+                production = solar * (1 - cloudcover / 130) * (0.9 + 0.1 * random.random(numHours))
+            else:
+                production = np.clip((windspeed - 3) / 12, 0, 1)
+            # La generación se guarda en negativo, como en datosGEDER2
+            self.power[farm] = np.round(-installedPower * production, 2)
+
+        self.prices = pd.DataFrame({"date": self.dates["id"], "Area": SyntheticDatabase.AREA,
+                                    "Price": np.round(0.12 + 0.06 * daily + 0.03 * random.random(numHours), 4),
+                                    "Surplus": np.round(0.05 + 0.02 * random.random(numHours), 4)})
+        self.maxDemand = int(self.power[SyntheticDatabase.CONSUMER].max())
+        self.farms = pd.DataFrame([{"id": farm, "Name": name, "Area": SyntheticDatabase.AREA, "Type": "Generator",
+                                    "ResourceType": resource, "InstalledPower": installedPower}
+                                   for farm, (name, resource, installedPower) in SyntheticDatabase.FARMS.items()])
+
+    def getFingerprint(self):
+        # Cambia si cambian los datos, así no se comparan tiempos medidos sobre datos distintos
+        digest = hashlib.sha1()
+        for frame in (self.weather, self.forecast, self.holidays, self.prices):
+            digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+        for farm in sorted(self.power):
+            digest.update(self.power[farm].tobytes())
+        return digest.hexdigest()
+
+    def getFirstDay(self):
+        return self.dates["Date"].iloc[0].strftime("%Y-%m-%d")
+
+    def getLastDay(self):
+        return self.dates["Date"].iloc[-1].strftime("%Y-%m-%d")
+
+    def getTables(self):
+        # Tablas del servidor que lee la simulación, con sus columnas
+        locations = pd.concat([pd.DataFrame([{"id": SyntheticDatabase.CONSUMER, "Name": "Consumer", "Area": SyntheticDatabase.AREA,
+                                              "Type": "Consumer", "ResourceType": None, "InstalledPower": None}]), self.farms],
+                              ignore_index=True)
+        power = pd.concat([pd.DataFrame({"date": self.dates["id"], "location": location, "Power": values})
+                           for location, values in self.power.items()], ignore_index=True)
+        similarDaysColumns = ["Power"] + WEATHER_VARIABLES
+        descriptions = pd.concat([
+            pd.DataFrame({"Tabla": "HistoricalWeather", "nombre_dato": WEATHER_VARIABLES, "nombre_alternativo": WEATHER_VARIABLES,
+                          "unidad": "", "defaultMargin": [DEFAULT_MARGINS[variable] for variable in WEATHER_VARIABLES],
+                          "defaultPonder": DEFAULT_PONDERS}),
+            pd.DataFrame({"Tabla": "SimilarDays", "nombre_dato": similarDaysColumns, "nombre_alternativo": similarDaysColumns,
+                          "unidad": "", "Order": np.arange(len(similarDaysColumns), 0, -1)})], ignore_index=True)
+        parents = ["PotFV", "PotEol", "PotBio3"]
+        allocationParameters = pd.DataFrame({
+            "IdParameter": [f"{child}-{parent}" for parent in parents for child in ("PotDem", "Surplus", "PotBombeo2")] +
+                           ["PotDem-PotTurbina2", "PotDem-Grid"],
+            "Type": [parent for parent in parents for _ in range(3)] + ["PotTurbina2", "Grid"],
+            "ParameterType": "sunburstChildData"})
+        return {"Dates": (self.dates, ("id", "Date")), "HistoricalWeather": (self.weather, ("date",)),
+                "ForecastWeather": (self.forecast, ("date",)), "Holidays": (self.holidays, ("date",)),
+                "ElectricityPrice": (self.prices, ("date",)), "datosGEDER2": (power, ("date", "location")),
+                "Locations": (locations, ()), "descripcionDatos": (descriptions, ()),
+                "AllocationParameters": (allocationParameters, ()), "DataVersion": (pd.DataFrame({"Version": [1]}), ())}
+
+    def writeSnapshot(self, path):
+        # Copia local en SQLite con el formato de SqliteDataSource, la API la lee con INASOLAR_SNAPSHOT=path
+        with closing(sqlite3.connect(path)) as connection:
+            for table, (frame, indexColumns) in self.getTables().items():
+                SqliteDataSource.writeTable(connection, table, frame, indexColumns)
+            connection.commit()
@@ -4,7 +4,6 @@ import re
 import inspect
 from pandas import DataFrame
 from simulations.resourceAllocationGeneric import ResourceAllocation
-import numpy as np
 import datetime as dt
 from pydantic import BaseModel
 
@@ -109,13 +108,18 @@ def checkTypeOfDays(new_year,local_holiday,national_holiday,festivities,weekend,
                 detail="At least one 'type of day' must be true"
             )
     
-def convert_summary(summary):
-    for element in summary:
-        for dato in element:
-            if isinstance(element[dato], np.int64):
-                element[dato] = int(element[dato])
-    return summary
-    
+def checkSimulationColumns(columns):
+    # Columnas de la tabla de resultados y del sunburst, con y sin regulación
+    validColumns = {"Hour"} | {column["id"] for column in ResourceAllocation.COLUMNS_SIMULATION}
+    for paramId in ResourceAllocation.SUNBURST_DATA['IdParameter']:
+        validColumns |= {paramId, paramId + "Modified"}
+    invalidColumns = [column for column in columns if column not in validColumns]
+    if invalidColumns:
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Unknown simulation columns: {', '.join(invalidColumns)}"
+        )
+
 def getBoxploxData(result: DataFrame, q1: float, q3: float):
     data = []
     for i in range(0,24):
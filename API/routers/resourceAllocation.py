@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends,Query, Request,BackgroundTasks
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
 from typing import Annotated
 
-from dependencies import checkApiKey, checkDateFormat, checkDateOrder,getDateStringLeftSide,getClassAttributes,isfloat,isint,parseSimulationData,generateResourceAllocationGraph,generateResourceAllocationSunburst,convert_summary,generateTableFromSimulationResult,tableData
+from dependencies import checkApiKey, checkDateFormat, checkDateOrder,getDateStringLeftSide,getClassAttributes,isfloat,isint,parseSimulationData,generateResourceAllocationGraph,generateResourceAllocationSunburst,generateTableFromSimulationResult,tableData,checkSimulationColumns
 
 from simulations.simulator import simulator
-from simulations.resourceAllocationGeneric import ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL, ResourceAllocation,OPTIMIZATION_PARAMETERS_SUMMARY_SQL
+from simulations.resourceAllocationGeneric import ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL, ResourceAllocation,OPTIMIZATION_PARAMETERS_SUMMARY_SQL,ALLOCATION_PARAMETERS_OPTIMIZATION_SQL
+from simulations.optimizationExecutor import OptimizationExecutor
+from simulations.scenarioScreening import ScenarioScreening
+from simulations.surrogateOptimizer import SurrogateOptimizer
 
 from db import SQLdriver
 
-import copy
-
 from numpy import int64
 
 router = APIRouter(
@@ -25,6 +27,7 @@ db  = SQLdriver()
 
 router.lock = False
 router.simulations = []
+router.completedScenarios = 0
 router.totalLengthScenarios = 0
 router.optimization_running = False
 
@@ -85,7 +88,8 @@ async def get_simulation(apikey: Annotated[str, Query()],location_id: Annotated[
                          end_date: Annotated[str, Query(example="2022-01-02T00:00:00")],
                          request: Request,
                          max_demand: Annotated[float, Query()] = 546,
-                         without_failures: Annotated[bool, Query()] = False
+                         without_failures: Annotated[bool, Query()] = False,
+                         seed: Annotated[int | None, Query(description="Seed of the failures, the same seed gives the same failures")] = None
                          ):
     checkApiKey(apikey);checkDateFormat(start_date,end_date);db.CHECKLocationID(location_id)
     checkDateOrder(start_date,end_date)
@@ -94,6 +98,7 @@ async def get_simulation(apikey: Annotated[str, Query()],location_id: Annotated[
     my_simulator = simulator()
 
     setattr(my_simulator,"max_demand",max_demand)
+    setattr(my_simulator,"seed",seed)
     
     for key,value in form.items():
         if isint(value): 
@@ -105,29 +110,31 @@ async def get_simulation(apikey: Annotated[str, Query()],location_id: Annotated[
     
     location = {'Location':location_id,'Area':area}
 
-    simulation_result = my_simulator.range_simulation(start_day=getDateStringLeftSide(start_date),end_day=getDateStringLeftSide(end_date),location=location,
-                                                      parameters=ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL['IdParameter'],with_failures=not without_failures)
-    
-    #Tabla
-    simulation_table = generateTableFromSimulationResult(simulation_result,ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL)
+    # Tiempos de la petición: carga de datos, perfiles, simulación, resumen y construcción de la respuesta
+    with simulator.TIMINGS.scope("simulation"):
+        simulation_result = my_simulator.range_simulation(start_day=getDateStringLeftSide(start_date),end_day=getDateStringLeftSide(end_date),location=location,
+                                                          parameters=ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL['IdParameter'],with_failures=not without_failures,kernel=True,
+                                                          resume=True,persist=True)
 
-    #Graficas
-    graphWithRegulation = generateResourceAllocationGraph(simulation_result,"1")
-    graphWithoutRegulation = generateResourceAllocationGraph(simulation_result,"2")
-    
-    summary = simulator.get_summary(simulation_result, False)
+        with simulator.TIMINGS.span("response"):
+            #Tabla
+            simulation_table = generateTableFromSimulationResult(simulation_result,ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL)
+
+            #Graficas
+            graphWithRegulation = generateResourceAllocationGraph(simulation_result,"1")
+            graphWithoutRegulation = generateResourceAllocationGraph(simulation_result,"2")
 
-    summary = convert_summary(summary)
+            summary = simulator.get_summary(simulation_result, False)
 
-    #Sunburst
-    WithRegulationSunburst = generateResourceAllocationSunburst(simulation_result,"Modified")
-    WithoutRegulationSunburst = generateResourceAllocationSunburst(simulation_result,"")
+            #Sunburst
+            WithRegulationSunburst = generateResourceAllocationSunburst(simulation_result,"Modified")
+            WithoutRegulationSunburst = generateResourceAllocationSunburst(simulation_result,"")
 
-    #Cost graph
-    costGraph = {"data":[],"category":parseSimulationData(simulation_result["Date"])}
-    # Filtrar los datos para que recupere los datos de la primera gráfica o la segunda
-    for index, graphParameter in ResourceAllocation.COSTS_DATA.iterrows():
-        costGraph["data"].append({"name":graphParameter['GraphLabel'],"data":simulation_result[graphParameter['IdParameter']].to_list()})
+            #Cost graph
+            costGraph = {"data":[],"category":parseSimulationData(simulation_result["Date"])}
+            # Filtrar los datos para que recupere los datos de la primera gráfica o la segunda
+            for index, graphParameter in ResourceAllocation.COSTS_DATA.iterrows():
+                costGraph["data"].append({"name":graphParameter['GraphLabel'],"data":simulation_result[graphParameter['IdParameter']].to_list()})
 
     #simulation_json = GenericCode.convertToJSON(simulation_result)
     #simulation_result[['Date','Hour']].to_dict(orient='list')]
@@ -143,19 +150,125 @@ async def get_simulation(apikey: Annotated[str, Query()],location_id: Annotated[
             }
             }
 
-def optimizeMutex(scenario,scenarioParameters,start_day,end_day,location,simulationParameters,with_failures,my_simulator_copy):
-    #print(scenario)
-    for combination in scenario:
-                my_simulator_copy.setSimulatorParametersAPI(
-                    scenarioParameters, combination, OPTIMIZATION_PARAMETERS_SUMMARY_SQL)
-                simulationResult = my_simulator_copy.range_simulation(
-                    start_day, end_day, location, simulationParameters, with_failures)
-                summary = simulator.get_summary(simulationResult, True)
-            
-                summary.append(
-                    my_simulator_copy.addResourceParameters(OPTIMIZATION_PARAMETERS_SUMMARY_SQL['IdParameter']))
-                #print(summary)
-                router.simulations.append(summary)
+class columnsResult(BaseModel):
+    data : dict[str, list]
+
+@router.post("/simulationColumns",
+         response_model=columnsResult,
+         summary="Returns some columns of the simulation",
+         description="Returns the requested columns of the simulation result, only the values they need are computed",
+         tags=["Resource Allocation"]
+         )
+
+async def get_simulation_columns(apikey: Annotated[str, Query()],location_id: Annotated[int, Query(example=1)],
+                                 start_date: Annotated[str, Query(example="2022-01-01T00:00:00")],
+                                 end_date: Annotated[str, Query(example="2022-01-02T00:00:00")],
+                                 columns: Annotated[list[str], Query(example=["PotDem", "Grid"])],
+                                 request: Request,
+                                 max_demand: Annotated[float, Query()] = 546,
+                                 without_failures: Annotated[bool, Query()] = False,
+                                 seed: Annotated[int | None, Query(description="Seed of the failures, the same seed gives the same failures")] = None
+                                 ):
+    checkApiKey(apikey);checkDateFormat(start_date,end_date);db.CHECKLocationID(location_id)
+    checkDateOrder(start_date,end_date);checkSimulationColumns(columns)
+
+    form = await request.form()
+    my_simulator = simulator()
+
+    setattr(my_simulator,"max_demand",max_demand)
+    setattr(my_simulator,"seed",seed)
+
+    for key,value in form.items():
+        if isint(value):
+            setattr(my_simulator,key,int(value))
+        elif isfloat(value.replace(",",'.')):
+            setattr(my_simulator,key,float(value))
+
+    area = db.getAreaByLocationID(location_id)
+
+    location = {'Location':location_id,'Area':area}
+
+    # Siempre se devuelve la fecha de cada hora
+    columns = ["Date"] + [column for column in columns if column != "Date"]
+    with simulator.TIMINGS.scope("simulationColumns"):
+        simulation_result = my_simulator.range_simulation(start_day=getDateStringLeftSide(start_date),end_day=getDateStringLeftSide(end_date),location=location,
+                                                          with_failures=not without_failures,kernel=True,columns=columns)
+
+        with simulator.TIMINGS.span("response"):
+            data = {column: simulation_result[column].to_list() for column in columns}
+            data["Date"] = parseSimulationData(simulation_result["Date"])
+    return {"data":data}
+
+class ensembleData(BaseModel):
+    Realizations: int
+    Summary: list
+
+class ensembleResult(BaseModel):
+    data : ensembleData
+
+@router.post("/ensemble",
+         response_model=ensembleResult,
+         summary="Returns the failures ensemble summary",
+         description="Simulates several realizations of the failures and returns the mean and percentiles of each summary metric",
+         tags=["Resource Allocation"]
+         )
+
+async def get_ensemble(apikey: Annotated[str, Query()],location_id: Annotated[int, Query(example=1)],
+                       start_date: Annotated[str, Query(example="2022-01-01T00:00:00")],
+                       end_date: Annotated[str, Query(example="2022-01-02T00:00:00")],
+                       request: Request,
+                       max_demand: Annotated[float, Query()] = 546,
+                       realizations: Annotated[int, Query(ge=1, le=1000, description="Number of failure realizations")] = 100,
+                       seed: Annotated[int | None, Query(description="Seed of the failures, the same seed gives the same realizations")] = None
+                       ):
+    checkApiKey(apikey);checkDateFormat(start_date,end_date);db.CHECKLocationID(location_id)
+    checkDateOrder(start_date,end_date)
+
+    form = await request.form()
+    my_simulator = simulator()
+
+    setattr(my_simulator,"max_demand",max_demand)
+    setattr(my_simulator,"seed",seed)
+
+    for key,value in form.items():
+        if isint(value):
+            setattr(my_simulator,key,int(value))
+        elif isfloat(value.replace(",",'.')):
+            setattr(my_simulator,key,float(value))
+
+    area = db.getAreaByLocationID(location_id)
+
+    location = {'Location':location_id,'Area':area}
+
+    with simulator.TIMINGS.scope("ensemble"):
+        summary = my_simulator.ensemble_simulation(start_day=getDateStringLeftSide(start_date),end_day=getDateStringLeftSide(end_date),
+                                                   location=location,realizations=realizations)
+
+    return {"data":{"Realizations":realizations,"Summary":summary}}
+
+def optimizeMutex(executor,my_simulator,parameterSets,start_day,end_day,location,simulationParameters,with_failures,screening=None,surrogate=None):
+    def addResult(index,summary,final=True):
+        # Con criba solo se guardan los resúmenes del rango completo, los escenarios descartados quedan a None
+        if final:
+            router.simulations[index] = summary
+        router.completedScenarios += 1
+
+    # Los tiempos de los procesos de la optimización se suman al trabajo
+    with simulator.TIMINGS.scope("optimization"):
+        if surrogate is not None:
+            surrogate.run(executor,my_simulator,parameterSets,start_day,end_day,location,simulationParameters,with_failures,
+                          OPTIMIZATION_PARAMETERS_SUMMARY_SQL['IdParameter'],onResult=addResult)
+        elif screening is None:
+            executor.run(my_simulator,parameterSets,start_day,end_day,location,simulationParameters,with_failures,
+                         OPTIMIZATION_PARAMETERS_SUMMARY_SQL['IdParameter'],onResult=addResult)
+        else:
+            screening.run(executor,my_simulator,parameterSets,start_day,end_day,location,simulationParameters,with_failures,
+                          OPTIMIZATION_PARAMETERS_SUMMARY_SQL['IdParameter'],onResult=addResult)
+
+def getDefaultPonders():
+    # Pesos por defecto del ranking, los que valen 0 no cambian la puntuación
+    ponders = ALLOCATION_PARAMETERS_OPTIMIZATION_SQL[ALLOCATION_PARAMETERS_OPTIMIZATION_SQL['DefaultValue'].notnull()]
+    return {row['IdParameter']: row['DefaultValue'] for index, row in ponders.iterrows() if row['DefaultValue'] != 0}
 
 def getOptimizationData(summary):
     # Se cambia el nombre de las claves de la fila de regulación, y se fusionan ambas filas
@@ -163,6 +276,9 @@ def getOptimizationData(summary):
     # utilizados en cada simulación (posición 2 de la lista)
     newSummary = []
     for index, scenario in enumerate(summary):
+        # Escenario descartado por la criba
+        if scenario is None:
+            continue
         regulationRow = {key + 'WR': value for key,
                          value in scenario[1].items()}
         newScenario = {**scenario[0], **scenario[2]}
@@ -187,12 +303,16 @@ async def optimize(background_tasks: BackgroundTasks,
                     end_date: Annotated[str, Query(example="2022-01-02T00:00:00")],
                     request: Request,
                     max_demand: Annotated[float, Query()] = 546,
-                    without_failures: Annotated[bool, Query()] = False
+                    without_failures: Annotated[bool, Query()] = False,
+                    seed: Annotated[int | None, Query(description="Seed of the failures, shared by all the scenarios")] = None,
+                    workers: Annotated[int | None, Query(ge=1, description="Number of processes of the optimization, by default one per core")] = None,
+                    screening: Annotated[bool, Query(description="Screen the scenarios on shorter ranges and only simulate the best ones over the whole range")] = False,
+                    budget: Annotated[int | None, Query(ge=2, description="Number of simulations of the surrogate guided search, if not given all the scenarios are simulated")] = None
                     ):
     checkApiKey(apikey);checkDateFormat(start_date,end_date);db.CHECKLocationID(location_id)
     checkDateOrder(start_date,end_date)
     #Checkeamos que no haya una optimizacion rulando
-    if router.optimization_running and router.totalLengthScenarios != len(router.simulations) :
+    if router.optimization_running and router.totalLengthScenarios != router.completedScenarios :
         return {"data":["Currently, there is an optimization running."]}
     
     #Esperamos al formulario
@@ -201,6 +321,7 @@ async def optimize(background_tasks: BackgroundTasks,
 
     #Seteamos max demand
     setattr(my_simulator,"max_demand",max_demand)
+    setattr(my_simulator,"seed",seed)
     
     for key,value in form.items():
         if isint(value): 
@@ -220,15 +341,27 @@ async def optimize(background_tasks: BackgroundTasks,
     end_day = getDateStringLeftSide(end_date)
     simulationParameters = ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL['IdParameter']
     with_failures = not without_failures
+    #Todos los escenarios se simulan con los mismos fallos
+    my_simulator.commonRandomSeed()
 
     scenariosIntervals,totalLengthScenarios= my_simulator.getScenariosAPI(dict(form))
-    router.simulations = []
-    router.totalLengthScenarios = totalLengthScenarios
+    #Cada combinación se simula en un proceso del pool, solo se envían los parámetros que cambian
+    parameterSets = OptimizationExecutor.getParameterSets(my_simulator,scenariosIntervals,OPTIMIZATION_PARAMETERS_SUMMARY_SQL)
+    router.simulations = [None] * len(parameterSets)
+    router.completedScenarios = 0
+    router.totalLengthScenarios = len(parameterSets)
+    scenarioScreening = surrogateOptimizer = None
+    if budget is not None:
+        #Se simulan solo budget escenarios, elegidos por la mejora esperada del modelo sustituto
+        surrogateOptimizer = SurrogateOptimizer(getDefaultPonders(),budget)
+        router.totalLengthScenarios = min(budget,len(parameterSets))
+    elif screening:
+        scenarioScreening = ScenarioScreening(getDefaultPonders())
+        #El número de simulaciones sale de los mismos días que usa run
+        totalDays = ScenarioScreening.getTotalDays(start_day,end_day)
+        router.totalLengthScenarios = scenarioScreening.getEvaluations(len(parameterSets),totalDays)
     router.optimization_running = True
-    for scenario in scenariosIntervals:
-        my_simulator_copy = copy.deepcopy(my_simulator)
-        scenarioParameters = scenario[0].keys()
-        background_tasks.add_task(optimizeMutex,scenario, scenarioParameters, start_day, end_day, location, simulationParameters, with_failures, my_simulator_copy)
+    background_tasks.add_task(optimizeMutex,OptimizationExecutor(workers),my_simulator,parameterSets,start_day,end_day,location,simulationParameters,with_failures,scenarioScreening,surrogateOptimizer)
 
     #background_tasks.add_task(mutex)
     return {"data": ["OK"]}
@@ -246,7 +379,7 @@ class status(BaseModel):
 def getStatus(apikey: Annotated[str, Query()]):
     checkApiKey(apikey)
     if  router.totalLengthScenarios != 0:
-        progress = len(router.simulations) / router.totalLengthScenarios * 100
+        progress = router.completedScenarios / router.totalLengthScenarios * 100
     else:
         progress = 0
 
@@ -276,4 +409,43 @@ def getStatus(apikey: Annotated[str, Query()]):
 
             parsed_results.append(scenario)
         
-    return{"progress":progress,"data":parsed_results}
\ No newline at end of file
+    return{"progress":progress,"data":parsed_results}
+
+class spanTimings(BaseModel):
+    count: int
+    seconds: float
+    max: float
+
+class scopeTimings(BaseModel):
+    id: int
+    name: str
+    started: str
+    seconds: float | None
+    spans: dict[str, spanTimings]
+
+class timingsData(BaseModel):
+    totals: dict[str, spanTimings]
+    scopes: list[scopeTimings]
+
+class timingsResult(BaseModel):
+    data : timingsData
+
+@router.get("/timings",
+         response_model=timingsResult,
+         summary="Returns the simulation timings",
+         description="Returns the count and cumulative seconds of each span of the simulation (data_load, unit_profiles, hour_loop, regulation, summary, response), in total and for the last requests and optimization jobs",
+         tags=["Resource Allocation"]
+         )
+def getTimings(apikey: Annotated[str, Query()]):
+    checkApiKey(apikey)
+    return {"data": simulator.TIMINGS.getReport()}
+
+@router.get("/timings/prometheus",
+         response_class=PlainTextResponse,
+         summary="Returns the simulation timings for Prometheus",
+         description="Returns the total count and cumulative seconds of each span of the simulation in the Prometheus text format",
+         tags=["Resource Allocation"]
+         )
+def getTimingsPrometheus(apikey: Annotated[str, Query()]):
+    checkApiKey(apikey)
+    return simulator.TIMINGS.getPrometheus()
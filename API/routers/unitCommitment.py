@@ -3,7 +3,7 @@ from pydantic import BaseModel
 
 from typing import Annotated
 
-from dependencies import checkApiKey, checkDateFormat, checkDateOrder,getDateStringLeftSide,isfloat,isint,generateResourceAllocationGraph,generateResourceAllocationSunburst, checkTypeOfDays,convert_summary,datetimeFromString,generateTableFromSimulationResult
+from dependencies import checkApiKey, checkDateFormat, checkDateOrder,getDateStringLeftSide,isfloat,isint,generateResourceAllocationGraph,generateResourceAllocationSunburst, checkTypeOfDays,datetimeFromString,generateTableFromSimulationResult
 from dependencies import UnitCommitmentData,simpleDataList
 
 from simulations.resourceAllocationGeneric import ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL
@@ -88,7 +88,8 @@ async def get_margins_unit_commitment(apikey: Annotated[str, Query()],
                         windspeed_10m_generator:Annotated[float, Query(ge=0)] = 100 , winddirection_10m_generator:Annotated[float, Query(ge=0,le=360)] = 360,
                         q1:Annotated[float, Query(ge=0,le=1)] = 0.1, q3:Annotated[float, Query(ge=0,le=1)] = 0.9,
                         max_demand: Annotated[float, Query(ge=0)] = 546,
-                        without_failures: Annotated[bool, Query()] = False
+                        without_failures: Annotated[bool, Query()] = False,
+                        seed: Annotated[int | None, Query(description="Seed of the failures, the same seed gives the same failures")] = None
                         ):
     #COMPROBACIONES GENERALES
     checkApiKey(apikey)
@@ -105,7 +106,7 @@ async def get_margins_unit_commitment(apikey: Annotated[str, Query()],
     checkTypeOfDays(new_year,local_holiday,national_holiday,festivities,weekend,week_day)
 
     #MAX_DEMAND
-    resourceAllocationParameters = {"max_demand":max_demand}
+    resourceAllocationParameters = {"max_demand":max_demand,"seed":seed}
     form = await request.form()
     
     for key,value in form.items():
@@ -170,8 +171,6 @@ async def get_margins_unit_commitment(apikey: Annotated[str, Query()],
 
     #Simulation summary
     summary = simulator.get_summary(simulationResult, False)
-    #Hay que hacer esto porque hay numeros del tipo numpy int 64 que no son serializables a JSON/STR
-    summary = convert_summary(summary)
 
     #Sunburst
     WithRegulationSunburst = generateResourceAllocationSunburst(simulationResult,"Modified")
@@ -228,7 +227,8 @@ async def get_ponders_unit_commitment(apikey: Annotated[str, Query()],
                         windspeed_10m_generator:Annotated[float, Query(ge=0,le=1)] = 0 , winddirection_10m_generator:Annotated[float, Query(ge=0,le=1)] = 0,
                         q1:Annotated[float, Query(ge=0,le=1)] = 0.1, q3:Annotated[float, Query(ge=0,le=1)] = 0.9,
                         max_demand: Annotated[float, Query(ge=0)] = 546,
-                        without_failures: Annotated[bool, Query()] = False
+                        without_failures: Annotated[bool, Query()] = False,
+                        seed: Annotated[int | None, Query(description="Seed of the failures, the same seed gives the same failures")] = None
                         ):
     #COMPROBACIONES GENERALES
     checkApiKey(apikey)
@@ -244,7 +244,7 @@ async def get_ponders_unit_commitment(apikey: Annotated[str, Query()],
     typeOfDays={'newYear':False, 'localHoliday': False,'nationalHoliday': False, 'festivities': False,'weekEnd': False, 'weekDay': True}
 
     #MAX_DEMAND
-    resourceAllocationParameters = {"max_demand":max_demand}
+    resourceAllocationParameters = {"max_demand":max_demand,"seed":seed}
     form = await request.form()
     
     for key,value in form.items():
@@ -308,8 +308,6 @@ async def get_ponders_unit_commitment(apikey: Annotated[str, Query()],
     graphWithoutRegulation = generateResourceAllocationGraph(simulationResult,"2")
 
     summary = simulator.get_summary(simulationResult, False)
-    #Hay que hacer esto porque hay numeros del tipo numpy int 64 que no son serializables a JSON/STR
-    summary = convert_summary(summary)
 
     #Sunburst
     WithRegulationSunburst = generateResourceAllocationSunburst(simulationResult,"Modified")
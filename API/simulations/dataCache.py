@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+class SimulationDataCache:
+    # Caché de los datos de entrada de la simulación (meteorología y generación) compartida por todo el proceso.
+    # Cada entrada se guarda con la clave (location, area, inicio, fin); un rango incluido en otro ya cargado
+    # se sirve recortando el superconjunto, y se descartan las entradas menos usadas al pasar el límite de memoria.
+    # El fin de la clave es la última fecha leída: los días posteriores todavía no tienen datos y se vuelven a leer
+    def __init__(self, maxBytes=512 * 1024 ** 2, maxEntries=32):
+        self.maxBytes = maxBytes
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.totalBytes = 0
+        # Cargas en curso, para que las peticiones simultáneas de la misma localización esperen a una sola lectura
+        self.loading = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getData(self, location, area, start_day, end_day, loader):
+        # Devuelve (weather_data, generation_data) entre start_day y end_day. loader(start_day, end_day) lee de la
+        # base de datos y solo se llama si ningún rango cargado o en carga cubre el pedido
+        start, end = pd.Timestamp(start_day), pd.Timestamp(end_day)
+        while True:
+            with self.lock:
+                key = SimulationDataCache.findCovering(self.entries, location, area, start, end)
+                if key is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    data = self.entries[key]
+                    break
+                pending = SimulationDataCache.findCovering(self.loading, location, area, start, end)
+                if pending is None:
+                    key = (location, area, start, end)
+                    done = self.loading[key] = threading.Event()
+                    self.misses += 1
+                    data = None
+                    break
+                done = self.loading[pending]
+            # Otra petición está cargando un rango que incluye este, se espera y se vuelve a buscar
+            done.wait()
+        if data is not None:
+            return SimulationDataCache.slice(data, key, start, end)
+
+        try:
+            data = loader(start_day, end_day)
+            loadedEnd = SimulationDataCache.getLoadedEnd(data, end)
+            if loadedEnd is not None:
+                with self.lock:
+                    self.put(key[:3] + (loadedEnd,), data)
+        finally:
+            with self.lock:
+                del self.loading[key]
+            done.set()
+        return data
+
+    def getLoadedEnd(data, end):
+        # Fecha hasta la que están los datos leídos: el fin pedido o la última fecha que hay en todas las tablas con
+        # datos (un área puede no tener granjas). Sin ningún dato no se guarda
+        frames = [frame for frame in data if not frame.empty]
+        if not frames:
+            return None
+        return min([end] + [pd.Timestamp(frame['Date'].max()) for frame in frames])
+
+    def findCovering(entries, location, area, start, end):
+        for key in entries:
+            if key[0] == location and key[1] == area and key[2] <= start and key[3] >= end:
+                return key
+        return None
+
+    def slice(data, key, start, end):
+        if key[2] == start and key[3] == end:
+            return data
+        # Mismo filtro que la consulta: Date >= inicio y Date <= fin
+        return tuple(frame[(frame['Date'] >= start) & (frame['Date'] <= end)].reset_index(drop=True) for frame in data)
+
+    def put(self, key, data):
+        # Los rangos que quedan incluidos en el nuevo ya no hacen falta
+        for covered in [other for other in self.entries if other[0] == key[0] and other[1] == key[1] and
+                        other[2] >= key[2] and other[3] <= key[3]]:
+            self.remove(covered)
+        self.entries[key] = data
+        self.sizes[key] = sum(int(frame.memory_usage(deep=True).sum()) for frame in data)
+        self.totalBytes += self.sizes[key]
+        # Se descartan las entradas menos usadas, aunque siempre se mantiene la última cargada
+        while len(self.entries) > 1 and (self.totalBytes > self.maxBytes or len(self.entries) > self.maxEntries):
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        del self.entries[key]
+        self.totalBytes -= self.sizes.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.totalBytes = 0
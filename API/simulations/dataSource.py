@@ -0,0 +1,193 @@
+import sys
+import sqlite3
+from contextlib import closing
+import pandas as pd
+
+# Tablas con un valor por hora (columna date con el id de Dates), se copian solo en el rango de la copia local
+HOURLY_TABLES = ("HistoricalWeather", "ForecastWeather", "datosGEDER2", "Holidays", "ElectricityPrice")
+# Tablas de configuración y descripción, se copian enteras
+METADATA_TABLES = ("Locations", "Area", "descripcionDatos", "AllocationParameters", "RenewableEnergiesInfo",
+                   "OptimizationParameters", "OptimizationIntervals", "SimilarDaysParameters", "UnitCommitment",
+                   "TableDescriptions", "DataVersion")
+
+
+class DataSource:
+    # Lecturas de la base de datos que hace la simulación: meteorología, demanda y generación por rango, precios,
+    # festivos y tablas de configuración. Las consultas son las mismas en SQL Server y en la copia local en SQLite,
+    # cada implementación solo cambia cómo se leen y se comparan las fechas (timestamp y day)
+    def __init__(self, connectable):
+        self.connectable = connectable
+
+    def read(self, sql, params=None, dates=None):
+        return pd.read_sql(sql, self.connectable, params=params, parse_dates=dates)
+
+    def dispose(self):
+        pass
+
+    def formatTimestamp(value):
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    def getRange(self, column="d.Date"):
+        return f"{column} >= {self.timestamp()} AND {column} <= {self.timestamp()}"
+
+    def getMaxDemand(self):
+        return int(self.read("SELECT MAX(Power) AS MaxDemand FROM datosGEDER2")['MaxDemand'].iloc[0])
+
+    def getDataVersion(self):
+        # Versión de los datos: la única fila de DataVersion, que los scripts de carga incrementan al escribir
+        # en las tablas horarias que lee la simulación (datosGEDER2, HistoricalWeather y ElectricityPrice)
+        return int(self.read("SELECT Version FROM DataVersion")['Version'].iloc[0])
+
+    def getMetadata(self, table, where=None, orderBy=None, columns="*"):
+        sql = f"SELECT {columns} FROM {table}"
+        if where is not None:
+            sql += f" WHERE {where}"
+        if orderBy is not None:
+            sql += f" ORDER BY {orderBy}"
+        return self.read(sql)
+
+    def getAllocationParameters(self, where, orderBy="ParametersOrder"):
+        return self.read(f"""SELECT a.* FROM AllocationParameters a
+                             LEFT JOIN RenewableEnergiesInfo r ON a.Type = r.IdType
+                             WHERE {where} ORDER BY {orderBy}""")
+
+    def getColumnDescriptions(self, table, columns="nombre_dato, nombre_alternativo, unidad", orderBy=None):
+        return self.getMetadata("descripcionDatos", f"Tabla = '{table}'", orderBy, columns)
+
+    def getFarms(self, area, locationGenerator=None):
+        # Granjas del área, o solo la del recurso seleccionado en la predicción
+        sql = "SELECT * FROM Locations WHERE Area = ? AND Type = 'Generator'"
+        params = (area,)
+        if locationGenerator:
+            sql += " AND id = ?"
+            params += (locationGenerator,)
+        return self.read(sql, params)
+
+    def getDateRange(self, table, area):
+        # Primera y última fecha de una tabla horaria en el área (HistoricalWeather, ForecastWeather, ElectricityPrice)
+        return self.read(f"""SELECT MIN(d.Date) AS DateMin, MAX(d.Date) AS DateMax FROM {table} t, Dates d
+                             WHERE d.id = t.date AND t.Area = ?""", (area,), dates=["DateMin", "DateMax"])
+
+    def getSimulationWeather(self, location, start_day, end_day):
+        # Meteorología, demanda y precios de cada hora de la localización. El día final solo entra a medianoche
+        return self.read(f"""SELECT d.Hour, {self.day('d.Date')} AS Fecha, h.windspeed_10m, h.temperature_2m, d.Date, g.Power,
+                                    e.Price, e.Surplus
+                             FROM datosGEDER2 g, HistoricalWeather h, Dates d, Locations l, ElectricityPrice e
+                             WHERE e.date = d.id AND l.Area = h.Area AND g.date = d.id AND d.id = h.date
+                             AND l.id = ? AND g.location = ? AND {self.getRange()}
+                             ORDER BY d.Date""",
+                         (location, location, DataSource.formatTimestamp(start_day), DataSource.formatTimestamp(end_day)),
+                         dates=["Date"])
+
+    def getGeneration(self, area, start_day, end_day):
+        # Generación de cada hora de todas las granjas del área, por granja y fecha
+        return self.read(f"""SELECT l.Name, d.Hour, {self.day('d.Date')} AS Fecha, h.windspeed_10m, d.Date, g.Power
+                             FROM datosGEDER2 g, HistoricalWeather h, Dates d, Locations l
+                             WHERE l.Area = h.Area AND g.date = d.id AND d.id = h.date AND l.id = g.location
+                             AND l.Area = ? AND l.Type = 'Generator' AND {self.getRange()}
+                             ORDER BY l.Name, d.Date""",
+                         (area, DataSource.formatTimestamp(start_day), DataSource.formatTimestamp(end_day)), dates=["Date"])
+
+    def getSimilarDaysData(self, location, start, end):
+        # Meteorología, demanda y festivos de cada hora de la localización, con todas las columnas de las tablas
+        # (filtro_dias las recorre por posición)
+        return self.read(f"""SELECT d.Hour, {self.day('d.Date')} AS Fecha, h.*, d.*, g.Power, ho.*
+                             FROM datosGEDER2 g
+                             JOIN Locations l ON l.id = ? AND g.location = l.id
+                             JOIN Dates d ON g.date = d.id
+                             JOIN HistoricalWeather h ON d.id = h.date AND l.Area = h.Area
+                             JOIN Holidays ho ON d.id = ho.date AND ho.Area = l.Area
+                             WHERE {self.getRange()}
+                             ORDER BY d.Date""",
+                         (location, DataSource.formatTimestamp(start), DataSource.formatTimestamp(end)), dates=["Date"])
+
+    def getForecastWeather(self, area, start, end):
+        return self.read(f"""SELECT d.Hour, {self.day('d.Date')} AS Fecha, f.*, d.*, ho.*
+                             FROM ForecastWeather f, Dates d, Holidays ho
+                             WHERE d.id = ho.date AND d.id = f.date AND {self.getRange()}
+                             AND ho.Area = ? AND f.Area = ?
+                             ORDER BY d.Date""",
+                         (DataSource.formatTimestamp(start), DataSource.formatTimestamp(end), area, area), dates=["Date"])
+
+    def getHistoricalDay(self, location, area, date):
+        return self.read(f"""SELECT d.Hour, {self.day('d.Date')} AS Date, h.*, datos.Power
+                             FROM Dates d
+                             INNER JOIN HistoricalWeather h ON d.id = h.date
+                             INNER JOIN datosGEDER2 datos ON datos.date = d.id
+                             WHERE d.Year = ? AND d.Month = ? AND d.Day = ? AND h.Area = ? AND datos.location = ?""",
+                         (date.year, date.month, date.day, area, location))
+
+    def getLocationForecast(self, location, start, end):
+        # Previsión de las horas desde start hasta end (sin incluir) del área de la localización
+        return self.read(f"""SELECT d.Hour, {self.day('d.Date')} AS Date, h.*
+                             FROM ForecastWeather h, Dates d, Holidays ho, Locations l
+                             WHERE l.Area = h.Area AND d.id = ho.date AND d.id = h.date
+                             AND l.id = ? AND ho.Area = l.Area
+                             AND d.Date >= {self.timestamp()} AND d.Date < {self.timestamp()}
+                             ORDER BY d.Date""",
+                         (location, DataSource.formatTimestamp(start), DataSource.formatTimestamp(end)))
+
+    def getPrices(self, area, start, end):
+        return self.read(f"""SELECT e.Price, e.Surplus, d.Date AS ElectricityDate,
+                                    {self.day('d.Date')} AS ElectricityDateWithNoHour
+                             FROM ElectricityPrice e
+                             INNER JOIN Dates d ON d.id = e.date
+                             WHERE {self.getRange()} AND e.Area = ?""",
+                         (DataSource.formatTimestamp(start), DataSource.formatTimestamp(end), area), dates=["ElectricityDate"])
+
+
+class SqlServerDataSource(DataSource):
+    def timestamp(self):
+        return "CONVERT(DATETIME, ?, 120)"
+
+    def day(self, column):
+        return f"CONVERT(varchar(10), {column}, 23)"
+
+    def dispose(self):
+        # Los procesos hijos no pueden usar las conexiones heredadas del padre, abren las suyas
+        self.connectable.dispose(close=False)
+
+
+class SqliteDataSource(DataSource):
+    # Copia local de la base de datos en un fichero SQLite (createSnapshot). Las fechas se guardan como texto
+    # 'AAAA-MM-DD hh:mm:ss', que se compara igual que las fechas. Cada lectura abre su conexión, así se puede usar
+    # desde varios hilos y desde los procesos de la optimización
+    def __init__(self, path):
+        super().__init__(path)
+
+    def read(self, sql, params=None, dates=None):
+        with closing(sqlite3.connect(self.connectable)) as connection:
+            return pd.read_sql(sql, connection, params=params, parse_dates=dates)
+
+    def timestamp(self):
+        return "?"
+
+    def day(self, column):
+        return f"substr({column}, 1, 10)"
+
+    def createSnapshot(source, path, start_day, end_day):
+        # Copia en path las tablas horarias de los días entre start_day y end_day (las 24 horas de los dos) y las
+        # tablas de configuración
+        with closing(sqlite3.connect(path)) as connection:
+            params = (DataSource.formatTimestamp(start_day),
+                      DataSource.formatTimestamp(pd.Timestamp(end_day) + pd.Timedelta(hours=23)))
+            dates = source.read(f"SELECT * FROM Dates d WHERE {source.getRange()}", params, dates=["Date"])
+            SqliteDataSource.writeTable(connection, "Dates", dates, ("id", "Date"))
+            for table in HOURLY_TABLES:
+                frame = source.read(f"SELECT t.* FROM {table} t, Dates d WHERE t.date = d.id AND {source.getRange()}", params)
+                SqliteDataSource.writeTable(connection, table, frame, ("date",))
+            for table in METADATA_TABLES:
+                SqliteDataSource.writeTable(connection, table, source.getMetadata(table))
+            connection.commit()
+
+    def writeTable(connection, table, frame, indexColumns=()):
+        frame.to_sql(table, connection, index=False, if_exists="replace")
+        for column in indexColumns:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+
+
+if __name__ == "__main__":
+    # python -m simulations.dataSource copia.sqlite 2022-01-01 2023-01-01
+    from .genericCode import GenericCode
+    path, start_day, end_day = sys.argv[1:4]
+    SqliteDataSource.createSnapshot(GenericCode.dataSource, path, start_day, end_day)
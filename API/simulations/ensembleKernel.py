@@ -0,0 +1,134 @@
+import numpy as np
+from .genericCode import GenericCode
+from .simulationKernel import SimulationKernel
+
+
+class EnsembleKernel(SimulationKernel):
+    # Simula a la vez varias realizaciones de los fallos con arrays (realización, hora) y devuelve solo el resumen
+    # de cada realización (mismas métricas que simulator.get_summary con optimize=False)
+
+    def simulate(self, profiles, failures):
+        # failures tiene, por cada recurso, un array (realización, hora) con el estado de todas las horas del rango
+        validDays = profiles['validDays']
+        numDays = len(profiles['valid'])
+        numRealizations = len(failures['fv_working'])
+
+        working = {key: np.asarray(values[:, :numDays * 24], dtype=np.int64).reshape(numRealizations, numDays, 24)[:, validDays]
+                   .reshape(numRealizations, -1) for key, values in failures.items()}
+        # Se mantiene la asignación de get_hour_assignment (bombeo con la cola de turbina y viceversa)
+        fvWorking, eolWorking, bioWorking = working['fv_working'], working['eolic_working'], working['biogas_working']
+        pumpWorking, turbineWorking = working['turbine_working'], working['pump_working']
+
+        simulator = self.simulator
+        table = {"FV working": fvWorking, "Eolic working": eolWorking, "Biogas working": bioWorking,
+                 "Pump working": pumpWorking, "Turbine working": turbineWorking}
+        table["ElectricityGridPrice"] = profiles["ElectricityGridPrice"]
+        table["ElectricitySurplusPrice"] = profiles["ElectricitySurplusPrice"]
+        potFVUni = profiles["PotFVUni"] * fvWorking
+        potEolUni = profiles["PotEolUni"] * eolWorking
+        table["PotDem"] = profiles["PotDemUni"] * simulator.max_demand
+        table["EnergyCostWithoutRenewables"] = table["PotDem"] * table["ElectricityGridPrice"]
+        table["PotFV"] = potFVUni * self.photovoltaic_power
+        table["PotEol"] = potEolUni * self.wind_turbine_power
+        potDem1 = table["PotDem"] - table["PotFV"] - table["PotEol"]
+        potBio1 = np.where(potDem1 > 0, np.minimum(potDem1, self.generator_max_power), 0) * bioWorking
+
+        # Recurrente hora a hora, cada paso calcula todas las realizaciones
+        shape = potDem1.shape
+        for column in EnsembleKernel.SUMMARY_STORAGE:
+            table[column] = np.empty(shape)
+            table[column + 'Modified'] = np.empty(shape)
+        table["PotFVModified"], table["PotEolModified"] = table["PotFV"].copy(), table["PotEol"].copy()
+        previous = previousModified = None
+        for hour in range(shape[1]):
+            result = self.regulationEngine.storageStep(potDem1[:, hour], potBio1[:, hour], 1, pumpWorking[:, hour],
+                                                       turbineWorking[:, hour], previous)
+            previous = result[11:]
+            regulated = self.regulationEngine.storageStep(potDem1[:, hour], potBio1[:, hour], 1, pumpWorking[:, hour],
+                                                          turbineWorking[:, hour], previousModified)
+
+            # Realizaciones con excedente en esta hora
+            rows = np.flatnonzero(GenericCode.roundArray(result[10], 3) < 0)
+            if len(rows):
+                rowsPrevious = None
+                if previousModified is not None:
+                    rowsPrevious = [values[rows] for values in previousModified]
+                coefficients, values = self.regulationEngine.regulateRows(
+                    potFVUni[rows, hour], potEolUni[rows, hour], table["PotDem"][hour], bioWorking[rows, hour],
+                    pumpWorking[rows, hour], turbineWorking[rows, hour], rowsPrevious, result[8][rows])
+                table["PotFVModified"][rows, hour], table["PotEolModified"][rows, hour] = values[0], values[1]
+                for index in range(len(regulated)):
+                    regulated[index][rows] = values[4 + index]
+            previousModified = regulated[11:]
+
+            for column, index in EnsembleKernel.SUMMARY_STORAGE.items():
+                table[column][:, hour] = result[index]
+                table[column + 'Modified'][:, hour] = regulated[index]
+
+        return table
+
+    def getSummaries(self, table):
+        # Métricas de get_summary por realización: para cada variante ("" y "Modified") un diccionario de arrays
+        simulator = self.simulator
+        numHours = table['PotDem'].shape[-1]
+        working = [table[column] for column in ("FV working", "Eolic working", "Biogas working", "Pump working", "Turbine working")]
+        numberFailures = 0
+        for values in working:
+            numberFailures = numberFailures + (1 - values[:, 0]) + (values[:, 1:] < values[:, :-1]).sum(axis=-1)
+        allWorking = working[0] * working[1] * working[2] * working[3] * working[4]
+
+        summaries = []
+        for i in ("", "Modified"):
+            potDemFinal = table['PotDemFinal' + i]
+            grid = np.where(potDemFinal >= 0, potDemFinal, 0)
+            surplus = np.where(potDemFinal >= 0, 0, potDemFinal)
+            moneySpent = grid * table['ElectricityGridPrice'] - surplus * table['ElectricitySurplusPrice']
+            energyCost = (moneySpent + (table['PotFV' + i] * (simulator.pv_generation_mean_cost / 100) + simulator.pv_amortization_cost_hour) +
+                          (table['PotEol' + i] * (simulator.eol_generation_mean_cost / 100) + simulator.eol_amortization_cost_hour) +
+                          (table['PotBio3' + i] * (simulator.bio_generation_mean_cost / 100) + simulator.bio_amortization_cost_hour) +
+                          (table['PotTurbina2' + i] * (simulator.hydraulic_generation_mean_cost / 100) + simulator.hydraulic_amortization_cost_hour))
+            if simulator.digester_volume != 0:
+                sosBiogas = SimulationKernel.roundValues(((table['VolBioFinal' + i] - self.biogas_minimum_volume) / (
+                    self.biogas_maximum_volume - self.biogas_minimum_volume)) * 100)
+            else:
+                sosBiogas = np.zeros(potDemFinal.shape)
+            sosWaterTank = SimulationKernel.roundValues(table['VolDepSup2' + i] / self.upper_tank_volume * 100)
+            roundedDemand = np.rint(potDemFinal)
+            lole = roundedDemand > 0
+
+            summary = {}
+            summary["surplusSummary"] = GenericCode.roundArray(surplus.sum(axis=-1))
+            summary["gridSummary"] = GenericCode.roundArray(grid.sum(axis=-1))
+            absoluteSurplus = np.abs(summary["surplusSummary"])
+            summary["balance"] = GenericCode.roundArray(summary["gridSummary"] + summary["surplusSummary"])
+            summary["absoluteSum" + i] = summary["balance"]
+            summary["interchangeCount"] = ((grid != 0) | (surplus != 0)).sum(axis=-1)
+            summary["numberFailures"] = numberFailures
+            summary["sosWaterTank"] = GenericCode.roundArray(sosWaterTank.sum(axis=-1) / numHours)
+            summary["sosBiogas"] = GenericCode.roundArray(sosBiogas.sum(axis=-1) / numHours)
+            summary["loleSin"] = (lole * allWorking).sum(axis=-1)
+            summary["loleCon"] = lole.sum(axis=-1) - summary["loleSin"]
+            summary["loleTotal"] = summary["loleCon"] + summary["loleSin"]
+            summary["lolpSin"] = GenericCode.roundArray(summary["loleSin"] / numHours * 100)
+            summary["lolpCon"] = GenericCode.roundArray(summary["loleCon"] / numHours * 100)
+            summary["lolpTotal"] = GenericCode.roundArray(summary["lolpSin"] + summary["lolpCon"])
+            summary["lossLoad"] = summary["gridSummary"]
+            summary["energyNotUsed"] = GenericCode.roundArray(absoluteSurplus + (table['PotBio2' + i] - table['PotBio3' + i]).sum(axis=-1))
+            summary["energyCostRenewables"] = GenericCode.roundArray(energyCost.sum(axis=-1))
+            summary["energyInterchange"] = GenericCode.roundArray(np.abs(summary["gridSummary"]) + absoluteSurplus)
+            summary["numberInterruptions"] = ((roundedDemand[:, :-1] <= 0) & (roundedDemand[:, 1:] > 0)).sum(axis=-1)
+            summaries.append(summary)
+        return summaries
+
+    def getSummaryBands(summaries, percentiles=(5, 50, 95)):
+        # Media y percentiles de cada métrica entre todas las realizaciones, con números de Python
+        bands = []
+        for summary, simulation in zip(summaries, ('Without Regulation', 'With Regulation')):
+            band = {}
+            for metric, values in summary.items():
+                band[metric] = {'mean': GenericCode.roundNumber(float(np.mean(values)))}
+                for percentile, value in zip(percentiles, np.percentile(values, percentiles).tolist()):
+                    band[metric][f'p{percentile}'] = GenericCode.roundNumber(value)
+            band['Simulation'] = simulation
+            bands.append(band)
+        return bands
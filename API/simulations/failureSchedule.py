@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class FailureSchedule:
+    # Estado de cada recurso en cada hora de la simulación (1 funciona, 0 averiado), con las mismas claves
+    # que usa get_hour_assignment para los fallos del día
+    COMPONENTS = ["fv_working", "eolic_working", "biogas_working", "turbine_working", "pump_working"]
+
+    def __init__(self, working):
+        self.working = working
+
+    def generate(simulator, hours, seedSequence=None):
+        # Tiempo hasta el fallo con una exponencial y tiempo de reparación con una Rayleigh, por cada recurso
+        scales = {"fv_working": (simulator.pvExponentialScale, simulator.pvRayleighScale),
+                  "eolic_working": (simulator.windPowerExponentialScale, simulator.windPowerRayleighScale),
+                  "biogas_working": (simulator.biogasExponentialScale, simulator.biogasRayleighScale),
+                  "turbine_working": (simulator.hydraulicExponentialScale, simulator.hydraulicRayleighScale),
+                  "pump_working": (simulator.hydraulicExponentialScale, simulator.hydraulicRayleighScale)}
+        # Cada recurso tiene su propio generador, derivado de la semilla del simulador, así los fallos de uno
+        # no cambian al modificar los parámetros de otro
+        if seedSequence is None:
+            seedSequence = np.random.SeedSequence(simulator.seed)
+        streams = seedSequence.spawn(len(scales))
+        return FailureSchedule({component: FailureSchedule.renewalStates(simulator, stream, exponentialScale, rayleighScale, hours)
+                                for stream, (component, (exponentialScale, rayleighScale)) in zip(streams, scales.items())})
+
+    def renewalStates(simulator, stream, exponentialScale, rayleighScale, hours):
+        # Se sortean de golpe los ciclos (horas funcionando, horas averiado) necesarios para cubrir todas las horas.
+        # Las horas funcionando y las de avería salen de generadores distintos, así los primeros ciclos son los
+        # mismos aunque cambie el número de horas simuladas
+        workingRandom, failureRandom = [np.random.default_rng(child) for child in stream.spawn(2)]
+        durations = []
+        total = 0
+        while total <= hours:
+            cycles = int(1.2 * hours / max(exponentialScale + rayleighScale, 1)) + 10
+            cycle = np.column_stack([simulator.generate_exponential(exponentialScale, cycles, workingRandom),
+                                     simulator.generate_rayleigh(rayleighScale, cycles, failureRandom)]).ravel()
+            durations.append(cycle)
+            total += int(cycle.sum())
+        # Cada hora está en el ciclo que indica el número de cambios de estado anteriores: par funciona, impar averiado
+        changes = np.cumsum(np.concatenate(durations))
+        states = np.searchsorted(changes, np.arange(hours), side='right') % 2 == 0
+        return states.astype(np.int8)
+
+    def day(self, dayIndex):
+        # Fallos de las 24 horas del día, como enteros de Python igual que las antiguas colas
+        start = dayIndex * 24
+        return {component: values[start:start + 24].tolist() for component, values in self.working.items()}
@@ -10,12 +10,17 @@ import numpy as np
 from datetime import datetime, timedelta
 from .genericCode import GenericCode
 
+# Tipos de día de Holidays, cada uno es un bit de la máscara de tipos de día
+DAY_TYPES = ('newYear', 'localHoliday', 'nationalHoliday', 'festivities', 'weekEnd', 'weekDay')
+
 # Funciones principales para obtener información de las fechas
 # ---------------------------------------------------------------
 class filtro_dias:
     
     def __init__(self):
         self.preprocessed_data = {}
+        # Medias diarias y máscara de tipos de día de cada localización, para la búsqueda por márgenes
+        self.daily_features = {}
 
     def fixIntervalDates(rangeData):
         rangeData = rangeData.sort_values(by='Date')        
@@ -47,13 +52,11 @@ class filtro_dias:
         # PARSEAMOS LA FECHA A DATETIME
         targetDate = parser.parse(targetDate)
         startDate, endDate = filtro_dias.parseDates(startDate, endDate)
-        day_data = pd.read_sql(f"""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Fecha, h.*, d.*,g.Power, ho.*
-                                   FROM datosGEDER2 g, HistoricalWeather h, Dates d, Holidays ho,Locations l
-                                   WHERE l.Area = h.Area AND g.date = d.id AND d.id = ho.date AND d.id = h.date
-                                   AND l.id ={location} AND ho.Area = l.Area AND g.location = {location}
-                                   AND (d.Date >= CONVERT(DATETIME, '{startDate}', 102) AND d.Date <= CONVERT(DATETIME, '{endDate}', 102)
-                                   OR (Year = {targetDate.year} AND Month = {targetDate.month} AND Day = {targetDate.day}))
-                                   ORDER BY CONCAT(Year,'-',Month,'-',Day), d.Hour """, GenericCode.engine)
+        day_data = GenericCode.dataSource.getSimilarDaysData(location, startDate, endDate)
+        # El día objetivo puede estar fuera del rango, se lee aparte
+        if not startDate <= targetDate <= endDate:
+            day_data = pd.concat([day_data, GenericCode.dataSource.getSimilarDaysData(
+                location, targetDate, targetDate + timedelta(hours=23))], ignore_index=True)
         rangeData = filtro_dias.fixIntervalDates(day_data)
         objective_day = rangeData.query(
             f"Year == {targetDate.year} and Month == {targetDate.month} and Day == {targetDate.day} ")
@@ -63,7 +66,7 @@ class filtro_dias:
     
     def calculateTable(self,similarDaysGrouped):
         # Define las operaciones a aplicar a cada columna
-        operationsSql = pd.read_sql("""SELECT * FROM SimilarDaysParameters""", GenericCode.engine)
+        operationsSql = GenericCode.dataSource.getMetadata('SimilarDaysParameters')
         paramOperations = operationsSql.set_index('ParameterId')['Operation'].to_dict()
     
         # Aplica las operaciones a las columnas de SimilarDays
@@ -83,20 +86,23 @@ class filtro_dias:
         #rangeDates, objective_day, targetDate = filtro_dias.getRangeAndObjectiveDay(date, fecha_ini, fecha_fin, location['Location'])
         targetDate = parser.parse(date)
         startDate, endDate = filtro_dias.parseDates(fecha_ini, fecha_fin)
-        rangeDates = self.preprocessed_data[location['Location']].query(f'Date >= "{startDate.strftime("%Y-%m-%d")}" and Date <= "{endDate.strftime("%Y-%m-%d")}"')
-        objective_day = self.preprocessed_data[location['Location']].query(
+        data = self.preprocessed_data[location['Location']]
+        features, dayTypes = self.daily_features[location['Location']]
+        objective_day = data.query(
             f"Year == {targetDate.year} and Month == {targetDate.month} and Day == {targetDate.day} ")
         
         if filtro_dias.hoursMissing(objective_day):
             return {'errorMessage': 'Hours missing in target date'}
-        query = filtro_dias.getSimilarDaysByMargins(margins, objective_day, typeOfDays)
-        
-        # AÑADIMOS LOS TIPOS DE DIAS
+        similar = filtro_dias.getSimilarDaysMask(features, dayTypes, objective_day, margins, typeOfDays)
+    
         # Si en los días devueltos no se encuentra el target (porque los tipos de días seleccionados no concuerdan con su tipo)
         # se añade manualmente
-        query += f"| (Date == '{targetDate.date()}')"
-    
-        similar_days = filtro_dias.getSimilarDaysByTargetDate(rangeDates, objective_day, query)
+        dates = features['Date'].to_numpy()
+        similar |= dates == str(targetDate.date())
+        similar &= (dates >= startDate.strftime("%Y-%m-%d")) & (dates <= endDate.strftime("%Y-%m-%d"))
+
+        # COGEMOS LAS HORAS DE LOS DÍAS SIMILARES
+        similar_days = data[data['Date'].isin(dates[similar])]
         similar_days = filtro_dias.calculatePowerDistance(objective_day, similar_days)
 
         return similar_days
@@ -127,96 +133,95 @@ class filtro_dias:
         # Mismo tipo de dia
         # if type_of_holiday:
         #    day_data = day_data.query(f'type_of_holiday == "{objective_day.values[0][-1]}"')
-        #Calculamos errores/distancias
-        errors = []        
-        # Se calculan las distancias de cada cada día en cada variable con respecto al día objetivo
-        for hour in rangeData.values:
-            #hour[0] == es una hora determinada, por ejemplo: 22
-            #columnas de la 3 a la 12 corresponden con las variables meteorológicas
-            try:
-                errors.append(list(map(lambda x, y: abs(y-x) , hour[3:12], objective_day.values[hour[0]][3:12])))
-            except Exception as e:
-                return {'errorMessage': f"Error: {e}"}, None                        
+        # Columnas de la 3 a la 12: variables meteorológicas, en el mismo orden en el histórico y en el día objetivo
+        variables = rangeData.columns[3:12]
+        hours = rangeData['Hour'].to_numpy()
+        # La hora de cada fila es la posición de esa hora en el día objetivo
+        missing = hours[hours >= len(objective_day)]
+        if len(missing):
+            return {'errorMessage': f"Error: index {missing[0]} is out of bounds for axis 0 with size {len(objective_day)}"}, None
 
-        
-        #Añadimos las distancias como columnas con nombre incluido
-        for i in range(len(rangeData.columns[3:12])):
-            rangeData[rangeData.columns[3:12][i]+'_distance'] = list(map(lambda x: x[i],errors)) #Hay que hacerlo asi porque errors es multidimensional  
-        #Cogemos un dia entero(todas las horas) y sumamos las distancias de las diferentes variables
+        # Se calculan las distancias de cada hora en cada variable con respecto a la misma hora del día objetivo
+        for position, variable in enumerate(variables):
+            objective = objective_day.iloc[:, 3 + position].to_numpy()
+            rangeData[variable + '_distance'] = abs(rangeData.iloc[:, 3 + position].to_numpy() - objective[hours])
 
         #HAY DIAS INCOMPLETOS CUIDADO! DIAS CON MENOS HORAS PUDEN TENER MENOS DISTANCIA SUMADA Y TENER MEJOR NOTA DE LA QUE DEBERIAN
         complete_days = rangeData.groupby(by="Date")['Hour'].size()
         complete_days = complete_days[complete_days == 24].index
         rangeData = rangeData[rangeData['Date'].isin(complete_days)]
 
-        #Calculamos distancias
-        distance_sums = rangeData.groupby(by="Date",as_index=False).sum(numeric_only=True)
-        columns_name_score = []
-        # Calculamos la nota sobre 100
-        for i in range(len(rangeData.columns[3:12])):
-            column_name = rangeData.columns[3:12][i]+'_distance'
-            columns_name_score.append('score_'+column_name)
-            minimum = min(distance_sums[column_name])  # mínimo = nota 100
-            maximum = max(distance_sums[column_name])  # máximo = nota 0
-            # cálculo de nota alternativa (no lineal)
-            # f(x)=-((100)/(500^(2))) x^(2)+100
-            #distance_sums['score_temp'] = list(map(lambda x: ((-1)*((100-minimum)/pow(maximum,2))*pow(x,2))+(100-minimum) ,distance_sums['temperature_2m_distance']))
-            maxScore = 100
-            if minimum == maximum:
-                distance_sums['score_'+column_name] = list(map(lambda x: ponders[i]*maxScore ,distance_sums[column_name].values))
-            
-            else:
-                distance_sums['score_'+column_name] = list(map(lambda x: ponders[i]*((x*(-1*(maxScore-minimum)/maximum))+(maxScore-minimum)) ,distance_sums[column_name].values))
+        # Distancias de cada día como una matriz (días, 24, variables), con los días ordenados por fecha
+        order = np.argsort(rangeData['Date'].to_numpy(), kind='stable')
+        days = rangeData['Date'].to_numpy()[order][::24]
+        distances = rangeData[[variable + '_distance' for variable in variables]].to_numpy(dtype=float)[order]
+        distance_sums = filtro_dias.sumByDay(distances.reshape(-1, 24, len(variables)))
+        power = filtro_dias.sumByDay(rangeData['Power'].to_numpy(dtype=float)[order].reshape(-1, 24, 1))[:, 0]
 
-        #Sumamos todas las notas (las últimas 9 columnas)
-        distance_sums['score_final'] = distance_sums[columns_name_score].sum(axis=1)
+        # Calculamos la nota sobre 100 de cada variable: la distancia mínima es un 100 y la máxima un 0
+        # cálculo de nota alternativa (no lineal)
+        # f(x)=-((100)/(500^(2))) x^(2)+100
+        maxScore = 100
+        minimum = distance_sums.min(axis=0, initial=np.inf)
+        maximum = distance_sums.max(axis=0, initial=-np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (distance_sums * (-1 * (maxScore - minimum) / maximum)) + (maxScore - minimum)
+        scores = np.where(minimum == maximum, maxScore, scores) * np.asarray(ponders, dtype=float)
+        # Sumamos todas las notas, variable a variable
+        score_final = np.add.reduce(np.ascontiguousarray(scores.T), axis=0)
 
-        #Cogemos las 20 mejores notas por defecto
-        best_days = distance_sums.query("Power != 0") # quitamos dias incompletos (rellena los nulos/NaN con 0)
-        best_days = best_days.sort_values(by="score_final", ascending = False)[:num_days]
-    
-        return best_days.loc[:, ['Date', 'score_final']], rangeData
-    
-    
-    def getSimilarDaysByMargins(margins, objective_day, typeOfDays):
-        typeOfDaysQuery = []
-        for key in typeOfDays:
-            if typeOfDays[key]:
-                typeOfDaysQuery.append(f"{key} == True")
-    
-        # ITERAMOS SOBRE LOS MARGENES PARA AÑADIRLOS A LA CONSULTA
-        query = ''
-        # PILLAMOS LAS MEDIAS DEL DIA OBJETIVO
+        # Cogemos las 20 mejores notas por defecto, sin los dias incompletos (rellena los nulos/NaN con 0)
+        candidates = np.flatnonzero(power != 0)
+        best = candidates[filtro_dias.getBestScores(score_final[candidates], num_days)]
+        best_days = pd.DataFrame({'Date': days[best], 'score_final': score_final[best]}, index=best)
+
+        return best_days, rangeData
+
+    def sumByDay(values):
+        # Suma de las 24 horas de cada día de values (días, 24, columnas) sin los nulos. Es la suma compensada que usa
+        # groupby().sum(), así las notas son las mismas que al sumar con pandas
+        total = np.zeros((values.shape[0], values.shape[2]))
+        compensation = np.zeros_like(total)
+        for hour in range(values.shape[1]):
+            value = values[:, hour]
+            valid = ~np.isnan(value)
+            y = value - compensation
+            t = total + y
+            newCompensation = t - total - y
+            newCompensation[np.isnan(newCompensation)] = 0
+            compensation = np.where(valid, newCompensation, compensation)
+            total = np.where(valid, t, total)
+        return total
+
+    def getBestScores(scores, num_days):
+        # Posiciones de las num_days mejores notas de mayor a menor. Con argpartition se buscan las que llegan a la
+        # nota de corte y solo se ordenan esas. A igual nota va primero el día anterior
+        candidates = np.arange(len(scores))
+        if 0 < num_days < len(scores):
+            threshold = scores[np.argpartition(-scores, num_days - 1)[num_days - 1]]
+            candidates = np.flatnonzero(scores >= threshold)
+        return candidates[np.argsort(-scores[candidates], kind='stable')][:num_days]
+    
+    
+    def getDailyFeatures(data):
+        # Medias de cada día y máscara de bits con sus tipos de día (bit i: el día es del tipo DAY_TYPES[i])
+        features = data.groupby(by='Date', as_index=False).mean(numeric_only=True)
+        dayTypes = np.zeros(len(features), dtype=np.uint8)
+        for bit, dayType in enumerate(DAY_TYPES):
+            dayTypes |= (features[dayType].to_numpy() == True).astype(np.uint8) << bit
+        return features, dayTypes
+
+    def getSimilarDaysMask(features, dayTypes, objective_day, margins, typeOfDays):
+        # Días cuya media está dentro del margen de la media del día objetivo en cada variable y que son de alguno de
+        # los tipos de día seleccionados
         objetive_day_mean = objective_day.mean(numeric_only=True)
+        similar = np.ones(len(features), dtype=bool)
         for key in margins.keys():
-            query += f" {key} >=  {float(objetive_day_mean[key])-float(margins[key])} & {key} <=  {float(objetive_day_mean[key])+float(margins[key])} &"
-    
-        # AÑADIMOS LOS TIPOS DE DIAS
-        # Si en los días devueltos no se encuentra el target (porque los tipos de días seleccionados no concuerdan con su tipo)
-        # se añade manualmente
-        query += f") & ({'' if not typeOfDaysQuery else ' | '.join(typeOfDaysQuery)})"
-        
-        # QUITAMOS UNA COSA FEA DEL STRING
-        query = query.replace('&)', '')
-        
-        return query
-    
-    
-    def getSimilarDaysByTargetDate(day_data, objective_day, query):            
-        # AGRUPAMOS LOS DIAS POR FECHA Y MEDIA
-        day_data2 = day_data.groupby(
-            by='Date', as_index=False).mean(numeric_only=True)
-    
-        # QUITAMOS UNA COSA FEA DEL STRING
-        query = query.replace('&)', '')
-        
-        # HACEMOS LA CONSULTA Y COGEMOS LAS FECHAS SIMILARES
-        similar_days = day_data2.query(query)
-
-        # COGEMOS LAS HORAS DEL DATAFRAME ORIGINAL CUYAS FECHAS COINCIDAN CON SIMILAR_DAYS
-        similar_days = day_data[day_data['Date'].isin(similar_days['Date'].values)]
-    
-        return similar_days
+            values = features[key].to_numpy()
+            similar &= (values >= float(objetive_day_mean[key]) - float(margins[key])) & \
+                       (values <= float(objetive_day_mean[key]) + float(margins[key]))
+        selectedTypes = sum(1 << bit for bit, dayType in enumerate(DAY_TYPES) if typeOfDays.get(dayType))
+        return similar & ((dayTypes & selectedTypes) != 0)
     
     
     def getSimilarDaysByHours(best_days, day_data, targetDate):
@@ -230,15 +235,7 @@ class filtro_dias:
     def getDateInfoHistoricalWeather(date, locationData):
         # PARSEAMOS LA FECHA A DATETIME
         date = parser.parse(date)
-        dateInfoByHourSql = pd.read_sql("""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Date, h.*, datos.Power
-                                            FROM Dates d
-                                            INNER JOIN HistoricalWeather h ON d.id = h.date
-                                            INNER JOIN datosGEDER2 datos ON datos.date = d.id
-                                            WHERE d.Year = ? AND d.Month = ?
-                                            AND d.Day = ?
-                                            AND h.Area = ?
-                                            AND datos.location = ?""", GenericCode.engine,
-                                        params=(date.year, date.month, date.day, locationData['Area'], locationData['Location']))
+        dateInfoByHourSql = GenericCode.dataSource.getHistoricalDay(locationData['Location'], locationData['Area'], date)
         dateInfoByHourSql = filtro_dias.fixData(
             dateInfoByHourSql, ['id', 'date', 'Area', 'Hour'])
     
@@ -249,13 +246,7 @@ class filtro_dias:
         # PARSEAMOS LA FECHA A DATETIME
         endDate = parser.parse(endDate) + timedelta(days=1)
         endDate = endDate.strftime("%Y-%m-%d")
-        dateInfoByHourSql = pd.read_sql("""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Date, h.*
-                               FROM ForecastWeather h, Dates d, Holidays ho,Locations l
-                               WHERE l.Area = h.Area AND d.id = ho.date AND d.id = h.date
-                               AND l.id = ? AND ho.Area = l.Area
-                               AND (d.Date >= CONVERT(DATETIME, ?, 102) AND d.Date < CONVERT(DATETIME, ?, 102))
-                               ORDER BY CONCAT(Year,'-',Month,'-',Day), d.Hour""", GenericCode.engine,
-                                        params=(locationData['Location'], startDate, endDate))
+        dateInfoByHourSql = GenericCode.dataSource.getLocationForecast(locationData['Location'], startDate, endDate)
         dateInfoByHourSql = filtro_dias.fixData(
             dateInfoByHourSql, ['id', 'date', 'Area', 'Hour'])
     
@@ -384,22 +375,10 @@ class filtro_dias:
         return q1, median, q3, lowerfence, upperfence
 
     def preprocess_location(self, location_id):
-        data = pd.read_sql(f"""SELECT d.Hour, 
-                CONVERT(varchar(10), d.Date, 23) AS Fecha, 
-                h.*, 
-                d.*, 
-                g.Power, 
-                ho.*
-            FROM datosGEDER2 g
-            JOIN Locations l ON l.id = {location_id} AND g.location = {location_id}
-            JOIN Dates d ON g.date = d.id
-            JOIN HistoricalWeather h ON d.id = h.date AND l.Area = h.Area
-            JOIN Holidays ho ON d.id = ho.date AND ho.Area = l.Area
-
-            WHERE (d.Date BETWEEN '2018-01-01' AND '2100-01-01') 
-            ORDER BY CONCAT(Year,'-',Month,'-',Day), d.Hour;""", GenericCode.engine)
+        data = GenericCode.dataSource.getSimilarDaysData(location_id, '2018-01-01', '2100-01-01')
         
         self.preprocessed_data[location_id] = filtro_dias.fixIntervalDates(data)
+        self.daily_features[location_id] = filtro_dias.getDailyFeatures(self.preprocessed_data[location_id])
 
         
         
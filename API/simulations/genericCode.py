@@ -2,8 +2,11 @@ from sqlalchemy import create_engine
 from importlib import reload
 from datetime import datetime
 import pandas as pd
+import numpy as np
 import urllib
 import logging
+import os
+from .dataSource import SqlServerDataSource, SqliteDataSource
 
 class GenericCode:
     # FUNCIONES
@@ -27,12 +30,8 @@ class GenericCode:
         date = pd.to_datetime(date)
         return date.dt.strftime('%Y-%m-%d %H:%M')
     
-    def getAndParseDate(dateSql):
-        maxDateAllowedSql = pd.read_sql(dateSql, GenericCode.engine)
-        maxDateAllowed = datetime.strptime(
-            str(maxDateAllowedSql['Date'].iloc[0]), '%Y-%m-%d %H:%M:%S')
-
-        return maxDateAllowed.date()
+    def getMaxDate(table, area):
+        return GenericCode.dataSource.getDateRange(table, area)['DateMax'].iloc[0].date()
 
     def generateParametersWithValue(parametersId, parametersValue):
         return {inputID['key']: inputValue for inputID, inputValue in zip(
@@ -40,11 +39,8 @@ class GenericCode:
 
     
     def getWeatherDateRanges(area):
-        minHistoricalDate = pd.read_sql(f"select min(d.date) as DateMin from HistoricalWeather h, Dates d where d.id = h.date and h.Area = {area}",GenericCode.engine)
-        maxForecastDate = pd.read_sql(f"select max(d.date) as DateMax from ForecastWeather f, Dates d where d.id = f.date and f.Area = {area}", GenericCode.engine)
-                
-        minDateAllowed = datetime.strptime(str(minHistoricalDate.iloc[0]['DateMin']), '%Y-%m-%d %H:%M:%S').date()
-        maxDateAllowed = datetime.strptime(str(maxForecastDate.iloc[0]['DateMax']), '%Y-%m-%d %H:%M:%S').date()
+        minDateAllowed = GenericCode.dataSource.getDateRange('HistoricalWeather', area)['DateMin'].iloc[0].date()
+        maxDateAllowed = GenericCode.getMaxDate('ForecastWeather', area)
         return minDateAllowed, maxDateAllowed
     
     def getPowerDateRange(area):
@@ -74,22 +70,35 @@ class GenericCode:
             return round(float(value), digitsRounded)
         return value
 
+    def roundArray(values, digitsRounded = 2):
+        # Mismo resultado que round() de Python en cada elemento. np.round puede diferir cuando el valor
+        # está casi a mitad de camino, esos pocos elementos se redondean con round()
+        values = np.asarray(values, dtype=float)
+        scaled = values * 10 ** digitsRounded
+        rounded = np.rint(scaled)
+        doubtful = np.abs(np.abs(scaled - np.floor(scaled)) - 0.5) < 1e-6
+        if doubtful.any():
+            rounded[doubtful] = np.rint(np.array([round(value, digitsRounded) for value in values[doubtful].tolist()]) *
+                                        10 ** digitsRounded)
+        return rounded / 10 ** digitsRounded
+
     # VARIABLES
     # ---------------------------------------------------------------
     server = "158.42.22.107"
     database = "inasolar"
     user = "GEDER"
     password = "GEDER"
-    engine = selectDB(server, database, user, password)
-    MAX_DEMAND = int(pd.read_sql('SELECT MAX(Power) FROM datosGEDER2', engine).iloc[0].iloc[0])
+    # Todas las lecturas de la simulación pasan por dataSource. Con INASOLAR_SNAPSHOT se lee de una copia local
+    # en SQLite (SqliteDataSource.createSnapshot) en lugar del servidor, y no se abre ninguna conexión con él
+    if "INASOLAR_SNAPSHOT" in os.environ:
+        engine = None
+        dataSource = SqliteDataSource(os.environ["INASOLAR_SNAPSHOT"])
+    else:
+        engine = selectDB(server, database, user, password)
+        dataSource = SqlServerDataSource(engine)
+    MAX_DEMAND = dataSource.getMaxDemand()
 
-    SIMILAR_DAYS_RESULT_COLUMNS_SQL = pd.read_sql(
-    """SELECT nombre_dato, nombre_alternativo, unidad
-       FROM descripcionDatos
-       WHERE Tabla = 'SimilarDays'
-       ORDER BY [Order] DESC""", engine)
-    HISTORICAL_WEATHER_COLUMNS_SQL = pd.read_sql(
-    """SELECT nombre_dato, nombre_alternativo, unidad, defaultMargin, defaultPonder
-               FROM descripcionDatos
-               WHERE Tabla = 'HistoricalWeather'""", engine)
+    SIMILAR_DAYS_RESULT_COLUMNS_SQL = dataSource.getColumnDescriptions('SimilarDays', orderBy='[Order] DESC')
+    HISTORICAL_WEATHER_COLUMNS_SQL = dataSource.getColumnDescriptions(
+        'HistoricalWeather', 'nombre_dato, nombre_alternativo, unidad, defaultMargin, defaultPonder')
 
@@ -0,0 +1,113 @@
+import os
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .simulator import simulator
+from .simulatorConfig import SimulatorConfig
+
+# Estado de cada proceso del pool, se rellena una sola vez en initializeWorker
+WORKER = {}
+
+
+def initializeWorker(baseConfig, data, start_day, end_day, location, simulationParameters, with_failures, summaryParameters):
+    # Los datos de entrada de todo el trabajo se dejan en la caché del proceso, así range_simulation no vuelve a
+    # leerlos y los rangos más cortos de la criba se sirven recortándolos
+    simulator.DATA_CACHE.getData(location['Location'], location['Area'], start_day, end_day, lambda start, end: data)
+    WORKER.update(baseConfig=baseConfig, location=location, simulationParameters=simulationParameters,
+                  with_failures=with_failures, summaryParameters=summaryParameters)
+
+
+def simulateCombinations(start_day, end_day, combinations):
+    # combinations es una lista de (índice, parámetros que cambian respecto al simulador base).
+    # Junto a los resúmenes se devuelven los tiempos del bloque, para sumarlos en el proceso principal
+    results = []
+    with simulator.TIMINGS.scope("worker", keep=False) as spans:
+        for index, changes in combinations:
+            scenarioSimulator = simulator.fromConfig(WORKER['baseConfig'])
+            scenarioSimulator.__dict__.update(changes)
+            # Solo se usa el resumen, no se construye la tabla horaria
+            summary = scenarioSimulator.range_simulation(
+                start_day, end_day, WORKER['location'], WORKER['simulationParameters'], WORKER['with_failures'],
+                summary_only=True)
+            summary.append(scenarioSimulator.addResourceParameters(WORKER['summaryParameters']))
+            results.append((index, summary))
+    return results, spans
+
+
+class OptimizationExecutor:
+    # Reparte las combinaciones de la optimización entre un pool de procesos. Cada proceso recibe una vez el
+    # simulador base y los datos de entrada, y por cada combinación solo los atributos que cambian.
+    # Los procesos se arrancan con spawn, no se copian con fork del servidor, que tiene hilos en marcha
+    CONTEXT = multiprocessing.get_context("spawn")
+
+    def __init__(self, workers=None, chunksPerWorker=4):
+        self.workers = workers or os.cpu_count()
+        self.chunksPerWorker = chunksPerWorker
+        self.completed = 0
+        self.total = 0
+        self.pool = None
+
+    @contextmanager
+    def job(self, baseSimulator, start_day, end_day, location, simulationParameters, with_failures, summaryParameters):
+        # Pool de un trabajo de optimización, se reutiliza en todas las llamadas a run dentro del bloque (escalones de
+        # la criba, lotes del modelo sustituto). Dentro solo pueden cambiar las combinaciones y el rango, que tiene que
+        # estar incluido entre start_day y end_day. Si ya hay un pool abierto se usa ese
+        if self.pool is not None:
+            yield self
+            return
+        data = simulator.getSimulationData(location, start_day, end_day)
+        initargs = (SimulatorConfig.fromSimulator(baseSimulator), data, start_day, end_day, location,
+                    list(simulationParameters), with_failures, list(summaryParameters))
+        # Con spawn los procesos se arrancan según hacen falta, hasta workers
+        with ProcessPoolExecutor(self.workers, mp_context=OptimizationExecutor.CONTEXT, initializer=initializeWorker,
+                                 initargs=initargs) as self.pool:
+            try:
+                yield self
+            finally:
+                self.pool = None
+
+    def getParameterSets(baseSimulator, scenariosIntervals, optimizeParameters):
+        # Mismo recorrido que optimizeMutex: dentro de cada grupo los cambios se aplican sobre la misma copia,
+        # así cada combinación parte del estado que dejó la anterior
+        baseConfig = SimulatorConfig.fromSimulator(baseSimulator)
+        parameterSets = []
+        for scenario in scenariosIntervals:
+            if not scenario:
+                continue
+            scenarioSimulator = simulator.fromConfig(baseConfig)
+            scenarioParameters = scenario[0].keys()
+            for combination in scenario:
+                scenarioSimulator.setSimulatorParametersAPI(scenarioParameters, combination, optimizeParameters)
+                parameterSets.append(baseConfig.getChanges(scenarioSimulator))
+        return parameterSets
+
+    def run(self, baseSimulator, parameterSets, start_day, end_day, location, simulationParameters, with_failures,
+            summaryParameters, onResult=None):
+        # Devuelve los resúmenes en el orden de parameterSets. onResult(índice, resumen) se llama según van llegando
+        if self.pool is None and parameterSets:
+            with self.job(baseSimulator, start_day, end_day, location, simulationParameters, with_failures,
+                          summaryParameters):
+                return self.run(baseSimulator, parameterSets, start_day, end_day, location, simulationParameters,
+                                with_failures, summaryParameters, onResult)
+
+        self.total = len(parameterSets)
+        self.completed = 0
+        results = [None] * self.total
+        if not parameterSets:
+            return results
+
+        workers = min(self.workers, self.total)
+        # Varios bloques por proceso para repartir bien la carga sin pagar el envío de cada combinación por separado
+        chunkSize = max(1, -(-self.total // (workers * self.chunksPerWorker)))
+        combinations = list(enumerate(parameterSets))
+        futures = [self.pool.submit(simulateCombinations, start_day, end_day, combinations[start:start + chunkSize])
+                   for start in range(0, self.total, chunkSize)]
+        for future in as_completed(futures):
+            chunkResults, spans = future.result()
+            simulator.TIMINGS.merge(spans)
+            for index, summary in chunkResults:
+                results[index] = summary
+                self.completed += 1
+                if onResult is not None:
+                    onResult(index, summary)
+        return results
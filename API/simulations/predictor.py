@@ -3,6 +3,7 @@ from datetime import timedelta
 from .filtro_dias import filtro_dias
 from .simulator import simulator
 from .genericCode import GenericCode
+from .resultAccumulator import ResultAccumulator
 
 
 def getPredictedPower(similarDays, objectiveDay):
@@ -12,12 +13,11 @@ def getPredictedPower(similarDays, objectiveDay):
     return pd.concat([objectiveDay, powerPredicted['Power']], axis=1), similarDays
 
 
-def getPredictedPowerMargins(margins, objectiveDay, typeOfDays, rangeData):
-    query = filtro_dias.getSimilarDaysByMargins(
-        margins, objectiveDay, typeOfDays)
-    # Se usa la query para obtener los días similares que cumplen las condiciones de márgenes
-    similarDays = filtro_dias.getSimilarDaysByTargetDate(
-        rangeData, objectiveDay, query)
+def getPredictedPowerMargins(margins, objectiveDay, typeOfDays, rangeData, dailyFeatures):
+    # Se obtienen los días similares que cumplen las condiciones de márgenes con las medias diarias del rango
+    features, dayTypes = dailyFeatures
+    similar = filtro_dias.getSimilarDaysMask(features, dayTypes, objectiveDay, margins, typeOfDays)
+    similarDays = rangeData[rangeData['Date'].isin(features['Date'].to_numpy()[similar])]
     if similarDays.empty:
         raise Exception('There are no similar days for the selected margins')
 
@@ -36,47 +36,26 @@ def getPredictedPowerPonders(ponders, objectiveDay, rangeData, num_days):
 
 def getForecastElectricityPrice(area):
     # Se obtiene la última fecha de la que se tiene precio
-    priceMaxDateSql = pd.read_sql(f"""SELECT MAX(d.date) AS Date
-                                     FROM [inasolar].[dbo].[ElectricityPrice] e
-                                     INNER JOIN Dates d ON e.date = d.id
-                                     WHERE Area = {area}""", GenericCode.engine)
-    targetDate = pd.to_datetime(priceMaxDateSql['Date'][0])
+    targetDate = GenericCode.dataSource.getDateRange('ElectricityPrice', area)['DateMax'][0]
     if not targetDate:
         raise Exception('No electricity price data for this area')
 
     startDate = (targetDate - timedelta(days=6)).date()
     startDate, targetDate = filtro_dias.parseDates(str(startDate), str(targetDate.date()))
-    electricityPriceSql = pd.read_sql("""SELECT e.Price, e.Surplus, d.Date AS ElectricityDate,
-                                           CONVERT(varchar(10), d.Date, 23) AS ElectricityDateWithNoHour
-                                           FROM [inasolar].[dbo].ElectricityPrice e
-                                           INNER JOIN Dates d ON d.id = e.date
-                                           WHERE d.Date >= CONVERT(DATETIME, ?, 102) AND d.Date <= CONVERT(DATETIME, ?, 102)
-                                           AND e.Area = ?""", GenericCode.engine,
-                                      params=(startDate, targetDate, area))
+    electricityPriceSql = GenericCode.dataSource.getPrices(area, startDate, targetDate)
     
     return electricityPriceSql
 
 
 def getRangeData(startDate, endDate, location):
-    rangeData = pd.read_sql(f"""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Fecha, h.*, d.*,g.Power, ho.* 
-                           FROM datosGEDER2 g, HistoricalWeather h, Dates d, Holidays ho
-                           WHERE g.date = d.id AND d.id = ho.date AND d.id = h.date AND
-                           (d.Date >= CONVERT(DATETIME, '{startDate}', 102) AND d.Date <= CONVERT(DATETIME, '{endDate}', 102))
-                           AND ho.Area = {location['Area']} AND h.Area = {location['Area']} AND
-                           g.location = {location['Location']} ORDER BY Fecha, d.Hour """, GenericCode.engine)
+    rangeData = GenericCode.dataSource.getSimilarDaysData(location['Location'], startDate, endDate)
     rangeData = filtro_dias.fixIntervalDates(rangeData)
 
     return rangeData
 
 
 def getForecastWeather(startDate, endDate, area):
-    forecastWeather = pd.read_sql(f"""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Fecha, f.*, d.*, ho.* 
-                           FROM ForecastWeather f, Dates d, Holidays ho
-                           WHERE d.id = ho.date AND d.id = f.date
-                           AND d.Date >= CONVERT(DATETIME, '{startDate}', 102)
-                           AND d.Date <= CONVERT(DATETIME, '{endDate}', 102)
-                           AND ho.Area = {area} AND f.Area = {area}""", GenericCode.engine)    
-                           
+    forecastWeather = GenericCode.dataSource.getForecastWeather(area, startDate, endDate)
     return filtro_dias.fixIntervalDates(forecastWeather)                     
 
 
@@ -88,25 +67,29 @@ def getPredictionCheckingFailures(simulationParameters, with_failures, final_dat
     simulation = simulator()
     for key, value in simulationParameters.items():
         setattr(simulation, key, value)
-    (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure,
-     general_table, next_hours) = simulation.initializeVariables(with_failures, final_date, current_date, locationGenerator['Area'], locationGenerator['Location'])
+    failure_schedule, general_table, next_hours = simulation.initializeVariables(with_failures, final_date, current_date, locationGenerator['Area'], locationGenerator['Location'])
     electricityPriceSql = getForecastElectricityPrice(locationGenerator['Area'])
     maxDate = pd.to_datetime(electricityPriceSql['ElectricityDateWithNoHour']).max()
     maxElectricityPrice = electricityPriceSql[electricityPriceSql['ElectricityDateWithNoHour'] == str(maxDate.date())].reset_index(drop=True)
-    totalSimilarDays = None
+    results = ResultAccumulator()
+    # Los días similares de cada día se guardan en una lista y se concatenan una sola vez al final
+    similarDaysByDay = []
+    # Las medias diarias del histórico son las mismas para todos los días que se predicen
+    if similarDaysTab == 'tab-margins':
+        dailyFeaturesConsumer = filtro_dias.getDailyFeatures(rangeDataConsumer)
+        dailyFeaturesGenerator = filtro_dias.getDailyFeatures(rangeDataGenerator)
+    day = 0
     while current_date < final_date:
-        (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure,
-         next_hours) = simulation.initializeFailures(with_failures, FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure,
-                                                     Turbine_hours_until_failure, Pump_hours_until_failure, next_hours)
+        next_hours = simulation.initializeFailures(with_failures, failure_schedule, day, next_hours)
         # Se obtiene la previsión de cada día a simular
         objectiveDay = forecastWeather[(forecastWeather['Year'] == current_date.year) &
                                        (forecastWeather['Month'] == current_date.month) &
                                        (forecastWeather['Day'] == current_date.day)].reset_index(drop=True)
         if similarDaysTab == 'tab-margins':
             predictedDayConsumer, similarDaysConsumer = getPredictedPowerMargins(
-                consumerInputsValue, objectiveDay, typeOfDays, rangeDataConsumer)
+                consumerInputsValue, objectiveDay, typeOfDays, rangeDataConsumer, dailyFeaturesConsumer)
             predictedDayGenerator, similarDaysGenerator = getPredictedPowerMargins(
-                generatorInputsValue, objectiveDay, typeOfDays, rangeDataGenerator)
+                generatorInputsValue, objectiveDay, typeOfDays, rangeDataGenerator, dailyFeaturesGenerator)
 
         else:
             predictedDayConsumer, similarDaysConsumer = getPredictedPowerPonders(
@@ -119,16 +102,18 @@ def getPredictionCheckingFailures(simulationParameters, with_failures, final_dat
         # Columna que indica el día al que pertenecen el conjunto de días similares
         similarDaysConsumer['PredictedDay'] = current_date
         try:
-            general_table = pd.concat([general_table, simulation.getDailyAssignment(predictedDayConsumer, predictedDayGenerator,
-                                                                                    current_date, general_table, next_hours, parameters)],
-                                      ignore_index=True)
+            results.append(simulation.getDailyRows(predictedDayConsumer, predictedDayGenerator,
+                                                   current_date, results.lastRow(), next_hours, parameters))
             # Cada conjuntos de días similares se añaden a esta lista para devolverlos todos y mostrarlos en una gráfica
-            totalSimilarDays = pd.concat([totalSimilarDays, similarDaysConsumer])
+            similarDaysByDay.append(similarDaysConsumer)
         except Exception as e:
             print(f"Error en: {current_date}", e)
             raise Exception(e)
         current_date = current_date + timedelta(days=1)
+        day += 1
 
+    general_table = results.toDataFrame()
+    totalSimilarDays = pd.concat(similarDaysByDay) if similarDaysByDay else None
     electricityPriceSql = electricityPriceSql.rename(columns={'ElectricityDate': 'Date'})
     return general_table, totalSimilarDays, electricityPriceSql
 
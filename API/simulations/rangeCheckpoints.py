@@ -0,0 +1,30 @@
+import threading
+from collections import OrderedDict
+
+
+class RangeCheckpoints:
+    # Última simulación de cada configuración (simulador, localización, día inicial, fallos y parámetros): la tabla,
+    # el día final y el estado de la última hora. Si se pide un rango más largo se sigue desde aquí y solo se simulan
+    # los días nuevos, y si se pide uno más corto se recorta la tabla
+    def __init__(self, maxEntries=8):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, checkpoint):
+        with self.lock:
+            self.entries[key] = checkpoint
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
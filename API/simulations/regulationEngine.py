@@ -0,0 +1,177 @@
+import numpy as np
+from itertools import product
+from .genericCode import GenericCode
+
+
+class RegulationEngine:
+    # Coeficientes de regulación que se prueban en las horas con excedente
+    BIOGAS_COEFFICIENTS = [1, 0.75, 0.5, 0.25]
+    RENEWABLE_COEFFICIENTS = [0, 0.25, 0.5, 0.75, 1]
+    # Candidatos (coeficiente FV, coeficiente eólica, coeficiente biogás): primero se baja el biogás
+    # y, con el biogás al 25%, se recorre la rejilla de FV y eólica en el mismo orden que get_hour_assignment
+    CANDIDATES = ([(1, 1, coefficient) for coefficient in BIOGAS_COEFFICIENTS] +
+                  [combination + (0.25,) for combination in product(RENEWABLE_COEFFICIENTS, repeat=2)])
+    # Valores de cada candidato, en el orden que devuelve evaluate
+    COLUMNS = ['PotFV', 'PotEol', 'PotDem1', 'PotBio1', 'VolBioInicial', 'PotBio2', 'PotBio3', 'PotDem2', 'PotBombeo',
+               'PotTurbina', 'VolDepInf1', 'VolDepSup1', 'PotBombeo2', 'PotTurbina2', 'PotDemFinal', 'VolBioFinal',
+               'VolDepInf2', 'VolDepSup2']
+
+    def __init__(self, simulator):
+        # Se copian los parámetros del simulador, la regulación no modifica sus atributos
+        self.photovoltaic_power = simulator.photovoltaic_power
+        self.wind_turbine_power = simulator.wind_turbine_power
+        self.generator_max_power = simulator.generator_max_power
+        self.pump_power = simulator.pump_power
+        self.turbine_power = simulator.turbine_power
+        self.upper_tank_volume = simulator.upper_tank_volume
+        self.lower_tank_volume = simulator.lower_tank_volume
+        self.initial_upper_tank_volume = simulator.initial_upper_tank_volume
+        self.initial_lower_tank_volume = simulator.initial_lower_tank_volume
+        self.initial_lower_dam_volume = min(simulator.lower_maximum_volume_dam, simulator.initial_lower_tank_volume)
+        self.Qg_presa = simulator.Qg_presa
+        self.Qb_presa = simulator.Qb_presa
+        self.PBIO_DIV_CONS = simulator.PBIO_DIV_CONS
+        self.qBiogasGenerado = simulator.qBiogasGenerado
+        self.gas_initial_volume = simulator.gas_initial_volume
+        self.biogas_maximum_volume = simulator.biogas_maximum_volume
+        self.biogas_minimum_volume = simulator.biogas_minimum_volume
+
+        self.coefficients = np.array(RegulationEngine.CANDIDATES, dtype=float)
+        self.coefficientsFV, self.coefficientsEol, self.biogasCoefficients = self.coefficients.T
+        # Potencia instalada de FV y eólica de cada candidato
+        self.candidatesFV = self.photovoltaic_power * self.coefficientsFV
+        self.candidatesEol = self.wind_turbine_power * self.coefficientsEol
+
+    def evaluate(self, potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking, previous, candidate=None):
+        # Evalúa la hora para todos los candidatos a la vez (mismas operaciones que setPvAndWindPower y
+        # setBiogasAndHydraulic). Devuelve un array (valor, ..., candidato); los datos de la hora pueden ser
+        # escalares o columnas (filas, 1) para evaluar varias filas, p. ej. varias realizaciones de fallos.
+        # Con candidate (posición en CANDIDATES) se evalúa solo ese candidato de una hora y se devuelve la lista de valores
+        if candidate is None:
+            potFV = potFVUni * self.candidatesFV
+            potEol = potEolUni * self.candidatesEol
+            biogasCoefficient = self.biogasCoefficients
+        else:
+            coefficientFV, coefficientEol, biogasCoefficient = RegulationEngine.CANDIDATES[candidate]
+            potFV = potFVUni * (self.photovoltaic_power * coefficientFV)
+            potEol = potEolUni * (self.wind_turbine_power * coefficientEol)
+        potDem1 = potDem - potFV - potEol
+        if candidate is None:
+            potBio1 = np.where(potDem1 > 0, np.minimum(potDem1, self.generator_max_power), 0) * bioWorking
+        else:
+            potBio1 = (min(potDem1, self.generator_max_power) if potDem1 > 0 else 0) * bioWorking
+        values = [potFV, potEol, potDem1, potBio1] + self.storageStep(potDem1, potBio1, biogasCoefficient, pumpWorking,
+                                                                      turbineWorking, previous)
+        return values if candidate is not None else np.array(values)
+
+    def storageStep(self, potDem1, potBio1, biogasCoefficient, pumpWorking, turbineWorking, previous):
+        # Biogás y presa de una hora (mismas operaciones que setBiogasAndHydraulic y los volúmenes finales
+        # de setCommonRenewableData). previous es (VolBioFinal, VolDepInf2, VolDepSup2) de la hora anterior o None.
+        # Sirve para escalares (una hora de SimulationKernel, con los tipos de Python de la simulación por horas)
+        # o para arrays (candidatos de la regulación, filas de EnsembleKernel)
+        if isinstance(potDem1, np.ndarray):
+            where, minimum, roundValues = np.where, np.minimum, GenericCode.roundArray
+        else:
+            where, minimum, roundValues = RegulationEngine.choose, min, round
+        if previous is not None:
+            previousBio, previousLower, previousUpper = previous
+        else:
+            previousBio, previousLower, previousUpper = (self.gas_initial_volume, self.initial_lower_dam_volume,
+                                                         self.initial_upper_tank_volume)
+
+        volBioInicial = previousBio - potBio1 * self.PBIO_DIV_CONS + self.qBiogasGenerado
+        potBio2 = where(volBioInicial > self.biogas_maximum_volume,
+                        potBio1 + (volBioInicial - self.biogas_maximum_volume) / self.PBIO_DIV_CONS,
+                        where(volBioInicial > self.biogas_minimum_volume, potBio1,
+                              potBio1 - (self.biogas_minimum_volume - volBioInicial) / self.PBIO_DIV_CONS))
+        potBio3 = minimum(biogasCoefficient * self.generator_max_power, potBio2 * biogasCoefficient)
+        potDem2 = potDem1 - potBio3
+
+        potBombeo = where(potDem2 >= 0, 0, minimum(self.pump_power, -potDem2)) * pumpWorking
+        potTurbina = where(potDem2 > 0, minimum(self.turbine_power, potDem2), 0) * turbineWorking
+        volDepInf1 = previousLower + potTurbina * self.Qg_presa - potBombeo * self.Qb_presa
+        volDepSup1 = previousUpper - potTurbina * self.Qg_presa + potBombeo * self.Qb_presa
+
+        emptyLower = (previousLower if previous is not None else self.initial_lower_tank_volume) / self.Qb_presa
+        potBombeo2 = roundValues(where(volDepInf1 <= 0, emptyLower,
+                                      where(volDepSup1 > self.upper_tank_volume,
+                                            potBombeo - (volDepSup1 - self.upper_tank_volume) / self.Qb_presa,
+                                            potBombeo)), 4)
+        emptyUpper = (previousUpper if previous is not None else self.initial_upper_tank_volume) / self.Qg_presa
+        potTurbina2 = where(volDepSup1 <= 0, emptyUpper,
+                            where(volDepInf1 > self.lower_tank_volume,
+                                  potTurbina - (volDepInf1 - self.lower_tank_volume) / self.Qg_presa, potTurbina))
+        potDemFinal = potDem2 - potTurbina2 + potBombeo2
+
+        # En la primera hora el volumen final de biogás se calcula con la potencia regulada (PotBio3)
+        volBioFinal = previousBio - (potBio2 if previous is not None else potBio3) * self.PBIO_DIV_CONS + self.qBiogasGenerado
+        volDepInf2 = previousLower + potTurbina2 * self.Qg_presa - potBombeo2 * self.Qb_presa
+        volDepSup2 = previousUpper - potTurbina2 * self.Qg_presa + potBombeo2 * self.Qb_presa
+
+        return [volBioInicial, potBio2, potBio3, potDem2, potBombeo, potTurbina, volDepInf1, volDepSup1, potBombeo2,
+                potTurbina2, potDemFinal, volBioFinal, volDepInf2, volDepSup2]
+
+    def choose(condition, values, other):
+        # np.where de una sola hora: se elige como el if/else de la simulación por horas, manteniendo el tipo
+        # del valor (por ejemplo PotBombeo = 0 es entero)
+        return values if condition else other
+
+    def select(values, potBombeo2):
+        # Elige el candidato con la misma regla que get_hour_assignment, en cada fila si hay varias.
+        # potBombeo2 es el bombeo de la hora sin regular. PotDemFinal se compara en milésimas, como round(valor, 3)
+        potDemFinal = np.rint(GenericCode.roundArray(values[14], 3) * 1000)
+        last = len(RegulationEngine.BIOGAS_COEFFICIENTS) - 1
+        # Se baja el biogás mientras siga habiendo excedente, hasta el primer coeficiente sin excedente
+        stop = potDemFinal[..., 1:last + 1] >= 0
+        # Con el biogás al 25% se busca la primera combinación de FV y eólica que reduce el excedente
+        grid = potDemFinal[..., last + 1:]
+        valid = ((grid >= potDemFinal[..., last:last + 1]) & (grid <= 0) &
+                 (values[12][..., last + 1:] >= 0.8 * np.asarray(potBombeo2)[..., None]))
+        return np.where(stop.any(axis=-1), np.argmax(stop, axis=-1),
+                        np.where(valid.any(axis=-1), last + 1 + np.argmax(valid, axis=-1), last))
+
+    def regulate(self, potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking, previous, potBombeo2):
+        # Devuelve (coeficiente FV, coeficiente eólica, coeficiente biogás, valores del candidato elegido).
+        # PotDemFinal se devuelve redondeado, como en la tabla de la simulación.
+        # Para una sola hora los candidatos se evalúan de uno en uno, con la regla de select, y se para en cuanto
+        # se conoce el elegido: suelen bastar unos pocos y con escalares es más rápido que evaluarlos todos con arrays
+        def evaluate(candidate):
+            return self.evaluate(potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking, previous, candidate)
+
+        last = len(RegulationEngine.BIOGAS_COEFFICIENTS) - 1
+        # Se baja el biogás mientras siga habiendo excedente, hasta el primer coeficiente sin excedente
+        index, best = 0, None
+        for candidate in range(1, last + 1):
+            values = evaluate(candidate)
+            if round(values[14], 3) >= 0:
+                break
+            index, best = candidate, values
+
+        if index == last:
+            # Con el biogás al 25% se busca la primera combinación de FV y eólica que reduce el excedente
+            bestPotDemFinal = round(best[14], 3)
+            for candidate in range(last + 1, len(RegulationEngine.CANDIDATES)):
+                values = evaluate(candidate)
+                if bestPotDemFinal <= round(values[14], 3) <= 0 and values[12] >= 0.8 * potBombeo2:
+                    index, best = candidate, values
+                    break
+        # Sin bajar el biogás (index 0) el candidato no se ha evaluado todavía
+        result = best if best is not None else evaluate(index)
+        result[14] = round(result[14], 3)
+        coefficientFV, coefficientEol, biogasCoefficient = RegulationEngine.CANDIDATES[index]
+        return coefficientFV, coefficientEol, biogasCoefficient, result
+
+    def regulateRows(self, potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking, previous, potBombeo2):
+        # Igual que regulate para varias filas a la vez (arrays de una dimensión). Devuelve los coeficientes (filas, 3)
+        # y los valores elegidos (valor, filas)
+        def column(values):
+            return np.asarray(values)[:, None]
+
+        if previous is not None:
+            previous = tuple(column(values) for values in previous)
+        values = self.evaluate(column(potFVUni), column(potEolUni), potDem, column(bioWorking), column(pumpWorking),
+                               column(turbineWorking), previous)
+        index = RegulationEngine.select(values, potBombeo2)
+        result = values[:, np.arange(len(index)), index]
+        result[14] = GenericCode.roundArray(result[14], 3)
+        return self.coefficients[index], result
@@ -3,29 +3,14 @@ from .genericCode import GenericCode
 
 # VARIABLES
 # ---------------------------------------------------------------
-ALLOCATION_PARAMETERS_RENEWABLES_FIELD_SQL = pd.read_sql(
-    """SELECT a.*
-           FROM [inasolar].[dbo].[AllocationParameters] a
-           LEFT JOIN RenewableEnergiesInfo r ON a.Type = r.IdType
-           WHERE a.DefaultValue IS NOT NULL
-           ORDER BY ParametersOrder""", GenericCode.engine)
-ALLOCATION_PARAMETERS_SUMMARY_SQL = pd.read_sql(
-    """SELECT *
-           FROM [inasolar].[dbo].[AllocationParameters] a
-    	   WHERE GraphType = 'Summary'
-           ORDER BY ParametersOrder""", GenericCode.engine)
+ALLOCATION_PARAMETERS_RENEWABLES_FIELD_SQL = GenericCode.dataSource.getAllocationParameters("a.DefaultValue IS NOT NULL")
+ALLOCATION_PARAMETERS_SUMMARY_SQL = GenericCode.dataSource.getMetadata(
+    'AllocationParameters', "GraphType = 'Summary'", 'ParametersOrder')
 ALLOCATION_PARAMETERS_OPTIMIZATION_SQL = ALLOCATION_PARAMETERS_SUMMARY_SQL[
     ALLOCATION_PARAMETERS_SUMMARY_SQL['ParameterType'] == 'optimizationData']
-ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL = pd.read_sql(
-    """SELECT a.*
-           FROM [inasolar].[dbo].[AllocationParameters] a
-           LEFT JOIN RenewableEnergiesInfo r ON a.Type = r.IdType
-    	   WHERE a.DefaultValue IS NULL AND a.ColumnWidth IS NOT NULL AND (GraphType IS NULL OR GraphType != 'Summary')
-           ORDER BY ParametersOrder""", GenericCode.engine)
-OPTIMIZATION_PARAMETERS_SUMMARY_SQL = pd.read_sql(
-    """SELECT *
-           FROM [inasolar].[dbo].[OptimizationParameters]
-           ORDER BY ParametersOrder""", GenericCode.engine)
+ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL = GenericCode.dataSource.getAllocationParameters(
+    "a.DefaultValue IS NULL AND a.ColumnWidth IS NOT NULL AND (GraphType IS NULL OR GraphType != 'Summary')")
+OPTIMIZATION_PARAMETERS_SUMMARY_SQL = GenericCode.dataSource.getMetadata('OptimizationParameters', orderBy='ParametersOrder')
 
 class ResourceAllocation:
     # FUNCIONES
@@ -75,11 +60,7 @@ class ResourceAllocation:
         return False, ''
 
     def setMaxDateAllowed(area):
-        maxDateAllowedCode = f"""SELECT MAX(d.date) AS Date
-                                	 FROM [inasolar].[dbo].[ForecastWeather] f
-                                	 INNER JOIN Dates d ON f.date = d.id
-                                  	 WHERE Area={area}"""
-        return GenericCode.getAndParseDate(maxDateAllowedCode)
+        return GenericCode.getMaxDate('ForecastWeather', area)
 
     def setColumnsSummary(optimize=False, ranking=False):
         tableColumns = []
@@ -232,6 +213,5 @@ class ResourceAllocation:
     GRAPH_DATA = ALLOCATION_PARAMETERS_RENEWABLES_RESULT_SQL.dropna(
         subset=['GraphType']).sort_values(by='GraphOrder')
     COSTS_DATA = GRAPH_DATA[GRAPH_DATA['GraphType'].str.endswith('3')]
-    SUNBURST_DATA = pd.read_sql(
-        "SELECT * FROM AllocationParameters WHERE GraphType = 'Sunburst'", GenericCode.engine)
+    SUNBURST_DATA = GenericCode.dataSource.getMetadata('AllocationParameters', "GraphType = 'Sunburst'")
     COLUMNS_COSTS = setColumnsTable(COSTS_DATA)
@@ -0,0 +1,33 @@
+import pandas as pd
+
+
+class ResultAccumulator:
+    # Acumula los resultados de la simulación por columnas (una lista por columna) y crea un único
+    # DataFrame al final, en lugar de concatenar toda la tabla con cada día simulado
+    def __init__(self):
+        self.columns = {}
+        self.length = 0
+
+    def append(self, rows):
+        # rows es la lista de horas (diccionarios) de un día
+        for row in rows:
+            # Si aparece una columna nueva, las horas anteriores quedan vacías
+            for key in [key for key in row if key not in self.columns]:
+                self.columns[key] = [None] * self.length
+            for key, column in self.columns.items():
+                column.append(row.get(key))
+            self.length += 1
+
+    def lastRow(self):
+        # Última hora simulada, equivale a previous_day.iloc[-1].to_dict() sin crear el DataFrame
+        if self.length == 0:
+            return None
+        return {key: column[-1] for key, column in self.columns.items()}
+
+    def toDataFrame(self, columns=None):
+        # Con columns solo se crean esas columnas, las que no existen quedan vacías
+        if self.length == 0:
+            return None
+        if columns is None:
+            return pd.DataFrame(self.columns)
+        return pd.DataFrame({column: self.columns.get(column, [None] * self.length) for column in columns})
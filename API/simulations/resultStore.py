@@ -0,0 +1,93 @@
+import os
+import time
+import hashlib
+import threading
+import importlib.util
+import pandas as pd
+
+# Con pyarrow las tablas se guardan en Parquet, si no en pickle comprimido
+PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+
+class ResultStore:
+    # Resultados de simulación en disco, compartidos por todos los procesos que usan el mismo directorio.
+    # Cada tabla se guarda en un fichero con el hash de su clave, y al pasar de maxBytes se borran los menos usados.
+    # La versión de los datos entra en la clave: dataVersion() la lee de la marca que incrementa la carga de datos
+    # al añadir o corregir datos históricos (una consulta de una fila). Se vuelve a leer como mucho cada versionSeconds
+    def __init__(self, directory, maxBytes=1024 ** 3, dataVersion=lambda: 1, versionSeconds=60):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.dataVersion = dataVersion
+        self.versionSeconds = versionSeconds
+        self.version = None
+        self.versionTime = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getDataVersion(self):
+        with self.lock:
+            if self.versionTime is None or time.monotonic() - self.versionTime > self.versionSeconds:
+                self.version = self.dataVersion()
+                self.versionTime = time.monotonic()
+            return self.version
+
+    def getPath(self, key):
+        keyHash = hashlib.sha1(repr((self.getDataVersion(), key)).encode()).hexdigest()
+        return os.path.join(self.directory, keyHash + (".parquet" if PARQUET else ".pkl.gz"))
+
+    def get(self, key):
+        path = self.getPath(key)
+        try:
+            table = pd.read_parquet(path) if PARQUET else pd.read_pickle(path)
+        except (OSError, ValueError, EOFError):
+            # No existe o lo está escribiendo/borrando otro proceso
+            self.misses += 1
+            return None
+        # La fecha de modificación marca el último uso, para el descarte
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return table
+
+    def put(self, key, table):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.getPath(key)
+        # Se escribe en un temporal y se renombra, así nunca se lee un fichero a medias
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if PARQUET:
+            table.to_parquet(temporary, compression="zstd", index=False)
+        else:
+            table.to_pickle(temporary, compression="gzip")
+        os.replace(temporary, path)
+        with self.lock:
+            self.evict()
+
+    def evict(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".parquet", ".pkl.gz")):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        totalBytes = sum(size for _, size, _ in files)
+        # Se borran primero los menos usados, aunque siempre se mantiene el último
+        for _, size, path in sorted(files)[:-1]:
+            if totalBytes <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            totalBytes -= size
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".parquet", ".pkl.gz", ".tmp")):
+                os.remove(entry.path)
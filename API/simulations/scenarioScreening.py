@@ -0,0 +1,102 @@
+import math
+import datetime as dt
+import numpy as np
+from .simulator import simulator
+from .filtro_dias import filtro_dias
+
+
+class ScenarioScreening:
+    # Criba por mitades sucesivas de los escenarios de la optimización: todos se simulan en un subrango corto y
+    # representativo, se puntúan con getScore y solo la fracción 1/reduction mejor pasa al siguiente rango, más largo.
+    # El último rango es el pedido, así los escenarios que quedan tienen el mismo resumen que sin criba
+    def __init__(self, ponders, reduction=3, minDays=7, maxRungs=4):
+        self.ponders = ponders
+        self.reduction = reduction
+        self.minDays = minDays
+        self.maxRungs = maxRungs
+
+    def getRungDays(self, totalDays):
+        # Días de cada rango, creciendo en un factor reduction hasta el rango completo
+        rungs = 1
+        while rungs < self.maxRungs and totalDays / self.reduction ** rungs >= self.minDays:
+            rungs += 1
+        return [max(self.minDays, round(totalDays / self.reduction ** (rungs - 1 - rung))) for rung in range(rungs - 1)] + [totalDays]
+
+    def getEvaluations(self, numScenarios, totalDays):
+        # Número total de simulaciones de la criba, para calcular el progreso
+        evaluations = 0
+        for _ in self.getRungDays(totalDays):
+            evaluations += numScenarios
+            numScenarios = math.ceil(numScenarios / self.reduction)
+        return evaluations
+
+    def getRepresentativeRange(weather_data, generation_data, start_day, days, windowDays):
+        # Ventana de windowDays días cuya media diaria de demanda, precio y generación se parece más a la del rango completo
+        start = dt.datetime.strptime(start_day, "%Y-%m-%d")
+        if windowDays >= days:
+            return start_day, (start + dt.timedelta(days=days)).strftime("%Y-%m-%d")
+        features = []
+        for frame, columns in ((weather_data, ['Power', 'Price']), (generation_data, ['Power'])):
+            dayIndex = (frame['Date'] - start).dt.days
+            daily = frame[dayIndex < days].groupby(dayIndex)[columns].mean().reindex(range(days))
+            features.append(daily.to_numpy(float))
+        features = np.hstack(features)
+        features = np.where(np.isnan(features), np.nanmean(features, axis=0), features)
+        scale = np.where(features.std(axis=0) > 0, features.std(axis=0), 1)
+        cumulative = np.vstack([np.zeros(features.shape[1]), np.cumsum(features / scale, axis=0)])
+        windowMeans = (cumulative[windowDays:] - cumulative[:-windowDays]) / windowDays
+        best = int(np.argmin(np.abs(windowMeans - (features / scale).mean(axis=0)).sum(axis=1)))
+        return ((start + dt.timedelta(days=best)).strftime("%Y-%m-%d"),
+                (start + dt.timedelta(days=best + windowDays)).strftime("%Y-%m-%d"))
+
+    def getOptimizationRow(summary):
+        # Misma fila que ve el ranking: valores sin regulación, parámetros y valores con regulación con sufijo WR
+        row = {**summary[0], **summary[2]}
+        row.update({key + 'WR': value for key, value in summary[1].items()})
+        return row
+
+    def getSurvivors(self, indexes, summaries, keep):
+        # Se quedan keep escenarios: el primero, que es el de los valores originales y se mantiene como referencia,
+        # y los mejores según su mejor puesto en el ranking sin regulación o con regulación
+        rows = filtro_dias.getScore([ScenarioScreening.getOptimizationRow(summaries[index]) for index in indexes], self.ponders)
+        ranks = np.full(len(indexes), len(indexes))
+        for score in ('Score', 'ScoreWR'):
+            order = np.argsort([-row[score] for row in rows], kind='stable')
+            ranks = np.minimum(ranks, np.argsort(order, kind='stable'))
+        ranks[0] = -1
+        survivors = set(np.argsort(ranks, kind='stable')[:keep].tolist())
+        return [index for position, index in enumerate(indexes) if position in survivors]
+
+    def getTotalDays(start_day, end_day):
+        # Días del rango 'AAAA-MM-DD', los mismos con los que se calculan los escalones
+        return (dt.datetime.strptime(end_day, "%Y-%m-%d") - dt.datetime.strptime(start_day, "%Y-%m-%d")).days
+
+    def run(self, executor, baseSimulator, parameterSets, start_day, end_day, location, simulationParameters,
+            with_failures, summaryParameters, onResult=None):
+        # Devuelve {índice: resumen del rango completo} de los escenarios que pasan la criba.
+        # onResult(índice, resumen, final) se llama en cada simulación, final indica si es la del rango completo
+        totalDays = ScenarioScreening.getTotalDays(start_day, end_day)
+        weather_data, generation_data = simulator.getSimulationData(location, start_day, end_day)
+        rungDays = self.getRungDays(totalDays)
+        indexes = list(range(len(parameterSets)))
+        # Un solo pool para todos los escalones, los procesos reciben una vez los datos del rango completo
+        with executor.job(baseSimulator, start_day, end_day, location, simulationParameters, with_failures,
+                          summaryParameters):
+            for rung, days in enumerate(rungDays):
+                final = rung == len(rungDays) - 1
+                if final:
+                    rungStart, rungEnd = start_day, end_day
+                else:
+                    rungStart, rungEnd = ScenarioScreening.getRepresentativeRange(weather_data, generation_data, start_day,
+                                                                                  totalDays, days)
+
+                def addResult(position, summary):
+                    if onResult is not None:
+                        onResult(indexes[position], summary, final)
+
+                summaries = executor.run(baseSimulator, [parameterSets[index] for index in indexes], rungStart, rungEnd,
+                                         location, simulationParameters, with_failures, summaryParameters, onResult=addResult)
+                summaries = dict(zip(indexes, summaries))
+                if final:
+                    return summaries
+                indexes = self.getSurvivors(indexes, summaries, math.ceil(len(indexes) / self.reduction))
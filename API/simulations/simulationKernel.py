@@ -0,0 +1,355 @@
+import numpy as np
+import pandas as pd
+import datetime as dt
+import time
+from collections import ChainMap
+from operator import itemgetter
+from .genericCode import GenericCode
+from .regulationEngine import RegulationEngine
+
+
+class SimulationKernel:
+    # Columnas que get_hour_assignment inicializa en cada hora. Se respetan para que la tabla
+    # resultante tenga las mismas columnas y en el mismo orden que la simulación por diccionarios
+    SEED_COLUMNS = ["Date", "Hour", "FV working", "Eolic working", "PotDem", "Biogas working", "Pump working",
+                    "Turbine working", "ElectricityGridPrice", "ElectricitySurplusPrice", "FV coefficient", "Eolic coefficient",
+                    "Biogas coefficient", "FVGenerationCostModified", "FVCostModified", "EolGenerationCostModified", "EolCostModified",
+                    'VolBioInicialModified', 'PotBio2Modified', "BioGenerationCostModified", "BioCostModified", "SOSVolBioFinalModified",
+                    'PotDem2Modified', 'PotBombeoModified', 'PotTurbinaModified', 'VolDepInf1Modified', 'VolDepSup1Modified',
+                    "HydraulicGenerationCostModified", "HydraulicCostModified", "SOSVolDepSup2Modified", 'RenewablesPowerModified',
+                    'PotDemFinalModified', "MoneySpentModified", 'DifferenceWithourGridModified', "nF FV", "nF Eolic",
+                    "nF Bio", "nF Pump", "nF Turbine"]
+    # Columnas del recurrente de almacenamiento (biogás y presa) que se guardan por cada variante
+    STORAGE_COLUMNS = ['VolBioInicial', 'PotBio2', 'PotBio3', 'PotDem2', 'PotBombeo', 'PotTurbina', 'VolDepInf1',
+                       'VolDepSup1', 'PotBombeo2', 'PotTurbina2', 'PotDemFinal', 'VolBioFinal', 'VolDepInf2', 'VolDepSup2']
+    # Columnas del almacenamiento que hacen falta para el resumen, con su posición en storageStep
+    SUMMARY_STORAGE = {'PotBio2': 1, 'PotBio3': 2, 'PotTurbina2': 9, 'PotDemFinal': 10, 'VolBioFinal': 11, 'VolDepSup2': 13}
+    # Columnas de cada variante que usa el resumen (simulator.get_summary)
+    SUMMARY_COLUMNS = ["Surplus", "Grid", "SOSVolDepSup2", "SOSVolBioFinal", "LOLESin", "LOLECon", "PotQuemAnt",
+                       "EnergyCostWithRenewables", "nIDG"]
+    # Número de fallos y estado de cada recurso
+    FAILURE_COLUMNS = (("nF FV", "FV working"), ("nF Eolic", "Eolic working"), ("nF Bio", "Biogas working"),
+                       ("nF Pump", "Pump working"), ("nF Turbine", "Turbine working"))
+    # Columnas del reparto de cada hora por renovable (sunburst)
+    BREAKDOWN_PREFIXES = ('PotDem-', 'Surplus-', 'PotBombeo2-')
+    # Reparto por renovable: (renovable, columna, potencia que se reparte según su proporción del total con red)
+    BREAKDOWN = [('Grid', 'PotDem-Grid', 'PotDem'),
+                 ('PotBio3', 'PotBombeo2-PotBio3', 'PotBombeo2'), ('PotBio3', 'PotDem-PotBio3', 'PotDem'), ('PotBio3', 'Surplus-PotBio3', 'Surplus'),
+                 ('PotEol', 'PotBombeo2-PotEol', 'PotBombeo2'), ('PotEol', 'PotDem-PotEol', 'PotDem'), ('PotEol', 'Surplus-PotEol', 'Surplus'),
+                 ('PotFV', 'PotBombeo2-PotFV', 'PotBombeo2'), ('PotFV', 'PotDem-PotFV', 'PotDem'), ('PotFV', 'Surplus-PotFV', 'Surplus'),
+                 ('PotTurbina2', 'PotDem-PotTurbina2', 'PotDem')]
+    BREAKDOWN_PARENTS = list(dict.fromkeys(parent for parent, column, target in BREAKDOWN))
+    LOSS_OF_LOAD_COLUMNS = ["nIDG", "LOLESin", "LOLEAux", "LOLECon"]
+
+    def __init__(self, simulator):
+        # Se guardan los parámetros del simulador en variables locales, así no se accede a las propiedades en cada hora
+        self.photovoltaic_power = simulator.photovoltaic_power
+        self.wind_turbine_power = simulator.wind_turbine_power
+        self.generator_max_power = simulator.generator_max_power
+        self.upper_tank_volume = simulator.upper_tank_volume
+        self.qBiogasGenerado = simulator.qBiogasGenerado
+        self.qBiometGenerado = simulator.qBiometGenerado
+        self.biogas_maximum_volume = simulator.biogas_maximum_volume
+        self.biogas_minimum_volume = simulator.biogas_minimum_volume
+        self.simulator = simulator
+        # El biogás y la presa de cada hora y la búsqueda de coeficientes se calculan con RegulationEngine
+        self.regulationEngine = RegulationEngine(simulator)
+
+    def getDailyInputs(weatherData, generationData, startDate, numDays):
+        # Se pasan los datos de la caché a matrices (día, hora). Igual que en get_hour_assignment, las horas
+        # se toman por posición dentro del día, y los días con horas que faltan no se pueden simular
+        start = pd.Timestamp(startDate)
+        inputs = {}
+        weatherDay = (pd.to_datetime(weatherData['Date']) - start).dt.days.to_numpy()
+        inRange = (weatherDay >= 0) & (weatherDay < numDays)
+        weather = weatherData[inRange]
+        weatherDay = weatherDay[inRange]
+        weatherPosition = weather.groupby(weatherDay).cumcount().to_numpy()
+        weatherHours = np.bincount(weatherDay, minlength=numDays)
+        used = weatherPosition < 24
+        for column in ('Price', 'Surplus', 'Power', 'windspeed_10m', 'temperature_2m'):
+            values = np.full((numDays, 24), np.nan)
+            values[weatherDay[used], weatherPosition[used]] = weather[column].to_numpy(dtype=float)[used]
+            inputs[column] = values
+
+        generationDay = (pd.to_datetime(generationData['Date']) - start).dt.days.to_numpy()
+        inRange = (generationDay >= 0) & (generationDay < numDays)
+        generation = generationData[inRange]
+        # Potencia fotovoltaica de todas las granjas del área agrupada por hora de cada día
+        generationByHour = abs(generation.groupby(
+            by=[generationDay[inRange], generation['Hour'].to_numpy()]).sum(numeric_only=True)["Power"])
+        generationDay = generationByHour.index.get_level_values(0).to_numpy()
+        generationPosition = generationByHour.groupby(level=0).cumcount().to_numpy()
+        generationHours = np.bincount(generationDay, minlength=numDays)
+        used = generationPosition < 24
+        values = np.full((numDays, 24), np.nan)
+        values[generationDay[used], generationPosition[used]] = generationByHour.to_numpy(dtype=float)[used]
+        inputs['Generation'] = values
+
+        inputs['valid'] = (weatherHours >= 24) & (generationHours >= 24)
+        return inputs
+
+    def regulateHour(self, potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking, previous, potBombeo2):
+        # Búsqueda de coeficientes de get_hour_assignment cuando hay excedente, la misma que en la simulación por horas.
+        # Devuelve (coeficiente FV, coeficiente eólica, coeficiente biogás, resultado de la regulación)
+        return self.regulationEngine.regulate(potFVUni, potEolUni, potDem, bioWorking, pumpWorking, turbineWorking,
+                                              previous, potBombeo2)
+
+    def simulate(self, profiles, failures, parameters=[], summaryOnly=False, columns=None, state=None):
+        # profiles son los perfiles unitarios del rango (UnitProfiles), solo se calcula lo que depende de la potencia instalada.
+        # Con summaryOnly no se construye la tabla: el bucle solo guarda lo que necesita el resumen y al terminar se
+        # devuelven las sumas y medias de SimulationKernel.reduceSummary, para simulator.buildSummary.
+        # Con columns la tabla solo tiene esas columnas y el reparto se calcula solo si se pide alguna de las suyas.
+        # state es el estado de la última hora de una simulación anterior (self.state al terminar), para continuarla
+        numDays = len(profiles['valid'])
+        startDate = profiles['startDate']
+        for day in np.flatnonzero(~profiles['valid']):
+            print(f"Error en: {startDate + dt.timedelta(days=int(day))}", "Hours missing")
+        validDays = profiles['validDays']
+        numHours = len(validDays) * 24
+
+        # Las colas de fallos avanzan 24 horas por día, aunque el día no se pueda simular
+        if failures is not None:
+            working = {key: np.asarray(values[:numDays * 24], dtype=np.int64).reshape(numDays, 24)[validDays].reshape(-1)
+                       for key, values in failures.items()}
+            fvWorking, eolWorking, bioWorking = working['fv_working'], working['eolic_working'], working['biogas_working']
+            # Se mantiene la asignación de get_hour_assignment (bombeo con la cola de turbina y viceversa)
+            pumpWorking, turbineWorking = working['turbine_working'], working['pump_working']
+        else:
+            fvWorking = eolWorking = bioWorking = pumpWorking = turbineWorking = np.ones(numHours, dtype=np.int64)
+
+        simulator = self.simulator
+        table = {}
+        table["Date"] = profiles["Date"]
+        table["Hour"] = profiles["Hour"]
+        table["FV working"], table["Eolic working"], table["Biogas working"] = fvWorking, eolWorking, bioWorking
+        table["Pump working"], table["Turbine working"] = pumpWorking, turbineWorking
+
+        # Número de fallos: la primera hora cuenta los recursos parados, el resto solo los que se paran en esa hora.
+        # Al continuar una simulación la primera hora se compara con la última de la anterior
+        for column, workingColumn in SimulationKernel.FAILURE_COLUMNS:
+            numberFailures = np.zeros(numHours, dtype=np.int64)
+            if failures is not None and numHours:
+                workingValues = table[workingColumn]
+                if state is None:
+                    numberFailures[0] = 1 - workingValues[0]
+                else:
+                    numberFailures[0] = workingValues[0] < state['working'][workingColumn]
+                numberFailures[1:] = workingValues[1:] < workingValues[:-1]
+            table[column] = numberFailures
+
+        table["ElectricityGridPrice"] = profiles["ElectricityGridPrice"]
+        table["ElectricitySurplusPrice"] = profiles["ElectricitySurplusPrice"]
+        table['QBiogasGenerado'] = np.full(numHours, self.qBiogasGenerado)
+        table['QBiometGenerado'] = np.full(numHours, self.qBiometGenerado)
+        table["PotFVUni"] = profiles["PotFVUni"] * fvWorking
+        table["VelViento"] = profiles["VelViento"]
+        table["Temperature"] = profiles["Temperature"]
+        table["PotEolUni"] = profiles["PotEolUni"] * eolWorking
+        table["PotDemUni"] = profiles["PotDemUni"]
+        table["PotDem"] = table["PotDemUni"] * simulator.max_demand
+        table["EnergyCostWithoutRenewables"] = table["PotDem"] * table["ElectricityGridPrice"]
+        table["PotFV"] = table["PotFVUni"] * self.photovoltaic_power
+        table["PotEol"] = table["PotEolUni"] * self.wind_turbine_power
+        table["PotDem1"] = table["PotDem"] - table["PotFV"] - table["PotEol"]
+        table["PotBio1"] = SimulationKernel.where(table["PotDem1"] > 0, np.minimum(table["PotDem1"], self.generator_max_power), 0) * bioWorking
+
+        # Recurrente hora a hora: el estado de biogás y presa depende de la hora anterior.
+        # Se guardan las filas y las columnas se crean al final, para que tengan el tipo de la simulación por horas
+        storage, storageModified, renewablesModified = [], [], []
+        coefficients = [(1, 1, 1)] * numHours
+        potBio1 = table["PotBio1"].tolist()
+        potFVUni, potEolUni, potDem = table["PotFVUni"].tolist(), table["PotEolUni"].tolist(), table["PotDem"].tolist()
+        potDem1, potBio1List = table["PotDem1"].tolist(), list(potBio1)
+        potFV, potEol = table["PotFV"].tolist(), table["PotEol"].tolist()
+        bioList, pumpList, turbineList = bioWorking.tolist(), pumpWorking.tolist(), turbineWorking.tolist()
+        previous = previousModified = None
+        if state is not None:
+            previous, previousModified = state['previous'], state['previousModified']
+        # La regulación se mide dentro del bucle y se registra una sola vez al terminar
+        regulationTime, regulatedHours = 0.0, 0
+        storageStep = self.regulationEngine.storageStep
+        # Sin tabla, de cada hora solo se guardan las columnas del almacenamiento que usa el resumen
+        storageColumns = list(SimulationKernel.SUMMARY_STORAGE) if summaryOnly else SimulationKernel.STORAGE_COLUMNS
+        keep = itemgetter(*SimulationKernel.SUMMARY_STORAGE.values()) if summaryOnly else None
+        loopStart = time.perf_counter()
+        for hour in range(numHours):
+            result = storageStep(potDem1[hour], potBio1List[hour], 1, pumpList[hour], turbineList[hour], previous)
+            storage.append(result if keep is None else keep(result))
+            previous = tuple(result[11:])
+
+            if round(result[10], 3) < 0:
+                regulationStart = time.perf_counter()
+                coefficientFV, coefficientEol, biogasCoefficient, regulated = self.regulateHour(
+                    potFVUni[hour], potEolUni[hour], potDem[hour], bioList[hour], pumpList[hour], turbineList[hour],
+                    previousModified, result[8])
+                regulationTime += time.perf_counter() - regulationStart
+                regulatedHours += 1
+                coefficients[hour] = (coefficientFV, coefficientEol, biogasCoefficient)
+                renewablesModified.append(regulated[:3])
+                potBio1[hour] = regulated[3]
+                regulated = regulated[4:]
+            else:
+                renewablesModified.append((potFV[hour], potEol[hour], potDem1[hour]))
+                regulated = storageStep(potDem1[hour], potBio1List[hour], 1, pumpList[hour], turbineList[hour],
+                                        previousModified)
+            storageModified.append(regulated if keep is None else keep(regulated))
+            previousModified = tuple(regulated[11:])
+        simulator.TIMINGS.add("hour_loop", time.perf_counter() - loopStart)
+        if regulatedHours:
+            simulator.TIMINGS.add("regulation", regulationTime, regulatedHours)
+
+        if not summaryOnly:
+            table["FV coefficient"], table["Eolic coefficient"], table["Biogas coefficient"] = SimulationKernel.toColumns(coefficients, 3)
+            table["PotBio1"] = np.array(potBio1)
+        storage = SimulationKernel.toColumns(storage, len(storageColumns))
+        storageModified = SimulationKernel.toColumns(storageModified, len(storageColumns))
+        for index, column in enumerate(storageColumns):
+            table[column] = storage[index]
+        breakdown = not summaryOnly and SimulationKernel.needsBreakdown(columns)
+        self.setCommonRenewableData('', table, breakdown, None if state is None else state['demand'][''], summaryOnly)
+
+        table["PotFVModified"], table["PotEolModified"], table["PotDem1Modified"] = SimulationKernel.toColumns(renewablesModified, 3)
+        for index, column in enumerate(storageColumns):
+            table[column + 'Modified'] = storageModified[index]
+        self.setCommonRenewableData('Modified', table, breakdown, None if state is None else state['demand']['Modified'], summaryOnly)
+
+        # La potencia de Bombeo debe de ir en negativo
+        if not summaryOnly:
+            table['PotBombeo2Modified'] = -table['PotBombeo2Modified']
+            table['PotBombeo2'] = -table['PotBombeo2']
+
+        # Estado de la última hora simulada. Si no hay horas se mantiene el de la simulación anterior
+        self.state = state
+        if numHours:
+            self.state = {'previous': previous, 'previousModified': previousModified,
+                          'working': {workingColumn: int(table[workingColumn][-1]) for column, workingColumn in SimulationKernel.FAILURE_COLUMNS},
+                          'demand': {'': float(table['PotDemFinal'][-1]), 'Modified': float(table['PotDemFinalModified'][-1])}}
+        if summaryOnly:
+            with simulator.TIMINGS.span("summary"):
+                return SimulationKernel.reduceSummary(table)
+
+        if columns is None:
+            columns = list(SimulationKernel.SEED_COLUMNS)
+            columns += [parameter for parameter in parameters if parameter not in columns]
+            columns += [column for column in table if column not in columns]
+        return pd.DataFrame({column: table.get(column, [None] * numHours) for column in columns})
+
+    def setCommonRenewableData(self, modified, table, breakdown=True, previousDemand=None, summaryOnly=False):
+        # Versión vectorizada de setCommonRenewableData sobre todas las horas simuladas. Sin breakdown no se calcula
+        # el reparto de demanda, bombeo y excedente por renovable, que no entra en el resumen.
+        # previousDemand es PotDemFinal de la hora anterior a la primera, al continuar una simulación.
+        # Con summaryOnly los costes son temporales y en table solo se añaden las columnas del resumen
+        simulator = self.simulator
+        values = ChainMap({}, table) if summaryOnly else table
+        values["FVGenerationCost" + modified] = values["PotFV" + modified] * (simulator.pv_generation_mean_cost / 100)
+        values["FVCost" + modified] = values["FVGenerationCost" + modified] + simulator.pv_amortization_cost_hour
+        values["EolGenerationCost" + modified] = values["PotEol" + modified] * (simulator.eol_generation_mean_cost / 100)
+        values["EolCost" + modified] = values["EolGenerationCost" + modified] + simulator.eol_amortization_cost_hour
+        values["BioGenerationCost" + modified] = values["PotBio3" + modified] * (simulator.bio_generation_mean_cost / 100)
+        values["BioCost" + modified] = values["BioGenerationCost" + modified] + simulator.bio_amortization_cost_hour
+        # Quemado en antorcha
+        values['PotQuemAnt' + modified] = values['PotBio2' + modified] - values['PotBio3' + modified]
+        if not summaryOnly:
+            values['SoSPotQuemAnt' + modified] = (values['PotQuemAnt' + modified] / simulator.biogas_max_digester) * 100
+
+        if simulator.digester_volume != 0:
+            values['SOSVolBioFinal' + modified] = SimulationKernel.roundValues(((values['VolBioFinal' + modified] - self.biogas_minimum_volume) / (
+                self.biogas_maximum_volume - self.biogas_minimum_volume)) * 100)
+        else:
+            values['SOSVolBioFinal' + modified] = np.zeros(np.shape(values['VolBioFinal' + modified]), dtype=np.int64)
+        values['SOSVolDepSup2' + modified] = SimulationKernel.roundValues(
+            values['VolDepSup2' + modified] / self.upper_tank_volume * 100)
+        values["HydraulicGenerationCost" + modified] = values["PotTurbina2" + modified] * (simulator.hydraulic_generation_mean_cost / 100)
+        values["HydraulicCost" + modified] = values["HydraulicGenerationCost" + modified] + simulator.hydraulic_amortization_cost_hour
+
+        # Separation of "PotDemFinal" in Surplus and Grid
+        potDemFinal = values['PotDemFinal' + modified]
+        values['Grid' + modified] = SimulationKernel.where(potDemFinal >= 0, potDemFinal, 0)
+        values['Surplus' + modified] = SimulationKernel.where(potDemFinal >= 0, 0, potDemFinal)
+
+        values['MoneySpent' + modified] = (values['Grid' + modified] * values['ElectricityGridPrice'] -
+                                           values['Surplus' + modified] * values['ElectricitySurplusPrice'])
+        values['EnergyCostWithRenewables' + modified] = (values['MoneySpent' + modified] + values['FVCost' + modified] + values['EolCost' + modified] +
+                                                         values['BioCost' + modified] + values['HydraulicCost' + modified])
+        if not summaryOnly:
+            values['DifferenceWithourGrid' + modified] = values['EnergyCostWithoutRenewables'] - values['EnergyCostWithRenewables' + modified]
+            values['RenewablesPower' + modified] = (values['PotFV' + modified] + values['PotEol' + modified] +
+                                                    values['PotBio3' + modified] + values['PotTurbina2' + modified])
+            values['RenewablesPowerWithGrid' + modified] = values['RenewablesPower' + modified] + values['Grid' + modified]
+
+        if breakdown:
+            SimulationKernel.setBreakdown(table, modified)
+        SimulationKernel.setLossOfLoad(values, modified, previousDemand)
+        if summaryOnly:
+            for column in SimulationKernel.SUMMARY_COLUMNS:
+                table[column + modified] = values[column + modified]
+        return table
+
+    def setBreakdown(table, modified):
+        # Todas las proporciones de una vez, (renovable, ...horas) entre la potencia total con red.
+        # La demanda es la misma con y sin regulación, el bombeo y el excedente no
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentages = (np.array([table[parent + modified] for parent in SimulationKernel.BREAKDOWN_PARENTS], dtype=float) /
+                           np.asarray(table['RenewablesPowerWithGrid' + modified], dtype=float))
+        for parent, column, target in SimulationKernel.BREAKDOWN:
+            target += '' if target == 'PotDem' else modified
+            table[column + modified] = percentages[SimulationKernel.BREAKDOWN_PARENTS.index(parent)] * np.asarray(table[target], dtype=float)
+        return table
+
+    def setLossOfLoad(table, modified, previousDemand=None):
+        # Interrupciones: pasar de no necesitar red a necesitarla (la última dimensión son las horas).
+        # previousDemand es PotDemFinal de la hora anterior a la primera, si la hay
+        potDemFinal = np.asarray(table['PotDemFinal' + modified], dtype=float)
+        roundedDemand = np.rint(potDemFinal)
+        interruptions = np.zeros(np.shape(potDemFinal), dtype=np.int64)
+        interruptions[..., 1:] = (roundedDemand[..., :-1] <= 0) & (roundedDemand[..., 1:] > 0)
+        if previousDemand is not None and np.shape(potDemFinal)[-1]:
+            interruptions[..., 0] = (np.rint(previousDemand) <= 0) & (roundedDemand[..., 0] > 0)
+        table["nIDG" + modified] = interruptions
+
+        # CHANGE COLUMN LOLE with failures
+        lole = (roundedDemand > 0).astype(np.int64)
+        working = [np.asarray(table[column], dtype=np.int64) for column in
+                   ("FV working", "Eolic working", "Biogas working", "Pump working", "Turbine working")]
+        table["LOLESin" + modified] = lole * (working[0] * working[1] * working[2] * working[3] * working[4])
+        table["LOLEAux" + modified] = lole
+        table["LOLECon" + modified] = table["LOLEAux" + modified] - table["LOLESin" + modified]
+        return table
+
+    def needsBreakdown(columns):
+        # El reparto por renovable solo hace falta si se pide alguna de sus columnas (o todas, con columns=None)
+        return columns is None or any(column.startswith(SimulationKernel.BREAKDOWN_PREFIXES) for column in columns)
+
+    def roundValues(values):
+        # Mismo redondeo que GenericCode.roundNumber aplicado a cada hora
+        return GenericCode.roundArray(values, 2)
+
+    def toColumns(rows, numColumns):
+        # Columnas de las filas calculadas hora a hora. NumPy deja int64 si todos los valores son enteros de Python,
+        # igual que pandas al crear el DataFrame de la simulación por horas
+        if not rows:
+            return np.empty((numColumns, 0))
+        return [np.array(column) for column in zip(*rows)]
+
+    def where(condition, values, other):
+        # np.where que mantiene el tipo del valor elegido si todas las horas van por la misma rama,
+        # como el if/else de la simulación por horas (por ejemplo Surplus = 0 es entero)
+        if condition.size and condition.all():
+            return np.broadcast_to(values, condition.shape).copy()
+        if condition.size and not condition.any():
+            return np.broadcast_to(other, condition.shape).copy()
+        return np.where(condition, values, other)
+
+    def reduceSummary(table):
+        # Hay 2 sumarios, el normal y el modificado/gestionado. Se reducen de una vez las columnas de ambas
+        # variantes (variante, columna, hora), igual que pandas: los NaN no suman ni cuentan en la media.
+        # table puede ser el DataFrame de la simulación o el diccionario de columnas de SimulationKernel
+        values = np.array([[np.asarray(table[column + i], dtype=float) for column in SimulationKernel.SUMMARY_COLUMNS]
+                           for i in ("", "Modified")]).reshape(2, len(SimulationKernel.SUMMARY_COLUMNS), -1)
+        counts = (~np.isnan(values)).sum(axis=-1)
+        return {'sums': np.nansum(values, axis=-1).tolist(),
+                'means': (np.nansum(values, axis=-1) / counts).tolist(),
+                'interchanges': ((values[:, 1] != 0) | (values[:, 0] != 0)).sum(axis=-1).tolist(),
+                'numberFailures': int(sum(np.asarray(table[column]).sum() for column, workingColumn in SimulationKernel.FAILURE_COLUMNS)),
+                'numHours': values.shape[-1]}
@@ -0,0 +1,89 @@
+import time
+import threading
+import contextvars
+import datetime as dt
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class SimulationTimings:
+    # Tiempos de la simulación por tramo con nombre (carga de datos, perfiles, bucle horario, regulación, resumen,
+    # respuesta): número de veces y segundos acumulados. Se suman al total del proceso y al ámbito actual, que es una
+    # petición o un trabajo de optimización, y se guardan los últimos maxScopes ámbitos. max es el registro más largo,
+    # que en los tramos que se registran de una vez (la regulación de todas las horas) es el del bloque
+    def __init__(self, maxScopes=50):
+        self.maxScopes = maxScopes
+        self.totals = {}
+        self.scopes = OrderedDict()
+        self.lock = threading.Lock()
+        self.current = contextvars.ContextVar("simulationTimingsScope", default=None)
+        self.scopeCount = 0
+
+    def accumulate(spans, name, seconds, count=1, maxSeconds=None):
+        span = spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+        span["count"] += count
+        span["seconds"] += seconds
+        span["max"] = max(span["max"], seconds if maxSeconds is None else maxSeconds)
+
+    def add(self, name, seconds, count=1, maxSeconds=None):
+        scope = self.current.get()
+        with self.lock:
+            if scope is None or scope["keep"]:
+                SimulationTimings.accumulate(self.totals, name, seconds, count, maxSeconds)
+            if scope is not None:
+                SimulationTimings.accumulate(scope["spans"], name, seconds, count, maxSeconds)
+
+    def merge(self, spans):
+        # Tramos medidos en otro proceso (los de la optimización), se suman como si se hubieran medido aquí
+        for name, span in spans.items():
+            self.add(name, span["seconds"], span["count"], span["max"])
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def scope(self, name, keep=True):
+        # Devuelve los tramos del ámbito. Con keep=False no se guarda entre los últimos ámbitos ni suma al total
+        # del proceso, sirve para recoger lo que mide cada proceso de la optimización y devolvérselo al principal
+        with self.lock:
+            self.scopeCount += 1
+            scope = {"id": self.scopeCount, "name": name, "started": dt.datetime.now().isoformat(timespec="seconds"),
+                     "seconds": None, "keep": keep, "spans": {}}
+            if keep:
+                self.scopes[scope["id"]] = scope
+                while len(self.scopes) > self.maxScopes:
+                    self.scopes.popitem(last=False)
+        token = self.current.set(scope)
+        start = time.perf_counter()
+        try:
+            yield scope["spans"]
+        finally:
+            scope["seconds"] = time.perf_counter() - start
+            self.current.reset(token)
+
+    def getReport(self):
+        with self.lock:
+            return {"totals": {name: dict(span) for name, span in self.totals.items()},
+                    "scopes": [{**{key: value for key, value in scope.items() if key != "keep"}, "spans": {name: dict(span) for name, span in scope["spans"].items()}}
+                               for scope in reversed(self.scopes.values())]}
+
+    def getPrometheus(self):
+        # Formato de texto de Prometheus, con los totales del proceso
+        report = self.getReport()["totals"]
+        lines = ["# HELP inasolar_simulation_span_seconds_total Seconds spent in each span of the simulation",
+                 "# TYPE inasolar_simulation_span_seconds_total counter"]
+        lines += [f'inasolar_simulation_span_seconds_total{{span="{name}"}} {span["seconds"]:.6f}' for name, span in report.items()]
+        lines += ["# HELP inasolar_simulation_span_count_total Times each span of the simulation has run",
+                  "# TYPE inasolar_simulation_span_count_total counter"]
+        lines += [f'inasolar_simulation_span_count_total{{span="{name}"}} {span["count"]}' for name, span in report.items()]
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.totals = {}
+            self.scopes.clear()
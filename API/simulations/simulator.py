@@ -2,17 +2,45 @@ import pandas as pd
 import datetime as dt
 import numpy as np
 import dateutil.parser as parser
-import copy
 from .genericCode import GenericCode
-from itertools import product
+from .simulationKernel import SimulationKernel
+from .resultAccumulator import ResultAccumulator
+from .regulationEngine import RegulationEngine
+from .dataCache import SimulationDataCache
+from .failureSchedule import FailureSchedule
+from .ensembleKernel import EnsembleKernel
+from .unitProfiles import UnitProfiles
+from .rangeCheckpoints import RangeCheckpoints
+from .resultStore import ResultStore
+from .simulatorConfig import SimulatorConfig
+from .simulationTimings import SimulationTimings
+from itertools import product, combinations
+import threading
+import hashlib
+import os
 
 import time
 
 class simulator():
     # VARIABLES GLOBALES
     # Se calcula a qué se dedica la potencia de cada renovable en cada hora (carga, surplus, bomba...)
-    PERCENTAGE_RENEWABLES_PARAMS = pd.read_sql(
-            "SELECT IdParameter, Type FROM AllocationParameters WHERE ParameterType = 'sunburstChildData'", GenericCode.engine).groupby('Type')
+    PERCENTAGE_RENEWABLES_PARAMS = GenericCode.dataSource.getMetadata(
+            'AllocationParameters', "ParameterType = 'sunburstChildData'", columns='IdParameter, Type').groupby('Type')
+    # Datos de meteorología y generación de las simulaciones, compartidos por todos los simuladores del proceso
+    DATA_CACHE = SimulationDataCache()
+    # Perfiles unitarios por localización y rango, y potencia FV instalada de las granjas de cada área
+    UNIT_PROFILES = UnitProfiles()
+    # Planes de escenarios de la optimización por versión de OptimizationIntervals
+    SCENARIOS_PLANS = {}
+    SCENARIOS_PLANS_LOCK = threading.Lock()
+    # Última simulación de cada configuración, para continuarla si se amplía el rango
+    CHECKPOINTS = RangeCheckpoints()
+    # Resultados completos en disco, compartidos por todos los procesos. La versión de los datos es la de la tabla
+    # DataVersion, que incrementan los scripts de carga, y INASOLAR_DATA_VERSION para invalidarlos a mano
+    RESULT_STORE = ResultStore(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "simulations"),
+                               dataVersion=lambda: (os.environ.get("INASOLAR_DATA_VERSION"), GenericCode.dataSource.getDataVersion()))
+    # Tiempos por tramo (data_load, unit_profiles, hour_loop, regulation, summary, response) del proceso y de cada petición
+    TIMINGS = SimulationTimings()
     
     def __init__(self):
         # Constants?
@@ -105,6 +133,8 @@ class simulator():
         self.hydraulicExponentialSize = 1
         self.hydraulicRayleighScale = 24
         self.hydraulicRayleighSize = 1
+        # Semilla de los fallos. Con la misma semilla cada simulación tiene los mismos fallos, y si es None son aleatorios
+        self.seed = None
 
         self.setRenewableCosts()
 
@@ -113,6 +143,16 @@ class simulator():
         self.simulation_time = 0
         self.biogas = 0
 
+    def fromConfig(config):
+        # Simulador con los valores de una SimulatorConfig, sin pasar por __init__ ni por los setters
+        scenarioSimulator = simulator.__new__(simulator)
+        scenarioSimulator.__dict__.update(config.items)
+        scenarioSimulator.cache = {}
+        scenarioSimulator.total_time = 0
+        scenarioSimulator.simulation_time = 0
+        scenarioSimulator.biogas = 0
+        return scenarioSimulator
+
     def setRenewableCosts(self):
         dayHours = 365*24
         self.bio_amortization_cost_hour = self.bio_installation_cost / \
@@ -125,47 +165,179 @@ class simulator():
             (self.hydraulic_amortization_period*dayHours)
 
     # Returns a dataframe with the simulation for a whole year starting from a given date, a database connection needs to be passed
-    def range_simulation(self, start_day="2022-12-01", end_day="2023-01-01", location={}, parameters={}, with_failures=True):
+    # Con kernel=True la simulación se hace sobre arrays de NumPy (SimulationKernel) en lugar de un diccionario por hora
+    # Con summary_only se simula con SimulationKernel sin construir la tabla horaria y se devuelve directamente el resumen (get_summary(tabla, True))
+    # Con columns solo se devuelven esas columnas, y el reparto por renovable (PotDem-*, Surplus-*, PotBombeo2-*) solo se calcula si se pide
+    # Con resume la tabla completa se guarda en CHECKPOINTS y la siguiente petición de la misma configuración solo simula los días nuevos
+    # Con persist la tabla completa se busca en RESULT_STORE antes de simular, sin leer los datos de entrada, y se guarda al terminar
+    def range_simulation(self, start_day="2022-12-01", end_day="2023-01-01", location={}, parameters={}, with_failures=True, kernel=False, summary_only=False,
+                         columns=None, resume=False, persist=False):
         current_date = dt.datetime.strptime(start_day, "%Y-%m-%d")
         final_date = dt.datetime.strptime(end_day, "%Y-%m-%d")
-        (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure,
-         general_table, next_hours) = self.initializeVariables(with_failures, final_date, current_date, location['Area'])
-        if "weather_data" not in self.cache:
-            self.cache["weather_data"] = pd.read_sql(f"""SELECT d.Hour, CONVERT(varchar(10), d.Date, 23) AS Fecha,
-                               h.windspeed_10m,h.temperature_2m, d.Date,g.Power, e.Price, e.Surplus
-                               FROM datosGEDER2 g, HistoricalWeather h, Dates d, Locations l, ElectricityPrice e
-                               WHERE e.date=d.id and l.Area = h.Area and g.date = d.id
-                               and d.id = h.date and l.id ={location['Location']}
-                               and g.location = {location['Location']}
-                               and (d.Date >= CAST('{start_day}' as date) and d.date  <= CAST('{end_day}' as date))
-                               ORDER BY d.Date """, GenericCode.engine)
-        # FETCHING PHOTOVOLTAIC GENERATION DATA FROM ALL FARMS
-        if "generation_data" not in self.cache:
-            self.cache["generation_data"]= pd.read_sql(f"""SELECT l.Name, d.Hour, CONVERT(varchar(10), d.Date, 23) as Fecha,
-                                        h.windspeed_10m, d.Date,g.Power FROM datosGEDER2 g, HistoricalWeather h, Dates d, Locations l
-                                        WHERE l.Area = h.Area and g.date = d.id and d.id = h.date and l.id = g.location
-                                        and l.Area = {location['Area']} and l.Type = 'Generator'
-                                        and (d.Date >= CAST('{start_day}' as date) and d.date  <= CAST('{end_day}' as date))
-                                        ORDER BY l.name, CONCAT(Year,'-',Month,'-',Day), d.Hour """, GenericCode.engine)
-    
+        # Sin semilla los fallos son aleatorios en cada petición, no se puede reutilizar una simulación anterior
+        repeatable = not summary_only and columns is None and (not with_failures or self.seed is not None)
+        store_key = None
+        if persist and repeatable and (kernel or resume):
+            store_key = self.getStoreKey(location, start_day, end_day, parameters, with_failures)
+            general_table = simulator.RESULT_STORE.get(store_key)
+            if general_table is not None:
+                return general_table
+
+        failure_schedule, general_table, next_hours = self.initializeVariables(with_failures, final_date, current_date, location['Area'])
+
+        if resume and repeatable:
+            general_table = self.resumeSimulation(start_day, end_day, location, parameters, with_failures, failure_schedule)
+            self.storeResult(store_key, general_table, (final_date - current_date).days)
+            return general_table
+
+        if kernel or summary_only:
+            failures = None
+            if with_failures:
+                failures = failure_schedule.working
+            profiles = self.getUnitProfiles(location, start_day, end_day)
+            t1 = time.time()
+            general_table = SimulationKernel(self).simulate(profiles, failures, parameters, summaryOnly=summary_only, columns=columns)
+            self.simulation_time += time.time() - t1
+            if summary_only:
+                return simulator.buildSummary(general_table, True)
+            self.storeResult(store_key, general_table, (final_date - current_date).days)
+            return general_table
+
+        self.cache["weather_data"], self.cache["generation_data"] = simulator.getSimulationData(location, start_day, end_day)
+        results = ResultAccumulator()
+        breakdown = SimulationKernel.needsBreakdown(columns)
+        # Se separan los datos por día una sola vez, en lugar de filtrar los dos DataFrames en cada día
+        weather_days = simulator.getDailyFrames(self.cache["weather_data"], current_date)
+        generation_days = simulator.getDailyFrames(self.cache["generation_data"], current_date)
+        generation_by_hour = simulator.getDailyGeneration(self.cache["generation_data"], current_date)
+        day = 0
+        hour_loop_start = time.perf_counter()
         while current_date < final_date:
-            (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure,
-                 next_hours) = self.initializeFailures(with_failures, FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure,
-                                                       Turbine_hours_until_failure, Pump_hours_until_failure, next_hours)
-            #esta es la query para seleccionar un dia en concreto
-            df_query = f'Date >= "{current_date.strftime("%Y-%m-%d")}" and Date < "{(current_date + dt.timedelta(days=1)).strftime("%Y-%m-%d")} "'
-            day_weather_data = self.cache["weather_data"].query(df_query)
-            day_generation_data = self.cache["generation_data"].query(df_query)
+            next_hours = self.initializeFailures(with_failures, failure_schedule, day, next_hours)
+            day_weather_data = weather_days.get(day, self.cache["weather_data"].iloc[:0])
+            day_generation_data = generation_days.get(day, self.cache["generation_data"].iloc[:0])
             try:
-                general_table = pd.concat([general_table, self.getDailyAssignmentHistorical(objective_date=current_date.strftime("%Y-%m-%d"),
-                                                                                                location=location, previous_day=general_table, failures=next_hours,
-                                                                                                parameters=parameters,day_weather_data=day_weather_data,
-                                                                                                day_generation_data=day_generation_data)], ignore_index=True)
+                # La hora anterior sale de la última fila acumulada
+                results.append(self.getDailyRows(day_weather_data, day_generation_data, current_date,
+                                                 previous_hour=results.lastRow(), failures=next_hours, parameters=parameters,
+                                                 breakdown=breakdown, generation_by_hour=generation_by_hour.get(day, pd.Series(dtype=float))))
             except Exception as e:
                 print(f"Error en: {current_date}", e)
                 
             current_date = current_date + dt.timedelta(days=1)
-        return general_table
+            day += 1
+        simulator.TIMINGS.add("hour_loop", time.perf_counter() - hour_loop_start)
+        return results.toDataFrame(columns)
+
+    def getDayOffsets(frame, start_date):
+        # Día de cada fila contando desde start_date, como en la consulta Date >= día and Date < día siguiente
+        return (frame['Date'] - pd.Timestamp(start_date)).dt.days
+
+    def getDailyFrames(frame, start_date):
+        # {día: filas del día}, con el mismo índice y orden que el filtro de cada día
+        return {day: frame.iloc[positions] for day, positions in frame.groupby(simulator.getDayOffsets(frame, start_date)).indices.items()}
+
+    def getDailyGeneration(generation_data, start_date):
+        # {día: generación de cada hora}, lo mismo que getDailyRows agrupa por hora dentro de cada día
+        hourly = abs(generation_data.groupby([simulator.getDayOffsets(generation_data, start_date).rename("Day"), "Hour"])["Power"].sum())
+        return {day: values.droplevel(0) for day, values in hourly.groupby(level=0)}
+
+    def getConfigurationHash(self):
+        # Configuración del simulador, sin los datos ni los tiempos de la última simulación y sin lo que calcula
+        # initializeVariables, así se puede obtener antes de consultar la base de datos
+        state = {key: value for key, value in vars(self).items() if key not in SimulatorConfig.EXCLUDED}
+        return hashlib.sha1(repr(sorted(state.items())).encode()).hexdigest()
+
+    def getCheckpointKey(self, location, start_day, parameters, with_failures):
+        return (location['Location'], location['Area'], start_day, with_failures, tuple(parameters), self.getConfigurationHash())
+
+    def getStoreKey(self, location, start_day, end_day, parameters, with_failures):
+        return (location['Location'], location['Area'], start_day, end_day, with_failures, tuple(parameters),
+                GenericCode.MAX_DEMAND, self.getConfigurationHash())
+
+    def storeResult(self, store_key, table, days):
+        # Solo se guardan los rangos con todos los días, a los que faltan datos se les pueden añadir más adelante
+        if store_key is not None and len(table) == days * 24:
+            simulator.RESULT_STORE.put(store_key, table)
+
+    def resumeSimulation(self, start_day, end_day, location, parameters, with_failures, failure_schedule):
+        # Sigue desde el último día simulado de la misma configuración, con el estado de su última hora.
+        # Los fallos son los del rango completo, que empiezan igual que los del rango guardado
+        key = self.getCheckpointKey(location, start_day, parameters, with_failures)
+        checkpoint = simulator.CHECKPOINTS.get(key)
+        if checkpoint is not None and checkpoint['end_day'] >= end_day:
+            table = checkpoint['table']
+            return table[table['Date'] < end_day].reset_index(drop=True)
+
+        resume_day, state = start_day, None
+        if checkpoint is not None:
+            resume_day, state = checkpoint['end_day'], checkpoint['state']
+        offset = (dt.datetime.strptime(resume_day, "%Y-%m-%d") - dt.datetime.strptime(start_day, "%Y-%m-%d")).days * 24
+        failures = None
+        if with_failures:
+            failures = {component: values[offset:] for component, values in failure_schedule.working.items()}
+
+        profiles = self.getUnitProfiles(location, resume_day, end_day)
+        kernel = SimulationKernel(self)
+        t1 = time.time()
+        table = kernel.simulate(profiles, failures, parameters, state=state)
+        self.simulation_time += time.time() - t1
+        if checkpoint is not None and len(checkpoint['table']):
+            table = pd.concat([checkpoint['table'], table], ignore_index=True) if len(table) else checkpoint['table']
+        # Igual que en storeResult, solo se guardan los rangos con todos los días. Si faltan días (no hay datos todavía)
+        # se queda el punto de control anterior, así se simulan cuando se añadan los datos
+        days = (dt.datetime.strptime(end_day, "%Y-%m-%d") - dt.datetime.strptime(start_day, "%Y-%m-%d")).days
+        if len(table) == days * 24:
+            simulator.CHECKPOINTS.put(key, {'end_day': end_day, 'table': table, 'state': kernel.state})
+        return table.copy()
+
+    # Simula a la vez realizations realizaciones de los fallos y devuelve la media y los percentiles de cada métrica del resumen
+    def ensemble_simulation(self, start_day="2022-12-01", end_day="2023-01-01", location={}, realizations=100, percentiles=(5, 50, 95)):
+        current_date = dt.datetime.strptime(start_day, "%Y-%m-%d")
+        final_date = dt.datetime.strptime(end_day, "%Y-%m-%d")
+        self.initializeVariables(False, final_date, current_date, location['Area'])
+        profiles = self.getUnitProfiles(location, start_day, end_day)
+        hours = (final_date - current_date).days * 24
+        # Cada realización tiene su propia secuencia, derivada de la semilla del simulador
+        schedules = [FailureSchedule.generate(self, hours, seedSequence)
+                     for seedSequence in np.random.SeedSequence(self.seed).spawn(realizations)]
+        failures = {component: np.stack([schedule.working[component] for schedule in schedules])
+                    for component in FailureSchedule.COMPONENTS}
+
+        t1 = time.time()
+        kernel = EnsembleKernel(self)
+        with simulator.TIMINGS.span("hour_loop"):
+            summaries = kernel.getSummaries(kernel.simulate(profiles, failures))
+        self.simulation_time += time.time() - t1
+        return EnsembleKernel.getSummaryBands(summaries, percentiles)
+
+    # Los datos se comparten entre simuladores, por localización, área y rango de fechas
+    def getSimulationData(location, start_day, end_day):
+        with simulator.TIMINGS.span("data_load"):
+            return simulator.DATA_CACHE.getData(location['Location'], location['Area'], start_day, end_day,
+                                                lambda start, end: simulator.loadSimulationData(location, start, end))
+
+    # Los perfiles dependen de la potencia FV de las granjas y de los umbrales de viento, que pueden cambiar por simulador
+    def getUnitProfiles(self, location, start_day, end_day):
+        key = (location['Location'], location['Area'], start_day, end_day, self.pvFarmsInstalledPower,
+               self.min_speed, self.max_speed, self.max_speed_limit)
+
+        def loadProfiles():
+            weather_data, generation_data = simulator.getSimulationData(location, start_day, end_day)
+            current_date = dt.datetime.strptime(start_day, "%Y-%m-%d")
+            final_date = dt.datetime.strptime(end_day, "%Y-%m-%d")
+            inputs = SimulationKernel.getDailyInputs(weather_data, generation_data, current_date, (final_date - current_date).days)
+            return UnitProfiles.compute(inputs, current_date, self.pvFarmsInstalledPower, self.min_speed, self.max_speed,
+                                        self.max_speed_limit)
+
+        with simulator.TIMINGS.span("unit_profiles"):
+            return simulator.UNIT_PROFILES.getProfiles(key, loadProfiles)
+
+    def loadSimulationData(location, start_day, end_day):
+        weather_data = GenericCode.dataSource.getSimulationWeather(location['Location'], start_day, end_day)
+        # FETCHING PHOTOVOLTAIC GENERATION DATA FROM ALL FARMS
+        generation_data = GenericCode.dataSource.getGeneration(location['Area'], start_day, end_day)
+        return weather_data, generation_data
 
     def initializeVariables(self, with_failures, final_date, current_date, area, locationGenerator=None):
         self.setRenewableCosts()
@@ -174,62 +346,31 @@ class simulator():
         self.qBiometGenerado = self.qBiogasGenerado * 0.6
         # Se calcula la potencia total dependiendo de las granjas. Si se está en predicción, solo la del recurso seleccionado,
         # y si se está en el histórico, de todas las granjas del área
-        farmsQuery = f"SELECT * FROM Locations WHERE Area = {area} AND Type = 'Generator'"
-        if locationGenerator:
-            farmsQuery += f'AND id = {locationGenerator}'
-        farms = pd.read_sql(farmsQuery, GenericCode.engine)
-        farmsPV = farms[farms['ResourceType'] == 'photovoltaic']
-        self.pvFarmsInstalledPower = farmsPV['InstalledPower'].sum()
-        FV_hours_until_failure = []
-        Eolic_hours_until_failure = []
-        Biogas_hours_until_failure = []
-        Turbine_hours_until_failure = []
-        Pump_hours_until_failure = []
+        # La consulta de las granjas se hace una vez por área y versión de los datos, todos los escenarios usan la misma potencia
+        def loadFarmsPower():
+            farms = GenericCode.dataSource.getFarms(area, locationGenerator)
+            return farms[farms['ResourceType'] == 'photovoltaic']['InstalledPower'].sum()
+        self.pvFarmsInstalledPower = simulator.UNIT_PROFILES.getFarmsPower(
+            (area, locationGenerator, simulator.RESULT_STORE.getDataVersion()), loadFarmsPower)
+        failure_schedule = None
         # If want simulate with failures...
         if with_failures == True:
-            # Start variables
-            hours_total_number = (final_date-current_date).days * 24
-            # Loading hours until failures on each variable. It works like a FIFO queue
-            while len(FV_hours_until_failure) <= hours_total_number or len(Eolic_hours_until_failure) <= hours_total_number or len(Biogas_hours_until_failure) <= hours_total_number or len(Turbine_hours_until_failure) <= hours_total_number or len(Pump_hours_until_failure) <= hours_total_number:
-                # CHANGE Better memory usage
-                if len(FV_hours_until_failure) <= hours_total_number:
-                    FV_hours_until_failure += ([1] * self.generate_exponential(self.pvExponentialScale, self.pvExponentialSize)[
-                                               0]) + ([0] * self.generate_rayleigh(self.pvRayleighScale, self.pvRayleighSize)[0])
-                if len(Eolic_hours_until_failure) <= hours_total_number:
-                    Eolic_hours_until_failure += ([1] * self.generate_exponential(self.windPowerExponentialScale, self.windPowerExponentialSize)[
-                                                  0]) + ([0] * self.generate_rayleigh(self.windPowerRayleighScale, self.windPowerRayleighSize)[0])
-                if len(Biogas_hours_until_failure) <= hours_total_number:
-                    Biogas_hours_until_failure += ([1] * self.generate_exponential(self.biogasExponentialScale, self.biogasExponentialSize)[
-                                                   0]) + ([0] * self.generate_rayleigh(self.biogasRayleighScale, self.biogasRayleighSize)[0])
-                if len(Turbine_hours_until_failure) <= hours_total_number:
-                    Turbine_hours_until_failure += ([1] * self.generate_exponential(self.hydraulicExponentialScale, self.hydraulicExponentialSize)[
-                                                    0]) + ([0] * self.generate_rayleigh(self.hydraulicRayleighScale, self.hydraulicRayleighSize)[0])
-                if len(Pump_hours_until_failure) <= hours_total_number:
-                    Pump_hours_until_failure += ([1] * self.generate_exponential(self.hydraulicExponentialScale, self.hydraulicExponentialSize)[
-                        0]) + ([0] * self.generate_rayleigh(self.hydraulicRayleighScale, self.hydraulicRayleighSize)[0])
+            # Estado de cada recurso en cada hora, el bucle diario accede por desplazamiento. Un día por cada vuelta del
+            # bucle: en la predicción final_date es el último día a las 23:00, y ese día también se simula
+            days = -(-(final_date - current_date) // dt.timedelta(days=1))
+            failure_schedule = FailureSchedule.generate(self, days * 24)
 
         general_table = None
         next_hours = None
 
-        return (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure,
-                general_table, next_hours)
+        return failure_schedule, general_table, next_hours
 
-    def initializeFailures(self, with_failures, FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure,
-                           Turbine_hours_until_failure, Pump_hours_until_failure, next_hours):
+    def initializeFailures(self, with_failures, failure_schedule, day, next_hours):
+        # Fallos del día número day de la simulación
         if with_failures == True:
-            # shifting/poping 24 the first 24 hours of each variable
-            next_hours = {"fv_working": [], "eolic_working": [
-            ], "biogas_working": [], "turbine_working": [], "pump_working": []}
-            FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure = self.shift_lists(
-                FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure)
-            # Index 0 = failures of the current day, index 1 = FIFO queue without the first 24 values (queue[24:])
-            next_hours["fv_working"], FV_hours_until_failure = FV_hours_until_failure[0], FV_hours_until_failure[1]
-            next_hours["eolic_working"], Eolic_hours_until_failure = Eolic_hours_until_failure[0], Eolic_hours_until_failure[1]
-            next_hours["biogas_working"], Biogas_hours_until_failure = Biogas_hours_until_failure[0], Biogas_hours_until_failure[1]
-            next_hours["turbine_working"], Turbine_hours_until_failure = Turbine_hours_until_failure[0], Turbine_hours_until_failure[1]
-            next_hours["pump_working"], Pump_hours_until_failure = Pump_hours_until_failure[0], Pump_hours_until_failure[1]
-
-        return (FV_hours_until_failure, Eolic_hours_until_failure, Biogas_hours_until_failure, Turbine_hours_until_failure, Pump_hours_until_failure, next_hours)
+            next_hours = failure_schedule.day(day)
+
+        return next_hours
 
     # Returns a dataframe with the simulation for the target day, a database connection needs to be passed
 
@@ -239,42 +380,62 @@ class simulator():
 
     # Returns a dataframe with the simulation for the target day, a database connection needs to be passed
     def getDailyAssignment(self, day_data, generation_of_day, objective_date, previous_day=None, failures=None, parameters={}):
-        generation_by_hour = abs(generation_of_day.groupby(
-            by=["Hour"]).sum(numeric_only=True)["Power"])
+        previous_hour = None
+        if previous_day is not None:
+            previous_hour = previous_day.iloc[-1].to_dict()
+        return pd.DataFrame(self.getDailyRows(day_data, generation_of_day, objective_date, previous_hour, failures, parameters))
+
+    # Returns the hours (one dict per hour) of the simulation for the target day. previous_hour is the last simulated hour, if any
+    # generation_by_hour es la generación agrupada por hora, si ya se ha calculado
+    def getDailyRows(self, day_data, generation_of_day, objective_date, previous_hour=None, failures=None, parameters={}, breakdown=True,
+                     generation_by_hour=None):
+        if generation_by_hour is None:
+            generation_by_hour = abs(generation_of_day.groupby(
+                by=["Hour"]).sum(numeric_only=True)["Power"])
         aux_table = []
 
         t1= time.time()
+        if previous_hour is None:
+            previous_hour = []
+        previous_day_hour = previous_hour
         for hour in range(0, 24):
             # Add date to row
             date = objective_date + dt.timedelta(hours=hour)
             date = date.strftime('%Y-%m-%d %H:%M')
 
-            if hour == 0 and previous_day is not None:
-                # Se llama al método pasando la última hora del día anterior
-                previous_hour = self.get_hour_assignment(date=date, hour=hour, day_data=day_data, generation_by_hour=generation_by_hour,
-                                                         previous_hour=previous_day.iloc[-1].to_dict(), failures=failures, parameters=parameters)
-                aux_table.append(previous_hour)
-            elif hour == 0 and previous_day is None:
-                previous_hour = self.get_hour_assignment(
-                    date=date, hour=hour, day_data=day_data, generation_by_hour=generation_by_hour, previous_hour=[], failures=failures, parameters=parameters)
-                aux_table.append(previous_hour)
-            else:
-                previous_hour = self.get_hour_assignment(
-                    date=date, hour=hour, day_data=day_data, generation_by_hour=generation_by_hour, previous_hour=previous_hour, failures=failures, parameters=parameters)
-                aux_table.append(previous_hour)
-                # aux_table = pd.concat(
-                #     [aux_table, previous_hour, ], ignore_index=True)
+            # En la hora 0 se pasa la última hora del día anterior
+            previous_hour = self.get_hour_assignment(date=date, hour=hour, day_data=day_data, generation_by_hour=generation_by_hour,
+                                                     previous_hour=previous_hour, failures=failures, parameters=parameters,
+                                                     breakdown=breakdown)
+            aux_table.append(previous_hour)
         
+        self.setDailyRenewableData(aux_table, previous_day_hour, breakdown)
         self.simulation_time += time.time() - t1
         # La potencia de Bombeo debe de ir en negativo
-        table_df = pd.DataFrame(aux_table)
-
-        table_df['PotBombeo2Modified'] = -table_df['PotBombeo2Modified']
-        table_df['PotBombeo2'] = -table_df['PotBombeo2']
-
-        return table_df
-
-    def get_hour_assignment(self, hour, date, previous_hour, day_data, generation_by_hour, failures, parameters={}, repeated=False):
+        for row in aux_table:
+            row['PotBombeo2Modified'] = -row['PotBombeo2Modified']
+            row['PotBombeo2'] = -row['PotBombeo2']
+
+        return aux_table
+
+    def setDailyRenewableData(self, rows, previous_hour, breakdown=True):
+        # Columnas de setCommonRenewableData que no influyen en la hora siguiente, calculadas con las funciones
+        # vectorizadas de SimulationKernel sobre las 24 horas. previous_hour es la última hora del día anterior
+        keys = ["PotDem", "FV working", "Eolic working", "Biogas working", "Pump working", "Turbine working"]
+        keys += [column + modified for modified in ('', 'Modified')
+                 for column in SimulationKernel.BREAKDOWN_PARENTS + ['RenewablesPowerWithGrid', 'PotBombeo2', 'Surplus', 'PotDemFinal']]
+        table = {key: np.array([row[key] for row in rows]) for key in dict.fromkeys(keys)}
+        for modified in ('', 'Modified'):
+            if breakdown:
+                SimulationKernel.setBreakdown(table, modified)
+            previousDemand = previous_hour['PotDemFinal' + modified] if len(previous_hour) != 0 else None
+            SimulationKernel.setLossOfLoad(table, modified, previousDemand)
+        for column in [key for key in table if key not in keys]:
+            for row, value in zip(rows, table[column].tolist()):
+                row[column] = value
+        return rows
+
+    def get_hour_assignment(self, hour, date, previous_hour, day_data, generation_by_hour, failures, parameters={}, repeated=False, breakdown=True):
         table = {"Date": None, "Hour": None, "FV working": None,  "Eolic working": None, "PotDem": None, "Biogas working": None, "Pump working": None,
                  "Turbine working": None, "ElectricityGridPrice": None, "ElectricitySurplusPrice": None, "FV coefficient": None, "Eolic coefficient": None,
                  "Biogas coefficient": None, "FVGenerationCostModified": None, "FVCostModified": None, "EolGenerationCostModified": None, "EolCostModified": None,
@@ -385,7 +546,7 @@ class simulator():
         
         
         if not repeated:
-            table = self.setCommonRenewableData(modified, table, previous_hour)
+            table = self.setCommonRenewableData(modified, table, previous_hour, breakdown)
 
         # default values
         table["FV coefficient"] = 1
@@ -396,80 +557,21 @@ class simulator():
         # 'Repeated' is used to control recursion
         modified = 'Modified'
         if not repeated and round(table["PotDemFinal"], 3) < 0:
-            best = [1, 1, round(table["PotDemFinal"], 3), 1]
-            original_fv = self.photovoltaic_power
-            original_eolic = self.wind_turbine_power
-            # original_biogas = self.generator_max_power # esto ya no se usa
-            better = False
-
-            self.biogas_coefficient = 0.75
-            # self.generator_max_power = self.generator_max_power * self.biogas_coefficient
-            result = self.get_hour_assignment(
-                hour, date, previous_hour, day_data, generation_by_hour, failures, repeated=True)
-
-            # Si demanda final superior o igual a 0 con 0.75 entonces no podemos apagar biogas, calculamos siguiente hora
-            if round(result["PotDemFinalModified"], 3) >= 0:
-                self.biogas_coefficient = 1
-            else:
-                # Si no se cumple lo anterior tenemos nuevo mejor resultado con coeficiente 0.75,
-                best = [1, 1, round(result["PotDemFinalModified"], 3),
-                        self.biogas_coefficient]
-                # Ahora miramos coeficiente de 0.5
-                self.biogas_coefficient = 0.5
-                result = self.get_hour_assignment(
-                    hour, date, previous_hour, day_data, generation_by_hour, failures, repeated=True)
-                if round(result["PotDemFinalModified"], 3) >= 0:
-                    self.biogas_coefficient = 0.75
-                else:
-                    best = [1, 1, round(
-                        result["PotDemFinalModified"], 3), self.biogas_coefficient]
-
-            # Se baja el biogas al 25% para comprobar si sigue habiendo excedente
-            if self.biogas_coefficient == 0.5:
-                self.biogas_coefficient = 0.25
-                result = self.get_hour_assignment(
-                    hour, date, previous_hour, day_data, generation_by_hour, failures, repeated=True)
-
-                # Si demanda final superior o igual a 0 con 0.25 entonces no podemos apagar biogas, calculamos siguiente hora
-                if round(result["PotDemFinalModified"], 3) >= 0:
-                    self.biogas_coefficient = 0.5
-                else:
-                    # Si no se cumple lo anterior tenemos nuevo mejor resultado con coeficiente 0.25,
-                    best = [1, 1, round(result["PotDemFinalModified"], 3),
-                            self.biogas_coefficient]
-
-            if self.biogas_coefficient == 0.25:
-                for coefficient_FV in [0, 0.25, 0.5, 0.75, 1]:
-                    self.photovoltaic_power = self.photovoltaic_power * coefficient_FV
-                    for coeficcient_Eol in [0, 0.25, 0.5, 0.75, 1]:
-                        self.wind_turbine_power = self.wind_turbine_power * coeficcient_Eol
-                        result = self.get_hour_assignment(
-                            hour, date, previous_hour, day_data, generation_by_hour, failures, repeated=True)
-                        if (round(result["PotDemFinalModified"], 3) >= best[2] and round(result["PotDemFinalModified"], 3) <= 0 and
-                                result["PotBombeo2Modified"] >= 0.8 * table["PotBombeo2"]):
-                            best = [coefficient_FV, coeficcient_Eol, round(
-                                result["PotDemFinalModified"], 3), self.biogas_coefficient]
-                            better = True
-                            self.wind_turbine_power = original_eolic
-                            break
-                        self.wind_turbine_power = original_eolic
-                    self.photovoltaic_power = original_fv
-                    if better:
-                        break
-            else:
-                result = self.get_hour_assignment(
-                    hour, date, previous_hour, day_data, generation_by_hour, failures, repeated=True)
-                best = [1, 1, round(result["PotDemFinalModified"], 3),
-                        self.biogas_coefficient]
-
-            table.update(result)
-            table["FV coefficient"] = best[0]
-            table["Eolic coefficient"] = best[1]
-            table["Biogas coefficient"] = best[3]
-            table["PotDemFinalModified"] = best[2]
-            # Devolvemos max power a su valor original. ESTO YA NO HACE FALTA PERO LO DEJO POR SI ACASO
-            # self.generator_max_power = original_biogas
-            self.biogas_coefficient = 1
+            # Se evalúan todas las combinaciones de coeficientes a la vez, sin modificar los atributos del simulador
+            previous = None
+            if len(previous_hour) != 0:
+                previous = (previous_hour['VolBioFinal' + modified], previous_hour['VolDepInf2' + modified],
+                            previous_hour['VolDepSup2' + modified])
+            with simulator.TIMINGS.span("regulation"):
+                coefficient_FV, coefficient_Eol, coefficient_bio, result = RegulationEngine(self).regulate(
+                    table["PotFVUni"], table["PotEolUni"], table["PotDem"], table["Biogas working"], table["Pump working"],
+                    table["Turbine working"], previous, table["PotBombeo2"])
+            for column, value in zip(RegulationEngine.COLUMNS[:15], result):
+                # PotBio1 se sobrescribe con el valor regulado
+                table[column + ('' if column == 'PotBio1' else modified)] = value
+            table["FV coefficient"] = coefficient_FV
+            table["Eolic coefficient"] = coefficient_Eol
+            table["Biogas coefficient"] = coefficient_bio
 
         elif not repeated:
             table = self.setPvAndWindPower(modified, table)
@@ -477,7 +579,7 @@ class simulator():
         
 
         if not repeated:
-            table = self.setCommonRenewableData(modified, table, previous_hour)
+            table = self.setCommonRenewableData(modified, table, previous_hour, breakdown)
 
         return table
 
@@ -486,77 +588,75 @@ class simulator():
 
     # CHANGE SUMMARY
     def get_summary(dataframe=None, optimize=False,  csv_filename=None):
+        start = time.perf_counter()
         if dataframe is not None:
             table = dataframe
         else:
             table = pd.read_csv(csv_filename, decimal=",", sep=";")
+        summary = simulator.buildSummary(SimulationKernel.reduceSummary(table), optimize)
+        simulator.TIMINGS.add("summary", time.perf_counter() - start)
+        return summary
+
+    def buildSummary(reduction, optimize=False):
+        # Sumario de cada variante a partir de las sumas y medias de SimulationKernel.reduceSummary
+        sums, means, interchanges = reduction['sums'], reduction['means'], reduction['interchanges']
+        numberFailures, num_hours = reduction['numberFailures'], reduction['numHours']
         summary = []
-        # Hay 2 sumarios, el normal y el modificado/gestionado
-        for i in ("", "Modified"):
+        for index, i in enumerate(("", "Modified")):
+            surplus, grid, sosWaterTank, sosBiogas, loleSin, loleCon, potQuemAnt, energyCost, interruptions = sums[index]
             renewableData = {}
 
-            renewableData["surplusSummary"] = GenericCode.roundNumber(
-                table["Surplus"+i].sum())
-            renewableData["gridSummary"] = GenericCode.roundNumber(
-                table["Grid"+i].sum())
+            renewableData["surplusSummary"] = GenericCode.roundNumber(surplus)
+            renewableData["gridSummary"] = GenericCode.roundNumber(grid)
             absoluteSurplus = abs(renewableData["surplusSummary"])
             renewableData["balance"] = GenericCode.roundNumber(
                 renewableData["gridSummary"] + renewableData["surplusSummary"])
             renewableData["absoluteSum"+i] = GenericCode.roundNumber(renewableData["surplusSummary"] +
                                                                      renewableData["gridSummary"])
-            renewableData["interchangeCount"] = len(table.query(
-                f"`Grid{i}` != 0 |`Surplus{i}` != 0 ")["Hour"])
-            renewableData["numberFailures"] = table["nF FV"].sum() + table["nF Eolic"].sum(
-            ) + table["nF Bio"].sum() + table["nF Pump"].sum() + table["nF Turbine"].sum()
-            renewableData["sosWaterTank"] = GenericCode.roundNumber(
-                table["SOSVolDepSup2"+i].mean())
-            renewableData["sosBiogas"] = GenericCode.roundNumber(
-                table["SOSVolBioFinal"+i].mean())
-            renewableData["loleSin"] = table["LOLESin"+i].sum()
-            renewableData["loleCon"] = table["LOLECon"+i].sum()
-            renewableData["loleTotal"] = GenericCode.roundNumber(renewableData["loleCon"] +
-                                                                 renewableData["loleSin"])
-            num_hours = len(table)
+            renewableData["interchangeCount"] = interchanges[index]
+            renewableData["numberFailures"] = numberFailures
+            renewableData["sosWaterTank"] = GenericCode.roundNumber(means[index][2])
+            renewableData["sosBiogas"] = GenericCode.roundNumber(means[index][3])
+            renewableData["loleSin"] = int(loleSin)
+            renewableData["loleCon"] = int(loleCon)
+            renewableData["loleTotal"] = renewableData["loleCon"] + renewableData["loleSin"]
+            # Sin horas la probabilidad queda como NaN, igual que al dividir enteros de NumPy
             renewableData["lolpSin"] = GenericCode.roundNumber(
-                renewableData["loleSin"] / num_hours * 100)
+                float(np.float64(renewableData["loleSin"]) / num_hours * 100))
             renewableData["lolpCon"] = GenericCode.roundNumber(
-                renewableData["loleCon"] / num_hours * 100)
+                float(np.float64(renewableData["loleCon"]) / num_hours * 100))
             renewableData["lolpTotal"] = GenericCode.roundNumber(renewableData["lolpSin"] +
                                                                  renewableData["lolpCon"])
             renewableData["lossLoad"] = renewableData["gridSummary"]
-            renewableData["energyNotUsed"] = GenericCode.roundNumber(
-                absoluteSurplus + table['PotQuemAnt'+i].sum())
-            renewableData["energyCostRenewables"] = GenericCode.roundNumber(
-                table['EnergyCostWithRenewables'+i].sum())
+            renewableData["energyNotUsed"] = GenericCode.roundNumber(absoluteSurplus + potQuemAnt)
+            renewableData["energyCostRenewables"] = GenericCode.roundNumber(energyCost)
             renewableData["energyInterchange"] = GenericCode.roundNumber(
                 abs(renewableData["gridSummary"]) + absoluteSurplus)
 
             if not optimize:
-                renewableData["numberInterruptions"] = table["nIDG"+i].sum()
+                renewableData["numberInterruptions"] = int(interruptions)
                 renewableData['Simulation'] = 'Without Regulation'
                 if i == 'Modified':
                     renewableData['Simulation'] = 'With Regulation'
 
             summary.append(renewableData)
-
         return summary
 
-    def generate_exponential(self, scale, size):
+    def generate_exponential(self, scale, size, random):
         # 2 fallos/año = 1 fallo cada 0.5 años = 1 fallo cada 0.5*365 días = 182.5 días = 4380 horas
-        random_numbers = np.random.exponential(scale=scale, size=size)
-        number_list = list(map(lambda x: int(x), random_numbers))
-        return number_list
+        random_numbers = random.exponential(scale=scale, size=size)
+        return random_numbers.astype(np.int64)
 
-    def generate_rayleigh(self, scale, size):
-        random_numbers = np.random.rayleigh(scale=scale, size=size)
-        number_list = list(map(lambda x: int(x), random_numbers))
-        return number_list
+    def generate_rayleigh(self, scale, size, random):
+        random_numbers = random.rayleigh(scale=scale, size=size)
+        return random_numbers.astype(np.int64)
 
-    def shift_lists(self, *listas):
-        shifted_lists = []
-        for lista in listas:
-            shifted_lists.append((lista[:24], lista[24:]))
-        return tuple(shifted_lists)
+    def commonRandomSeed(self):
+        # Las simulaciones que comparten semilla tienen los mismos fallos (números aleatorios comunes).
+        # Si no se ha indicado, se fija una para todos los escenarios
+        if self.seed is None:
+            self.seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+        return self.seed
 
     def setPvAndWindPower(self, modified, table):
         # pasa algo raro float * float devuelve INT??? en la calculadora de windows también da un int con los mismos datos pero en el excel no *SOLUCIONADO, pero lo dejo aqui por si acaso*
@@ -662,7 +762,7 @@ class simulator():
 
         return table
 
-    def setCommonRenewableData(self, modified, table, previous_hour):
+    def setCommonRenewableData(self, modified, table, previous_hour, breakdown=True):
         if len(previous_hour) != 0:
             table['VolBioFinal' + modified] = (previous_hour['VolBioFinal' + modified] -
                                                table['PotBio2' + modified] * self.PBIO_DIV_CONS + self.qBiogasGenerado)
@@ -742,58 +842,28 @@ class simulator():
         # Se calcula toda la potencia que se ha generado en cada hora
         table['RenewablesPowerWithGrid' + modified] = table['RenewablesPower' + modified] + table['Grid' + modified]
         
-        #table = self.getRenewablesPercentagePower(modified, table)
-
-        table['PotDem-Grid' + modified]        =  (table['Grid' + modified] / table['RenewablesPowerWithGrid' + modified]) * table['PotDem']
-
-        percentage = table['PotBio3' + modified] / table['RenewablesPowerWithGrid' + modified]
-        table['PotBombeo2-PotBio3' + modified] =  percentage * table['PotBombeo2' + modified]
-        table['PotDem-PotBio3' + modified]     =  percentage * table['PotDem']
-        table['Surplus-PotBio3' + modified]    =  percentage * table['Surplus'+ modified]
-
-
-        percentage = table['PotEol' + modified] / table['RenewablesPowerWithGrid' + modified]
-        table['PotBombeo2-PotEol' + modified]  =  percentage * table['PotBombeo2' + modified]
-        table['PotDem-PotEol' + modified]      =  percentage * table['PotDem']
-        table['Surplus-PotEol' + modified]     =  percentage * table['Surplus' + modified]
-
-        percentage = table['PotFV' + modified] / table['RenewablesPowerWithGrid' + modified]
-        table['PotBombeo2-PotFV' + modified]   =  percentage * table['PotBombeo2' + modified]
-        table['PotDem-PotFV' + modified]       =  percentage * table['PotDem']
-        table['Surplus-PotFV' + modified]      =  percentage * table['Surplus' + modified]
-        
-        table['PotDem-PotTurbina2' + modified] =  (table['PotTurbina2' + modified] / table['RenewablesPowerWithGrid' + modified]) * table['PotDem']
-        
-
-
-        if len(previous_hour) == 0 or not (round(previous_hour["PotDemFinal" + modified]) <= 0 and round(table["PotDemFinal" + modified]) > 0):
-            table["nIDG" + modified] = 0
-        else:
-            table["nIDG" + modified] = 1
-
-        # CHANGE COLUMN LOLE with failures
-        table["LOLESin" + modified] = int(round(table["PotDemFinal" + modified]) > 0) * (table["FV working"] * table["Eolic working"]
-                                                                                         * table["Biogas working"] * table["Pump working"]
-                                                                                         * table["Turbine working"])
-        table["LOLEAux" +
-              modified] = int(round(table["PotDemFinal" + modified]) > 0)
-        table["LOLECon" + modified] = table["LOLEAux" +
-                                            modified] - table["LOLESin" + modified]
+        # El reparto por renovable, las interrupciones y la LOLE no influyen en las horas siguientes, se calculan
+        # para todo el día en setDailyRenewableData. Aquí solo se reservan sus columnas, para mantener el orden
+        for column in ([column for parent, column, target in SimulationKernel.BREAKDOWN] if breakdown else []) + SimulationKernel.LOSS_OF_LOAD_COLUMNS:
+            table[column + modified] = None
         self.biogas += time.time()-t1
         return table
     
     def getRenewablesPercentagePower(self, modified, table):
-        # Se agrupan por cada tipo de renovable
-        for parentName, typeParams in simulator.PERCENTAGE_RENEWABLES_PARAMS:
-            # Se calcula el porcentaje que corresponde a cada renovable de toda la generación (se incluye Grid)
-            percentage = table[parentName + modified] / table['RenewablesPowerWithGrid' + modified]
-            for index, typeParam in typeParams.iterrows():
+        # Se agrupan por cada tipo de renovable y se calcula de una vez el porcentaje que corresponde a cada una
+        # de toda la generación (se incluye Grid). Sirve para una hora o para arrays con todas las horas
+        parents = [parentName for parentName, typeParams in simulator.PERCENTAGE_RENEWABLES_PARAMS]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentages = (np.array([table[parentName + modified] for parentName in parents], dtype=float) /
+                           np.asarray(table['RenewablesPowerWithGrid' + modified], dtype=float))
+        for percentage, (parentName, typeParams) in zip(percentages, simulator.PERCENTAGE_RENEWABLES_PARAMS):
+            for paramId in typeParams['IdParameter']:
                 # En el ID se indica a qué se destina la potencia, separado por un guión la renovable a la que pertence
-                percentageParam = typeParam['IdParameter'].split('-')[0]
+                percentageParam = paramId.split('-')[0]
                 # La demanda siempre es la misma, surplus y bombeo cambia segun si hay regulación o no
                 if percentageParam != 'PotDem':
                     percentageParam += modified
-                table[typeParam['IdParameter'] + modified] = percentage * table[percentageParam]
+                table[paramId + modified] = percentage * np.asarray(table[percentageParam], dtype=float)
         return table
     
 
@@ -838,11 +908,22 @@ class simulator():
                 (biogasEqualVolumeAndPower and hydraulicEqualVolumeAndPower) or
                 (not biogasExists and not hydraulicExists))
 
-    def getScenariosAPI(self,originalValues):
-        scenarios = pd.read_sql(
-            'SELECT * FROM OptimizationIntervals ORDER BY OptimizationOrder', GenericCode.engine)
+    def getScenarioKey(scenario):
+        # Forma canónica de un escenario: los parámetros que cambian con su valor. Dos escenarios con la misma
+        # clave son el mismo aunque uno tenga parámetros a 0
+        return frozenset((parameter, value) for parameter, value in scenario.items() if value != 0.0)
+
+    def getCoveredKeys(scenario):
+        # Claves de los escenarios que sameScenario da por contemplados en este: todos los subconjuntos de sus cambios
+        changes = list(simulator.getScenarioKey(scenario))
+        return [frozenset(subset) for size in range(len(changes) + 1) for subset in combinations(changes, size)]
+
+    def getScenariosPlan(self, scenarios):
+        # Mismo filtrado que con keepScenario y sameScenario, pero comprobando cada escenario con un conjunto
+        # de claves en lugar de compararlo con todos los escenarios de los grupos anteriores
         scenariosIntervals = []
         totalLengthScenarios = 0
+        coveredKeys = set()
         # Se itera en todos los escenarios posibles (cambiando 1, 2, 3 o 4 recursos)
         for index, row in scenarios.iterrows():
             # Se seleccionan los parámetros que se van a cambiar
@@ -851,29 +932,46 @@ class simulator():
             parametersIntervals = self.getParametersToChange(
                 scenarioParameters, row)
             scenarioInterval = (self.getNewParameters(
-                parametersIntervals, originalValues, scenarioParameters))
-            for scenario in scenariosIntervals:
-                scenarioInterval = [dic for dic in scenarioInterval if simulator.keepScenario(dic) and not any(simulator.sameScenario(dic, subdic)
-                                                                                                               for subdic in scenario)]
+                parametersIntervals, {}, scenarioParameters))
+            if scenariosIntervals:
+                scenarioInterval = [dic for dic in scenarioInterval if simulator.keepScenario(dic) and
+                                    simulator.getScenarioKey(dic) not in coveredKeys]
+            for dic in scenarioInterval:
+                coveredKeys.update(simulator.getCoveredKeys(dic))
             # Se añade el tamaño de cada escenario para obtener el tamaño total de los escenarios
             totalLengthScenarios += len(scenarioInterval)
             scenariosIntervals.append(scenarioInterval)
-        return scenariosIntervals,totalLengthScenarios
+        return scenariosIntervals, totalLengthScenarios
+
+    def getScenariosAPI(self,originalValues):
+        scenarios = GenericCode.dataSource.getMetadata('OptimizationIntervals', orderBy='OptimizationOrder')
+        # El plan solo depende de los intervalos, se guarda por el contenido de la tabla. Los valores del formulario
+        # no cambian los escenarios, que son porcentajes sobre ellos
+        version = (tuple(scenarios.columns),
+                   hashlib.sha1(pd.util.hash_pandas_object(scenarios.astype(str), index=False).values.tobytes()).hexdigest())
+        with simulator.SCENARIOS_PLANS_LOCK:
+            if version not in simulator.SCENARIOS_PLANS:
+                simulator.SCENARIOS_PLANS[version] = self.getScenariosPlan(scenarios)
+            scenariosIntervals, totalLengthScenarios = simulator.SCENARIOS_PLANS[version]
+        # Copia de los escenarios, el plan guardado no se modifica
+        return [[dict(dic) for dic in scenario] for scenario in scenariosIntervals], totalLengthScenarios
     
     def optimizeParametersAPI(self,optimizeParameters,originalValues,start_day="2022-12-01", end_day="2022-12-02", location={}, simulationParameters={}, with_failures=True,original = None):
         scenariosIntervals,totalLengthScenarios= self.getScenariosAPI(originalValues)
         simulations = []
         index = 0
+        original.commonRandomSeed()
+        # Cada grupo de escenarios parte de la configuración original, sin copiar los datos del simulador
+        config = SimulatorConfig.fromSimulator(original)
         for scenario in scenariosIntervals:
-            my_simulator_copy = copy.deepcopy(original)
+            my_simulator_copy = simulator.fromConfig(config)
 
             scenarioParameters = scenario[0].keys()
             for combination in scenario:
                 my_simulator_copy.setSimulatorParametersAPI(
                     scenarioParameters, combination, optimizeParameters)
-                simulationResult = my_simulator_copy.range_simulation(
-                    start_day, end_day, location, simulationParameters, with_failures)
-                summary = simulator.get_summary(simulationResult, True)
+                summary = my_simulator_copy.range_simulation(
+                    start_day, end_day, location, simulationParameters, with_failures, summary_only=True)
                 summary.append(
                     my_simulator_copy.addResourceParameters(optimizeParameters['IdParameter']))
                 simulations.append(summary)
@@ -889,31 +987,13 @@ class simulator():
         return simulations
 
     def optimizeParameters(self, optimizeParameters, originalValues, start_day="2022-12-01", end_day="2022-12-02", location={}, simulationParameters={}, with_failures=True):
-        scenarios = pd.read_sql(
-            'SELECT * FROM OptimizationIntervals ORDER BY OptimizationOrder', GenericCode.engine)
         simulations = []
-        scenariosIntervals = []
-        totalLengthScenarios = 0
         GenericCode.executingOptimization = True
         GenericCode.stopOptimization = False
-        # Se itera en todos los escenarios posibles (cambiando 1, 2, 3 o 4 recursos)
-        for index, row in scenarios.iterrows():
-            # Se seleccionan los parámetros que se van a cambiar
-            scenarioParameters = row.loc[row.index.str.startswith(
-                'Parameter')].dropna().values
-            parametersIntervals = self.getParametersToChange(
-                scenarioParameters, row)
-            scenarioInterval = (self.getNewParameters(
-                parametersIntervals, originalValues, scenarioParameters))
-            for scenario in scenariosIntervals:
-                scenarioInterval = [dic for dic in scenarioInterval if simulator.keepScenario(dic) and not any(simulator.sameScenario(dic, subdic)
-                                                                                                               for subdic in scenario)]
-
-            # Se añade el tamaño de cada escenario para obtener el tamaño total de los escenarios
-            totalLengthScenarios += len(scenarioInterval)
-            scenariosIntervals.append(scenarioInterval)
+        scenariosIntervals, totalLengthScenarios = self.getScenariosAPI(originalValues)
         
         index = 0
+        self.commonRandomSeed()
         for scenario in scenariosIntervals:
             # Se recuperan los valores originales antes de cada escenario
             for key, value in originalValues.items():
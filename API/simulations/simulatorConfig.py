@@ -0,0 +1,40 @@
+class SimulatorConfig:
+    # Configuración inmutable de un simulador: los valores de entrada y los que ya han calculado sus setters, sin los
+    # datos ni los tiempos de la última simulación. Se crea una vez y se comparte (o se envía a los procesos de la
+    # optimización) en lugar de copiar el simulador entero, y simulator.fromConfig crea el simulador con estos valores
+    # de golpe, sin __init__ ni setters. Los valores derivados no se recalculan porque dependen del orden en que se
+    # asignaron los parámetros
+    __slots__ = ('items',)
+    # Atributos que no forman parte de la configuración: los datos y tiempos de la última simulación y lo que calcula
+    # initializeVariables al empezar cada simulación
+    EXCLUDED = ('cache', 'total_time', 'simulation_time', 'biogas', 'pvFarmsInstalledPower', 'qBiogasGenerado',
+                'qBiometGenerado', 'bio_amortization_cost_hour', 'pv_amortization_cost_hour',
+                'eol_amortization_cost_hour', 'hydraulic_amortization_cost_hour')
+
+    def __init__(self, items):
+        object.__setattr__(self, 'items', tuple(sorted(items)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SimulatorConfig is immutable")
+
+    def __reduce__(self):
+        return (SimulatorConfig, (self.items,))
+
+    def __eq__(self, other):
+        return isinstance(other, SimulatorConfig) and self.items == other.items
+
+    def __hash__(self):
+        return hash(self.items)
+
+    def fromSimulator(scenarioSimulator):
+        return SimulatorConfig((key, value) for key, value in vars(scenarioSimulator).items()
+                               if key not in SimulatorConfig.EXCLUDED)
+
+    def asDict(self):
+        return dict(self.items)
+
+    def getChanges(self, scenarioSimulator):
+        # Atributos del simulador que no están en la configuración o tienen otro valor
+        values = self.asDict()
+        return {key: value for key, value in vars(scenarioSimulator).items()
+                if key not in SimulatorConfig.EXCLUDED and (key not in values or values[key] != value)}
@@ -0,0 +1,127 @@
+import math
+import numpy as np
+from .simulator import simulator
+from .filtro_dias import filtro_dias
+from .scenarioScreening import ScenarioScreening
+from .simulatorConfig import SimulatorConfig
+
+
+class SurrogateOptimizer:
+    # Búsqueda guiada por un modelo sustituto: en lugar de simular toda la rejilla de escenarios, se ajusta un proceso
+    # gaussiano sobre los escenarios ya simulados y se simulan los de mayor mejora esperada, hasta agotar budget simulaciones.
+    # La puntuación de cada escenario es la mejor de getScore sin regulación y con regulación
+    LENGTH_SCALES = [0.1, 0.2, 0.5, 1, 2]
+    NOISE = 1e-4
+
+    def __init__(self, ponders, budget=50, initialScenarios=None, batchSize=None):
+        self.ponders = ponders
+        self.budget = budget
+        self.initialScenarios = initialScenarios or max(5, budget // 5)
+        self.batchSize = batchSize
+
+    def getFeatures(baseSimulator, parameterSets, summaryParameters):
+        # Valor de cada parámetro optimizado en cada escenario, escalado a [0, 1]. Los parámetros que no cambian no cuentan
+        baseConfig = SimulatorConfig.fromSimulator(baseSimulator)
+        features = []
+        for changes in parameterSets:
+            scenarioSimulator = simulator.fromConfig(baseConfig)
+            scenarioSimulator.__dict__.update(changes)
+            features.append([getattr(scenarioSimulator, parameter) for parameter in summaryParameters])
+        features = np.array(features, dtype=float).reshape(len(parameterSets), -1)
+        minimum, maximum = features.min(axis=0), features.max(axis=0)
+        changing = maximum > minimum
+        return (features[:, changing] - minimum[changing]) / (maximum[changing] - minimum[changing])
+
+    def getKernel(first, second, lengthScale):
+        distances = ((first[:, None, :] - second[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * distances / lengthScale ** 2)
+
+    def fit(features, scores):
+        # Proceso gaussiano con kernel RBF sobre las puntuaciones normalizadas. La escala se elige
+        # por verosimilitud marginal entre unos pocos valores
+        mean, deviation = scores.mean(), scores.std() or 1
+        normalized = (scores - mean) / deviation
+        best = None
+        for lengthScale in SurrogateOptimizer.LENGTH_SCALES:
+            covariance = SurrogateOptimizer.getKernel(features, features, lengthScale) + SurrogateOptimizer.NOISE * np.eye(len(features))
+            cholesky = np.linalg.cholesky(covariance)
+            alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, normalized))
+            likelihood = -0.5 * normalized @ alpha - np.log(np.diag(cholesky)).sum()
+            if best is None or likelihood > best[0]:
+                best = (likelihood, lengthScale, cholesky, alpha)
+        return {'features': features, 'mean': mean, 'deviation': deviation, 'lengthScale': best[1],
+                'cholesky': best[2], 'alpha': best[3]}
+
+    def predict(model, candidates):
+        crossed = SurrogateOptimizer.getKernel(candidates, model['features'], model['lengthScale'])
+        mean = crossed @ model['alpha']
+        solved = np.linalg.solve(model['cholesky'], crossed.T)
+        variance = np.maximum(1 - (solved ** 2).sum(axis=0), 1e-12)
+        return mean * model['deviation'] + model['mean'], np.sqrt(variance) * model['deviation']
+
+    def expectedImprovement(mean, deviation, best, xi=0.01):
+        improvement = mean - best - xi
+        z = improvement / deviation
+        cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+        pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+        return improvement * cdf + deviation * pdf
+
+    def getScores(self, summaries):
+        rows = filtro_dias.getScore([ScenarioScreening.getOptimizationRow(summary) for summary in summaries], self.ponders)
+        return np.array([max(row['Score'], row['ScoreWR']) for row in rows], dtype=float)
+
+    def selectBatch(self, features, done, scores, size):
+        # Se eligen uno a uno los de mayor mejora esperada. Cada elegido se añade al modelo con su media predicha,
+        # así la incertidumbre de su alrededor baja y el lote no se concentra en un mismo punto
+        done = list(done)
+        scores = list(scores)
+        if features.shape[1] == 0:
+            # Todos los escenarios tienen los mismos parámetros, no hay nada que modelar
+            return np.setdiff1d(np.arange(len(features)), done)[:size].tolist()
+        batch = []
+        for _ in range(size):
+            model = SurrogateOptimizer.fit(features[done], np.array(scores))
+            pending = np.setdiff1d(np.arange(len(features)), done)
+            if len(pending) == 0:
+                break
+            mean, deviation = SurrogateOptimizer.predict(model, features[pending])
+            choice = int(pending[np.argmax(SurrogateOptimizer.expectedImprovement(mean, deviation, max(scores)))])
+            batch.append(choice)
+            done.append(choice)
+            scores.append(float(mean[np.flatnonzero(pending == choice)[0]]))
+        return batch
+
+    def run(self, executor, baseSimulator, parameterSets, start_day, end_day, location, simulationParameters,
+            with_failures, summaryParameters, onResult=None):
+        # Devuelve {índice: resumen} de los escenarios simulados. onResult(índice, resumen) se llama en cada simulación
+        budget = min(self.budget, len(parameterSets))
+        # Sin escenarios o sin presupuesto no se simula nada
+        if budget == 0:
+            return {}
+        summaryParameters = list(summaryParameters)
+        features = SurrogateOptimizer.getFeatures(baseSimulator, parameterSets, summaryParameters)
+        batchSize = self.batchSize or max(2, executor.workers)
+        # Primero el escenario original y una muestra aleatoria, repetible con la semilla del simulador
+        random = np.random.default_rng(baseSimulator.seed)
+        initial = [0] + sorted(random.choice(np.arange(1, len(parameterSets)), min(self.initialScenarios, budget) - 1,
+                                             replace=False).tolist())
+        summaries = {}
+        batch = initial
+        # Un solo pool para todos los lotes
+        with executor.job(baseSimulator, start_day, end_day, location, simulationParameters, with_failures,
+                          summaryParameters):
+            while batch:
+                def addResult(position, summary):
+                    if onResult is not None:
+                        onResult(batch[position], summary)
+
+                results = executor.run(baseSimulator, [parameterSets[index] for index in batch], start_day, end_day, location,
+                                       simulationParameters, with_failures, summaryParameters, onResult=addResult)
+                summaries.update(zip(batch, results))
+                remaining = budget - len(summaries)
+                if remaining <= 0:
+                    break
+                done = list(summaries)
+                batch = self.selectBatch(features, done, self.getScores([summaries[index] for index in done]),
+                                         min(batchSize, remaining))
+        return summaries
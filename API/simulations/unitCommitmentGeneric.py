@@ -1,29 +1,17 @@
-from pandas import read_sql
 from .genericCode import GenericCode
 from pandas import DataFrame, to_datetime, to_timedelta
 from fastapi import HTTPException , status
 from .filtro_dias import filtro_dias
 from datetime import timedelta
 
-ELECTRICITY_PRICE_PARAMETERS = read_sql(
-    """SELECT *
-       FROM [inasolar].[dbo].[descripcionDatos]
-       WHERE Tabla = 'ElectricityPrice'""", GenericCode.engine)
-
-UNIT_COMMITMENT_PARAMETERS = read_sql(
-    """SELECT *
-       FROM [inasolar].[dbo].[UnitCommitment]
-       ORDER BY GraphPosition""", GenericCode.engine)
-
-HISTORICAL_WEATHER_COLUMNS_SQL = read_sql(
-    """SELECT nombre_dato, nombre_alternativo, unidad, defaultMargin, defaultPonder
-               FROM descripcionDatos
-               WHERE Tabla = 'HistoricalWeather'""", GenericCode.engine)
-
-COSTS_PARAMETERS = read_sql(
-    """SELECT IdParameter,Name,Unity
-               FROM AllocationParameters
-               WHERE GraphType='Line3' order BY GraphOrder ASC""", GenericCode.engine)
+ELECTRICITY_PRICE_PARAMETERS = GenericCode.dataSource.getColumnDescriptions('ElectricityPrice', '*')
+
+UNIT_COMMITMENT_PARAMETERS = GenericCode.dataSource.getMetadata('UnitCommitment', orderBy='GraphPosition')
+
+HISTORICAL_WEATHER_COLUMNS_SQL = GenericCode.HISTORICAL_WEATHER_COLUMNS_SQL
+
+COSTS_PARAMETERS = GenericCode.dataSource.getMetadata(
+    'AllocationParameters', "GraphType = 'Line3'", 'GraphOrder ASC', 'IdParameter, Name, Unity')
 
 def formatGraphData(graphParameters, paramTable, secondaryY) -> DataFrame:
     formatedGraphData = []
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+import datetime as dt
+import numpy as np
+from .genericCode import GenericCode
+
+
+class UnitProfiles:
+    # Perfiles por hora que solo dependen de la localización, del rango y de los umbrales de viento, no de la potencia
+    # instalada: potencias unitarias, precios, fechas y días válidos. Se calculan una vez por (localización, rango)
+    # y los comparten todos los escenarios de la optimización y todas las simulaciones del mismo rango
+    def __init__(self, maxEntries=32):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.farmsPower = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def getProfiles(self, key, loader):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+        # Dos peticiones simultáneas del mismo rango pueden calcularlo a la vez, el resultado es el mismo
+        profiles = loader()
+        # Si faltan los últimos días del rango es que todavía no hay datos, no se guarda para leerlos cuando lleguen
+        if len(profiles['valid']) and not profiles['valid'][-1]:
+            return profiles
+        with self.lock:
+            self.entries[key] = profiles
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+        return profiles
+
+    def getFarmsPower(self, key, loader):
+        # Potencia FV instalada de las granjas por (área, granja, versión de los datos). Al cambiar la versión se vuelve
+        # a leer, y las entradas de versiones anteriores se descartan como las de los perfiles
+        with self.lock:
+            if key in self.farmsPower:
+                self.farmsPower.move_to_end(key)
+                return self.farmsPower[key]
+        power = loader()
+        with self.lock:
+            self.farmsPower[key] = power
+            while len(self.farmsPower) > self.maxEntries:
+                self.farmsPower.popitem(last=False)
+        return power
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.farmsPower.clear()
+
+    def getWindPowerUnit(windSpeed, minSpeed, maxSpeed, maxSpeedLimit):
+        return np.select([(windSpeed < minSpeed) | (windSpeed >= maxSpeedLimit),
+                          (windSpeed > maxSpeed) & (windSpeed < maxSpeedLimit)],
+                         [0.0, 1.0], (windSpeed - minSpeed) / (maxSpeed - minSpeed))
+
+    def compute(inputs, startDate, pvFarmsInstalledPower, minSpeed, maxSpeed, maxSpeedLimit):
+        # inputs son las matrices (día, hora) de SimulationKernel.getDailyInputs. Solo se guardan las horas de los días válidos
+        validDays = np.flatnonzero(inputs['valid'])
+
+        def hourly(values):
+            return values[validDays].reshape(-1)
+
+        profiles = {'startDate': startDate, 'valid': inputs['valid'], 'validDays': validDays}
+        profiles["Date"] = [f"{(startDate + dt.timedelta(days=int(day))).strftime('%Y-%m-%d')} {hour:02d}:00"
+                            for day in validDays for hour in range(24)]
+        profiles["Hour"] = np.tile(np.arange(24, dtype=np.int64), len(validDays))
+        profiles["ElectricityGridPrice"] = hourly(inputs['Price']) / 1000
+        profiles["ElectricitySurplusPrice"] = 0.93 * (hourly(inputs['Surplus']) / 1000) - (0.5 / 1000)
+        profiles["PotFVUni"] = hourly(inputs['Generation']) / pvFarmsInstalledPower
+        profiles["VelViento"] = hourly(inputs['windspeed_10m'])
+        profiles["Temperature"] = hourly(inputs['temperature_2m'])
+        profiles["PotEolUni"] = UnitProfiles.getWindPowerUnit(profiles["VelViento"], minSpeed, maxSpeed, maxSpeedLimit)
+        profiles["PotDemUni"] = hourly(inputs['Power']) / GenericCode.MAX_DEMAND
+        for values in profiles.values():
+            if isinstance(values, np.ndarray):
+                values.flags.writeable = False
+        return profiles
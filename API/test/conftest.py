@@ -0,0 +1,10 @@
+import os
+import tempfile
+from benchmarks.syntheticDatabase import SyntheticDatabase
+
+# Los tests no usan el SQL Server: la API lee una copia local con datos sintéticos de 2021 y 2022, que cubre las
+# fechas de los tests. Se instala antes de importar los módulos de la simulación, que consultan la base de datos
+# al importarse
+SNAPSHOT = os.path.join(tempfile.mkdtemp(), "synthetic.sqlite")
+SyntheticDatabase(startDate="2021-01-01", years=2).writeSnapshot(SNAPSHOT)
+os.environ["INASOLAR_SNAPSHOT"] = SNAPSHOT
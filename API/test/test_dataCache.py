@@ -0,0 +1,43 @@
+from simulations.dataCache import SimulationDataCache
+import pandas as pd
+
+
+def loadDays(start_day, end_day):
+    dates = pd.date_range(start_day, end_day, freq='h')
+    return pd.DataFrame({'Date': dates, 'Power': range(len(dates))}), pd.DataFrame({'Date': dates})
+
+
+def test_sub_range_served_from_superset():
+    cache = SimulationDataCache()
+    cache.getData(1, 1, "2022-01-01", "2022-03-01", loadDays)
+    weather, generation = cache.getData(1, 1, "2022-02-01", "2022-02-10", loadDays)
+    assert cache.misses == 1 and cache.hits == 1
+    expected, _ = loadDays("2022-02-01", "2022-02-10")
+    assert weather['Date'].equals(expected['Date'])
+    # Otra localización no se sirve con los datos cargados
+    cache.getData(2, 1, "2022-02-01", "2022-02-10", loadDays)
+    assert cache.misses == 2
+
+
+def test_least_recently_used_evicted():
+    cache = SimulationDataCache(maxEntries=2)
+    for location in (1, 2, 3):
+        cache.getData(location, 1, "2022-01-01", "2022-01-02", loadDays)
+    assert [key[0] for key in cache.entries] == [2, 3]
+
+
+def test_days_without_data_are_read_again():
+    available = {'end': "2022-01-10"}
+
+    def loadAvailable(start_day, end_day):
+        return loadDays(start_day, min(end_day, available['end']))
+
+    cache = SimulationDataCache()
+    weather, _ = cache.getData(1, 1, "2022-01-01", "2022-01-20", loadAvailable)
+    assert weather['Date'].max() == pd.Timestamp("2022-01-10")
+    # Los días que ya tenían datos se sirven de la caché, los posteriores se vuelven a leer
+    cache.getData(1, 1, "2022-01-02", "2022-01-09", loadAvailable)
+    assert cache.misses == 1 and cache.hits == 1
+    available['end'] = "2022-01-20"
+    weather, _ = cache.getData(1, 1, "2022-01-01", "2022-01-20", loadAvailable)
+    assert cache.misses == 2 and weather['Date'].max() == pd.Timestamp("2022-01-20")
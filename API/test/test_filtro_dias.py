@@ -0,0 +1,12 @@
+from simulations.filtro_dias import filtro_dias
+import numpy as np
+import pandas as pd
+
+
+def test_best_scores_match_sorting():
+    scores = np.array([50.0, 80.0, 80.0, 10.0, 95.0, 80.0, 0.0])
+    for num_days in range(len(scores) + 2):
+        expected = pd.Series(scores).sort_values(ascending=False, kind="stable").index[:num_days]
+        assert list(filtro_dias.getBestScores(scores, num_days)) == list(expected)
+    hours = np.array([[1.5, np.nan, 2.25], [0.1, 0.2, np.nan]]).reshape(2, 3, 1)
+    assert list(filtro_dias.sumByDay(hours)[:, 0]) == [3.75, 0.1 + 0.2]
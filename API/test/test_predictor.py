@@ -0,0 +1,17 @@
+from simulations import predictor
+from benchmarks.syntheticDatabase import SyntheticDatabase, DEFAULT_PONDERS, HOLIDAY_COLUMNS
+
+CONSUMER = {'Location': SyntheticDatabase.CONSUMER, 'Area': SyntheticDatabase.AREA}
+GENERATOR = {'Location': min(SyntheticDatabase.FARMS), 'Area': SyntheticDatabase.AREA}
+
+
+def test_forecast_with_failures_covers_every_day():
+    # El último día de la predicción termina a las 23:00, también necesita sus fallos
+    for withFailures in (False, True):
+        table, similarDays, forecastWeather, prices = predictor.getRangeSimulationForecast(
+            {'seed': 0}, "2022-06-01", "2022-06-03", DEFAULT_PONDERS, DEFAULT_PONDERS, 'tab-ponders', "2022-03-01",
+            "2022-05-31", CONSUMER, GENERATOR, {column: True for column in HOLIDAY_COLUMNS}, [], withFailures, 10)
+        assert len(table) == 3 * 24
+        assert table["Date"].iloc[-1] == "2022-06-03 23:00"
+        if withFailures:
+            assert table["FV working"].notna().all()
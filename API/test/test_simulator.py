@@ -0,0 +1,258 @@
+from simulations.simulator import simulator
+from simulations.optimizationExecutor import OptimizationExecutor
+from simulations.scenarioScreening import ScenarioScreening
+from simulations.surrogateOptimizer import SurrogateOptimizer
+from simulations.resultStore import ResultStore
+from simulations.simulatorConfig import SimulatorConfig
+from simulations.simulationTimings import SimulationTimings
+from simulations.genericCode import GenericCode
+import numpy as np
+import pandas as pd
+import pickle
+
+LOCATION = {'Location': 1, 'Area': 1}
+
+
+def compareTables(table, kernelTable):
+    assert list(table.columns) == list(kernelTable.columns)
+    assert len(table) == len(kernelTable)
+    for column in table.columns:
+        assert table[column].dtype == kernelTable[column].dtype, column
+        if pd.api.types.is_numeric_dtype(table[column]):
+            assert np.allclose(table[column].to_numpy(float), kernelTable[column].to_numpy(float), equal_nan=True)
+        else:
+            assert table[column].equals(kernelTable[column])
+
+
+def seededSimulator(seed=0):
+    simulation = simulator()
+    simulation.seed = seed
+    return simulation
+
+
+def test_kernel_same_result():
+    for with_failures in (False, True):
+        table = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], with_failures)
+        kernelTable = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], with_failures, kernel=True)
+        compareTables(table, kernelTable)
+        assert simulator.get_summary(table) == simulator.get_summary(kernelTable)
+
+
+def test_regulation_does_not_modify_simulator():
+    simulation = simulator()
+    simulation.photovoltaic_power = 700
+    simulation.wind_turbine_power = 250
+    simulation.max_demand = 300
+    table = simulation.range_simulation("2022-06-01", "2022-06-08", LOCATION, [], False)
+    # Con tanta potencia instalada hay horas con excedente que se regulan
+    assert (table["Biogas coefficient"] < 1).any()
+    assert simulation.photovoltaic_power == 700
+    assert simulation.wind_turbine_power == 250
+    assert simulation.biogas_coefficient == 1
+
+
+def test_seed_gives_same_failures():
+    failures = ["FV working", "Eolic working", "Biogas working", "Pump working", "Turbine working"]
+    table = seededSimulator(7).range_simulation("2022-01-01", "2022-07-01", LOCATION, [], True, kernel=True)
+    scenario = seededSimulator(7)
+    scenario.photovoltaic_power = 700
+    # Otro escenario con la misma semilla tiene los mismos fallos
+    scenarioTable = scenario.range_simulation("2022-01-01", "2022-07-01", LOCATION, [], True, kernel=True)
+    assert table[failures].equals(scenarioTable[failures])
+
+
+def test_ensemble_bands():
+    bands = seededSimulator(3).ensemble_simulation("2022-06-01", "2022-06-15", LOCATION, realizations=20)
+    assert bands == seededSimulator(3).ensemble_simulation("2022-06-01", "2022-06-15", LOCATION, realizations=20)
+    for band in bands:
+        for metric, values in band.items():
+            if metric != 'Simulation':
+                assert values['p5'] <= values['p50'] <= values['p95']
+
+
+def test_executor_same_summaries():
+    optimizeParameters = pd.DataFrame({'IdParameter': ['photovoltaic_power', 'upper_tank_volume'],
+                                       'IntervalParameter': ['photovoltaic', 'tank']})
+    scenariosIntervals = [[{'photovoltaic': 0.0}, {'photovoltaic': -0.2}, {'photovoltaic': 0.2}],
+                          [{'tank': 0.0}, {'tank': -0.5}, {'tank': 0.5}]]
+    base = seededSimulator(1)
+    summaries = []
+    for scenario in scenariosIntervals:
+        scenarioSimulator = seededSimulator(1)
+        for combination in scenario:
+            scenarioSimulator.setSimulatorParametersAPI(scenario[0].keys(), combination, optimizeParameters)
+            table = scenarioSimulator.range_simulation("2022-06-01", "2022-06-15", LOCATION, [], True, kernel=True)
+            summaries.append(simulator.get_summary(table, True) +
+                             [scenarioSimulator.addResourceParameters(optimizeParameters['IdParameter'])])
+    parameterSets = OptimizationExecutor.getParameterSets(base, scenariosIntervals, optimizeParameters)
+    executor = OptimizationExecutor(workers=2)
+    assert executor.run(base, parameterSets, "2022-06-01", "2022-06-15", LOCATION, [], True,
+                        optimizeParameters['IdParameter']) == summaries
+    assert executor.completed == executor.total == 6
+
+
+def test_screening_keeps_full_range_summaries():
+    optimizeParameters = pd.DataFrame({'IdParameter': ['photovoltaic_power'], 'IntervalParameter': ['photovoltaic']})
+    scenariosIntervals = [[{'photovoltaic': value} for value in (0.0, -0.6, -0.3, 0.3, 0.6, 0.9)]]
+    base = seededSimulator(1)
+    parameterSets = OptimizationExecutor.getParameterSets(base, scenariosIntervals, optimizeParameters)
+    screening = ScenarioScreening({'balance': 1, 'lolpTotal': 1}, reduction=2, minDays=4)
+    assert screening.getRungDays(28) == [7, 14, 28]
+    assert ScenarioScreening.getTotalDays("2022-06-01", "2022-06-29") == 28
+    evaluations = []
+    survivors = screening.run(OptimizationExecutor(workers=1), base, parameterSets, "2022-06-01", "2022-06-29", LOCATION,
+                              [], True, optimizeParameters['IdParameter'],
+                              onResult=lambda index, summary, final: evaluations.append(index))
+    assert len(evaluations) == screening.getEvaluations(6, 28) == 11
+    # El escenario original siempre pasa la criba, y los que pasan tienen el resumen del rango completo
+    assert list(survivors) == sorted(survivors) and 0 in survivors and len(survivors) == 2
+    full = OptimizationExecutor(workers=1).run(base, parameterSets, "2022-06-01", "2022-06-29", LOCATION, [], True,
+                                                optimizeParameters['IdParameter'])
+    assert all(summary == full[index] for index, summary in survivors.items())
+
+
+def test_unit_profiles_shared_between_scenarios():
+    simulator.UNIT_PROFILES.clear()
+    misses, hits = simulator.UNIT_PROFILES.misses, simulator.UNIT_PROFILES.hits
+    table = seededSimulator().range_simulation("2022-03-01", "2022-03-08", LOCATION, [], True, kernel=True)
+    scenario = seededSimulator()
+    scenario.photovoltaic_power = 700
+    scenario.range_simulation("2022-03-01", "2022-03-08", LOCATION, [], True, kernel=True)
+    assert simulator.UNIT_PROFILES.misses == misses + 1 and simulator.UNIT_PROFILES.hits == hits + 1
+    # Otros umbrales de viento cambian la potencia eólica unitaria, no se reutilizan los perfiles
+    windy = seededSimulator()
+    windy.max_speed = 10
+    windyTable = windy.range_simulation("2022-03-01", "2022-03-08", LOCATION, [], True, kernel=True)
+    assert simulator.UNIT_PROFILES.misses == misses + 2
+    assert not table["PotEolUni"].equals(windyTable["PotEolUni"])
+
+
+def test_unit_profiles_not_shared_past_the_data():
+    simulator.UNIT_PROFILES.clear()
+    misses = simulator.UNIT_PROFILES.misses
+    # Los datos de los tests terminan en 2022, los días de 2023 todavía no tienen datos
+    for _ in range(2):
+        seededSimulator().range_simulation("2022-12-26", "2023-01-03", LOCATION, [], True, kernel=True)
+    assert simulator.UNIT_PROFILES.misses == misses + 2
+
+
+def test_surrogate_respects_budget():
+    optimizeParameters = pd.DataFrame({'IdParameter': ['photovoltaic_power', 'wind_turbine_power'],
+                                       'IntervalParameter': ['photovoltaic', 'wind']})
+    offsets = (0.0, -0.6, -0.3, 0.3, 0.6)
+    scenariosIntervals = [[{'photovoltaic': first, 'wind': second} for first in offsets for second in offsets]]
+    base = seededSimulator(1)
+    parameterSets = OptimizationExecutor.getParameterSets(base, scenariosIntervals, optimizeParameters)
+    evaluations = []
+    summaries = SurrogateOptimizer({'balance': 1, 'lolpTotal': 1}, budget=8, initialScenarios=4, batchSize=2).run(
+        OptimizationExecutor(workers=1), base, parameterSets, "2022-06-01", "2022-06-08", LOCATION, [], True,
+        optimizeParameters['IdParameter'], onResult=lambda index, summary: evaluations.append(index))
+    assert len(summaries) == len(evaluations) == len(set(evaluations)) == 8 and 0 in summaries
+    # Sin escenarios o sin presupuesto no hay nada que simular
+    assert SurrogateOptimizer({'balance': 1}, budget=0).run(OptimizationExecutor(workers=1), base, parameterSets,
+                                                            "2022-06-01", "2022-06-08", LOCATION, [], True,
+                                                            optimizeParameters['IdParameter']) == {}
+    assert SurrogateOptimizer({'balance': 1}, budget=8).run(OptimizationExecutor(workers=1), base, [], "2022-06-01",
+                                                            "2022-06-08", LOCATION, [], True,
+                                                            optimizeParameters['IdParameter']) == {}
+
+
+def test_scenarios_plan_drops_covered_scenarios():
+    intervals = pd.DataFrame([{'Parameter1': 'photovoltaic', 'photovoltaic_interval': 0.5, 'photovoltaic_jump': 0.25},
+                              {'Parameter1': 'photovoltaic', 'Parameter2': 'wind', 'photovoltaic_interval': 0.5,
+                               'photovoltaic_jump': 0.5, 'wind_interval': 0.5, 'wind_jump': 0.5}])
+    scenariosIntervals, totalLengthScenarios = simulator().getScenariosPlan(intervals)
+    # En el segundo grupo sobran el original y los que solo cambian la fotovoltaica, que ya están en el primero
+    assert [len(scenario) for scenario in scenariosIntervals] == [5, 6] and totalLengthScenarios == 11
+    for scenario in scenariosIntervals[1]:
+        assert scenario['wind'] != 0.0
+        assert not any(simulator.sameScenario(scenario, previous) for previous in scenariosIntervals[0])
+
+
+def test_summary_native_numbers():
+    table = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True)
+    for optimize in (False, True):
+        for variant in simulator.get_summary(table, optimize):
+            assert all(type(value) in (int, float, str) for value in variant.values())
+
+
+def test_summary_only_same_summary():
+    for with_failures in (False, True):
+        table = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], with_failures, kernel=True)
+        summary = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], with_failures, summary_only=True)
+        assert summary == simulator.get_summary(table, True)
+
+
+def test_columns_projection():
+    columns = ["Date", "PotDem", "Surplus-PotFVModified"]
+    for kernel in (True, False):
+        table = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=kernel)
+        projected = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=kernel, columns=columns)
+        assert list(projected.columns) == columns
+        compareTables(table[columns], projected)
+
+
+def test_resume_extends_checkpoint():
+    simulator.CHECKPOINTS.clear()
+    table = seededSimulator().range_simulation("2022-06-01", "2022-06-15", LOCATION, [], True, kernel=True)
+    simulation = seededSimulator()
+    simulation.range_simulation("2022-06-01", "2022-06-06", LOCATION, [], True, kernel=True, resume=True)
+    resumed = simulation.range_simulation("2022-06-01", "2022-06-15", LOCATION, [], True, kernel=True, resume=True)
+    assert table.equals(resumed)
+    assert simulator.get_summary(table) == simulator.get_summary(resumed)
+
+
+def test_resume_does_not_checkpoint_missing_days():
+    simulator.CHECKPOINTS.clear()
+    simulation = seededSimulator()
+    simulation.range_simulation("2022-12-26", "2022-12-29", LOCATION, [], True, kernel=True, resume=True)
+    # Los datos de los tests terminan en 2022, el punto de control sigue en el último rango completo
+    table = simulation.range_simulation("2022-12-26", "2023-01-03", LOCATION, [], True, kernel=True, resume=True)
+    assert len(table) == 6 * 24
+    key = simulation.getCheckpointKey(LOCATION, "2022-12-26", [], True)
+    assert simulator.CHECKPOINTS.get(key)['end_day'] == "2022-12-29"
+
+
+def test_result_store_serves_hits(tmp_path, monkeypatch):
+    monkeypatch.setattr(simulator, "RESULT_STORE", ResultStore(str(tmp_path)))
+    table = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True, persist=True)
+    stored = seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True, persist=True)
+    assert simulator.RESULT_STORE.hits == 1
+    compareTables(table, stored)
+    assert simulator.get_summary(table) == simulator.get_summary(stored)
+
+
+def test_result_store_key_has_data_version(tmp_path):
+    version = {'value': 1}
+    store = ResultStore(str(tmp_path), dataVersion=lambda: version['value'], versionSeconds=0)
+    store.put(("key",), pd.DataFrame({'Power': [1.0]}))
+    assert store.get(("key",)) is not None
+    # Con los datos corregidos no se sirven los resultados anteriores
+    version['value'] = 2
+    assert store.get(("key",)) is None
+    assert GenericCode.dataSource.getDataVersion() == 1
+
+
+def test_config_builds_same_simulator():
+    original = seededSimulator()
+    original.photovoltaic_power = 700
+    original.upper_tank_volume = 5000
+    original.range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True)
+    config = pickle.loads(pickle.dumps(SimulatorConfig.fromSimulator(original)))
+    scenarioSimulator = simulator.fromConfig(config)
+    assert scenarioSimulator.cache == {}
+    assert config.getChanges(scenarioSimulator) == {}
+    table = original.range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True)
+    compareTables(table, scenarioSimulator.range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True))
+
+
+def test_timings_record_request_spans(monkeypatch):
+    monkeypatch.setattr(simulator, "TIMINGS", SimulationTimings())
+    with simulator.TIMINGS.scope("simulation") as spans:
+        simulator.get_summary(seededSimulator().range_simulation("2022-06-01", "2022-06-08", LOCATION, [], True, kernel=True))
+    for name in ("unit_profiles", "hour_loop", "summary"):
+        assert spans[name]["count"] >= 1
+    report = simulator.TIMINGS.getReport()
+    assert report["scopes"][0]["name"] == "simulation"
+    assert report["totals"]["hour_loop"] == spans["hour_loop"]
+    assert 'inasolar_simulation_span_count_total{span="summary"} 1' in simulator.TIMINGS.getPrometheus()
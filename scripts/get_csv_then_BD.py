@@ -116,4 +116,7 @@ for csv in csvs_to_process:
             cursor.execute(f"update datosGEDER2 set [Power] = [PActivaIII] where [Power] is null and location = {location}")
 
         cursor.commit()
+#nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+cursor.execute("UPDATE DataVersion SET Version = Version + 1")
+cursor.commit()
 cnxn.close()
@@ -62,6 +62,8 @@ def main():
                 inasolarConnection.query(update_query)
         start_date = start_date + dt.timedelta(hours=1)
         current_hour_index += 1
+    #nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+    inasolarConnection.query("UPDATE DataVersion SET Version = Version + 1")
         
 if __name__ == '__main__':
     global inasolarConnection
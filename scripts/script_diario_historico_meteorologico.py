@@ -75,5 +75,8 @@ for area in areas:
     file.write(f"ACTUALIZACIÓN({dt.datetime.now()}): {area[3]},{month_ago} a {now}\n")
 file.close()
 
+#nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+cursor.execute("UPDATE DataVersion SET Version = Version + 1")
+cursor.commit()
 cnxn.close()
 
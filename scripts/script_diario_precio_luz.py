@@ -47,6 +47,9 @@ def insert_all_db(precios):
             cursor.execute(query)
         cursor.commit()
         print(f"Precio actualizado: {precios[key]} , {key}")
+    #nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+    cursor.execute("UPDATE DataVersion SET Version = Version + 1")
+    cursor.commit()
     cnxn.close()
 try:
     #AÑO MINIMO 2014
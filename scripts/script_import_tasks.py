@@ -147,6 +147,8 @@ def main():
             #registrar last update
             inasolarConnection.query(f"UPDATE CORRELATIONS SET LastUpdate = CAST('{lastUpdate}' as datetime) where id = {task[0]}")
             print(f"UPDATE CORRELATIONS SET LastUpdate = CAST('{lastUpdate}' as datetime) where id = {task[0]}")
+            #nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+            inasolarConnection.query("UPDATE DataVersion SET Version = Version + 1")
             #Cerramos conexiones
             DBOrigin.disconnect()
             DBDestination.disconnect()
@@ -28,6 +28,9 @@ def insert_all_db(precios):
             cursor.execute(query)
         cursor.commit()
         print(f"Precio actualizado: {precios[key]} , {key}")
+    #nueva versión de los datos, la API deja de usar los resultados guardados con los anteriores
+    cursor.execute("UPDATE DataVersion SET Version = Version + 1")
+    cursor.commit()
     cnxn.close()
 try:
     #esto es necesario para que funcione la request